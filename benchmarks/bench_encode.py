@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+"""Reports encode ms/page and bytes/page of every encoder profile for the
+given output formats, on pages that have already been unscrambled.
+
+    $ PYTHONPATH=. python benchmarks/bench_encode.py --format png webp
+"""
+
+import io
+import argparse
+
+from time import perf_counter
+
+from PIL import Image
+
+from pyccoma import tiles
+from pyccoma.dd import dd
+from pyccoma.encoding import PROFILES, get_format, get_options
+
+from bench_unscramble import SEED, make_page
+
+
+def unscrambled(page: bytes, format: str) -> Image.Image:
+    with Image.open(io.BytesIO(page)) as img:
+        permutation = tiles.permutations.get(dd(SEED), *img.size)
+        return permutation.apply(
+            img, "RGB" if get_format(format) == "jpeg" else "RGBA"
+        )
+
+
+def run(images, format: str, profile: str) -> None:
+    options = get_options(format, profile)
+    size = 0
+
+    start = perf_counter()
+    for img in images:
+        output = io.BytesIO()
+        img.save(output, get_format(format), **options)
+        size += output.tell()
+    elapsed = perf_counter() - start
+
+    print(
+        f"{format:<14} {profile:<9} "
+        f"{elapsed / len(images) * 1000:8.1f} ms/page "
+        f"{size / len(images) / 1024:9.1f} KiB/page"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--size", type=int, nargs=2, default=(720, 1024))
+    parser.add_argument(
+        "--format", nargs="+", default=["png", "jpeg", "webp", "webp-lossless"]
+    )
+    args = parser.parse_args()
+
+    pages = [make_page(*args.size, index) for index in range(args.pages)]
+    print(f"{args.pages} pages of {args.size[0]}x{args.size[1]}")
+
+    for format in args.format:
+        images = [unscrambled(page, format) for page in pages]
+        for profile in PROFILES:
+            run(images, format, profile)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+"""Measures the memory held by an episode catalogue kept as the dicts the
+list parsers used to return against pyccoma.episode.Episode records.
+
+    $ PYTHONPATH=. python benchmarks/bench_episodes.py --episodes 100000
+"""
+
+import random
+import argparse
+import tracemalloc
+
+from pyccoma.episode import FLAGS, Episode
+from pyccoma.filters import Filter
+
+VIEWER_URL = "https://piccoma.com/web/viewer"
+PER_TITLE = 200
+
+
+def make_states(count: int) -> list:
+    rng = random.Random(count)
+    return [
+        (
+            str(100000 + index // PER_TITLE),
+            str(1000000 + index),
+            f"第{index % PER_TITLE + 1}話",
+            {flag: rng.random() < .3 for flag in FLAGS}
+        )
+        for index in range(count)
+    ]
+
+
+def as_dicts(states: list) -> dict:
+    return {
+        episode_id: dict(
+            {'title': title, 'url': f"{VIEWER_URL}/{product_id}/{episode_id}"},  # noqa:E501
+            **flags
+        )
+        for product_id, episode_id, title, flags in states
+    }
+
+
+def as_episodes(states: list) -> dict:
+    products = {}
+    return {
+        episode_id: Episode(
+            title,
+            VIEWER_URL,
+            # One id string per title, as the parsers share it.
+            products.setdefault(product_id, product_id),
+            episode_id,
+            **flags
+        )
+        for product_id, episode_id, title, flags in states
+    }
+
+
+def measure(build, states: list) -> tuple:
+    # Titles and episode ids come from the parsed page either way.
+    tracemalloc.start()
+    catalogue = build(states)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size, catalogue
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--episodes", type=int, default=100000)
+    args = parser.parse_args()
+
+    states = make_states(args.episodes)
+    before, dicts = measure(as_dicts, states)
+    after, episodes = measure(as_episodes, states)
+
+    select = Filter("is_free|is_purchased", "is_already_read")
+    same = (
+        list(dicts.values()) == list(episodes.values())
+        and [e['url'] for e in select.select(dicts.values())]
+        == [e['url'] for e in select.select(episodes.values())]
+    )
+
+    print(
+        f"{args.episodes} episodes\n"
+        f"  dict    {before / 2**20:7.1f} MB {before / args.episodes:6.0f} B each\n"  # noqa:E501
+        f"  Episode {after / 2**20:7.1f} MB {after / args.episodes:6.0f} B each "  # noqa:E501
+        f"{before / after:.1f}x {'same' if same else 'DIFF'}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+"""Compares selecting episodes with a compiled pyccoma.filters.Filter
+against the previous eval() of the --include/--exclude expression per
+episode, and checks that both select the same episodes.
+
+    $ PYTHONPATH=. python benchmarks/bench_filters.py --episodes 100000
+"""
+
+import re
+import random
+import argparse
+
+from time import perf_counter
+
+from pyccoma.filters import FLAGS, Filter
+
+CASES = [
+    ("is_free", ""),
+    ("is_free|is_purchased", "is_already_read"),
+    ("is_wait_until_free&is_read_for_free|is_zero_plus", "is_free&is_purchased"),  # noqa:E501
+]
+
+
+def create_tags(text: str) -> str:
+    # The previous pyccoma.helpers.create_tags, kept as the baseline.
+    identifiers = [
+        r'is_read_for_free',
+        r"is_wait_until_free",
+        r"is_already_read",
+        r"is_free",
+        r"is_zero_plus",
+        r"is_purchased",
+    ]
+    identifiers = "|".join(identifiers)
+    pattern = r"(\b" + identifiers + r")\b(\s*(" + identifiers + r")\b)*"
+
+    regex = re.compile(pattern, re.I)
+    tags = regex.sub(r"episode['\1']", text.strip('"'))
+    return tags
+
+
+def make_episodes(count: int) -> list:
+    rng = random.Random(count)
+    return [
+        dict(
+            {'title': f"Episode {i}", 'url': f"https://piccoma.com/{i}"},
+            **{flag: rng.random() < .3 for flag in FLAGS}
+        )
+        for i in range(count)
+    ]
+
+
+def eval_select(episodes: list, include: str, exclude: str) -> list:
+    # The previous __main__.fetch path, with the include parenthesised:
+    # unparenthesised, "a|b" minus "c" evaluated as "a or (b and not c)".
+    include = create_tags(include).replace("&", " and ").replace("|", " or ")
+    exclude = create_tags(exclude).replace("&", " and ").replace("|", " or ")
+    if exclude:
+        exclude = f" {'and ' if include else ''}not ({exclude})"
+    if include:
+        include = f"({include})"
+    return [
+        episode['url'] for episode in episodes
+        if eval((include) + (exclude))
+    ]
+
+
+def compiled_select(episodes: list, include: str, exclude: str) -> list:
+    return [
+        episode['url']
+        for episode in Filter(include, exclude).select(episodes)
+    ]
+
+
+def timeit(func, *args) -> tuple:
+    start = perf_counter()
+    result = func(*args)
+    return perf_counter() - start, result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--episodes", type=int, default=100000)
+    args = parser.parse_args()
+
+    episodes = make_episodes(args.episodes)
+    print(f"{args.episodes} episodes")
+
+    for include, exclude in CASES:
+        before, expected = timeit(eval_select, episodes, include, exclude)
+        after, actual = timeit(compiled_select, episodes, include, exclude)
+        print(
+            f"--include {include!r} --exclude {exclude!r}\n"
+            f"  eval     {before * 1000:9.1f} ms\n"
+            f"  compiled {after * 1000:9.1f} ms {before / after:6.1f}x "
+            f"{'same' if expected == actual else 'DIFF'}"
+        )
+
+
+if __name__ == "__main__":
+    main()
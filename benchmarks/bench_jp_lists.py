@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+"""Times pyccoma.jp episode and volume list parsing against the previous
+XPath-per-field parser on product pages of several sizes, and checks that
+both return the same records.
+
+Pages are generated to mimic the structure of piccoma.com product pages;
+pass --fixtures to time saved pages (*.html) instead.
+
+    $ PYTHONPATH=. python benchmarks/bench_jp_lists.py --sizes 10 100 1000 5000
+"""
+
+import os
+import glob
+import random
+import argparse
+
+from time import perf_counter
+from typing import Callable, Dict, List
+
+from lxml import html
+
+from pyccoma.jp.pyccoma import Parser
+
+URL = "https://piccoma.com/web/product/4995/episodes?etype=E"
+
+EPISODE_STATUS = (
+    'PCM-epList_status_free', 'PCM-epList_status_zeroPlus',
+    'PCM-epList_status_waitfreeRead', 'PCM-epList_status_webwaitfree',
+    'PCM-epList_status_buy', '',
+)
+VOLUME_STATUS = (
+    'PCM-prdVol_freeBtn', 'PCM-prdVol_readBtn', 'PCM-prdVol_campaign_free',
+    '',
+)
+
+
+def episode_page(size: int) -> str:
+    rng = random.Random(size)
+    items = "".join(
+        f'<li class="{"PCM-epList_read" if rng.random() < .3 else ""}">'
+        f'<a href="#" data-episode_id="{1000 + i}" data-user_access="1">'
+        f'<div class="PCM-epList_thumb"><img src="t{i}.jpg"></div>'
+        f'<div class="PCM-epList_title"><h2>第{i + 1}話</h2></div>'
+        f'<div class="PCM-epList_info"><span>{rng.randrange(999)}</span>'
+        f'<div class="PCM-epList_status">'
+        f'<div class="{rng.choice(EPISODE_STATUS)}"><span>状態</span></div>'
+        f'</div></div></a></li>'
+        for i in range(size)
+    )
+    return wrap(f'<ul id="js_episodeList" class="PCM-epList">{items}</ul>')
+
+
+def volume_page(size: int) -> str:
+    rng = random.Random(size)
+    items = "".join(
+        f'<li class="{"PCM-volList_read" if rng.random() < .3 else ""}">'
+        f'<div class="PCM-prdVol_thumb"><img src="t{i}.jpg"></div>'
+        f'<div class="PCM-prdVol_title"><div><h2>第{i + 1}巻</h2></div></div>'
+        f'<div class="PCM-prdVol_btns">'
+        f'<a class="{rng.choice(VOLUME_STATUS)}" data-episode_id="{2000 + i}">'
+        f'読む</a><a class="PCM-prdVol_trialBtn" data-episode_id="{3000 + i}">'
+        f'試し読み</a></div></li>'
+        for i in range(size)
+    )
+    return wrap(f'<ul id="js_volumeList" class="PCM-volList">{items}</ul>')
+
+
+def wrap(body: str) -> str:
+    nav = "".join(f'<li><a href="/web/{i}">{i}</a></li>' for i in range(200))
+    return (
+        '<html><head><title>product</title></head><body>'
+        f'<header><ul>{nav}</ul></header><main>{body}</main>'
+        f'<footer><ul>{nav}</ul></footer></body></html>'
+    )
+
+
+def legacy_episode_list(url: str, page: html.HtmlElement) -> Dict:
+    page = page.xpath('//ul[@id="js_episodeList"]')[0]
+    episode_title = [
+        title.text_content() for title in page.xpath(
+            './/div[@class="PCM-epList_title"]/h2'
+        )
+    ]
+    episode_id = [id for id in page.xpath('./li/a/@data-episode_id')]
+    series_id = url.split('/')[-2]
+    episode_link = [
+        "https://piccoma.com/web/viewer/{0}/{1}".format(series_id, id)
+        for id in episode_id
+    ]
+    status = [_status for _status in page.xpath('./li')]
+    return {
+        id: {
+            'title': title,
+            'url': link,
+            'is_free': bool(_status.find_class('PCM-epList_status_free')),
+            'is_zero_plus': bool(_status.find_class('PCM-epList_status_zeroPlus')),  # noqa:E501
+            'is_read_for_free': bool(_status.find_class('PCM-epList_status_waitfreeRead')),  # noqa:E501
+            'is_already_read': bool(_status.find_class('PCM-epList_read')),
+            'is_wait_until_free': bool(_status.find_class('PCM-epList_status_webwaitfree')),  # noqa:E501
+            'is_purchased': bool(_status.find_class('PCM-epList_status_buy'))
+        }
+        for id, title, link, _status in zip(
+            episode_id, episode_title, episode_link, status
+        )
+    }
+
+
+def legacy_volume_list(url: str, page: html.HtmlElement) -> Dict:
+    page = page.xpath('//ul[@id="js_volumeList"]')[0]
+    volume_title = [
+        title.text_content() for title in page.xpath(
+            './/div[@class="PCM-prdVol_title"]//h2'
+        )
+    ]
+    series_id = url.split('/')[-2]
+    volume_id = [
+        [id for id in links.xpath('./a/@data-episode_id')]
+        for links in page.xpath('//div[@class="PCM-prdVol_btns"]')
+    ]
+    volume_link = [
+        "https://piccoma.com/web/viewer/{0}/{1}".format(series_id, id[0])
+        for id in volume_id
+    ]
+    status = [_status for _status in page.xpath('./li')]
+    return {
+        id + 1: {
+            'title': title,
+            'url': link,
+            'is_free': bool(_status.find_class('PCM-prdVol_freeBtn')),
+            'is_read_for_free': bool(_status.find_class('PCM-prdVol_readBtn') and _status.find_class('PCM-prdVol_campaign_free')),  # noqa:E501
+            'is_already_read': bool(_status.find_class('PCM-volList_read')),
+            'is_wait_until_free': bool(_status.find_class('PCM-prdVol_campaign_free')),  # noqa:E501
+            'is_purchased': bool(_status.find_class('PCM-prdVol_readBtn'))
+        }
+        for id, (title, link, _status) in enumerate(
+            zip(volume_title, volume_link, status)
+        )
+    }
+
+
+def timeit(func: Callable, page: html.HtmlElement, repeat: int) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = perf_counter()
+        func(URL, page)
+        best = min(best, perf_counter() - start)
+    return best * 1000
+
+
+def run(name: str, source: str, repeat: int) -> None:
+    parser = Parser()
+    page = html.fromstring(source)
+
+    if 'js_volumeList' in source:
+        legacy, current = legacy_volume_list, parser.parse_volume_list
+    else:
+        legacy, current = legacy_episode_list, parser.parse_episode_list
+
+    before = timeit(legacy, page, repeat)
+    after = timeit(current, page, repeat)
+    print(
+        f"{name:<24} {len(current(URL, page)):>6} items "
+        f"{before:9.2f} ms {after:9.2f} ms {before / after:6.1f}x "
+        f"{'same' if legacy(URL, page) == current(URL, page) else 'DIFF'}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[10, 100, 1000, 5000]
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--fixtures", metavar="DIR")
+    args = parser.parse_args()
+
+    print(f"{'page':<24} {'':>12} {'legacy':>12} {'single-pass':>12}")
+
+    if args.fixtures:
+        pages: List[str] = sorted(
+            glob.glob(os.path.join(args.fixtures, "*.html"))
+        )
+        for path in pages:
+            with open(path, encoding="utf-8") as file:
+                run(os.path.basename(path), file.read(), args.repeat)
+        return
+
+    for size in args.sizes:
+        run(f"episodes/{size}", episode_page(size), args.repeat)
+        run(f"volumes/{size}", volume_page(size), args.repeat)
+
+
+if __name__ == "__main__":
+    main()
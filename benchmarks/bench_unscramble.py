@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+"""Compares pages/sec of the pycasso Canvas unscramble path against
+pyccoma.tiles (a NumPy gather when NumPy is installed), and checks that
+both produce the same bytes.
+
+    $ PYTHONPATH=. python benchmarks/bench_unscramble.py --pages 20
+"""
+
+import io
+import random
+import argparse
+
+from time import perf_counter
+
+from PIL import Image
+from pycasso import Canvas
+
+from pyccoma import tiles
+from pyccoma.dd import dd
+
+SEED = "ABCDEFGHIJKLMNOPQRSTUV"
+
+
+def make_page(width: int, height: int, index: int) -> bytes:
+    """A scrambled, noisy page roughly the size of a real one."""
+    rng = random.Random(index)
+    img = Image.effect_noise((width, height), 64).convert("RGB")
+    img.paste(
+        (rng.randrange(256), rng.randrange(256), rng.randrange(256)),
+        (0, 0, width // 2, height // 3)
+    )
+    source = io.BytesIO()
+    img.save(source, "png")
+    return Canvas(source, (50, 50), dd(SEED)).export(
+        mode="unscramble", format="png"
+    ).getvalue()
+
+
+def run(name, func, pages, format):
+    start = perf_counter()
+    results = [func(page, format) for page in pages]
+    elapsed = perf_counter() - start
+    print(
+        f"{name:<10} {len(pages) / elapsed:8.2f} pages/sec "
+        f"{elapsed / len(pages) * 1000:8.1f} ms/page"
+    )
+    return results
+
+
+def canvas(page: bytes, format: str) -> bytes:
+    return Canvas(io.BytesIO(page), (50, 50), dd(SEED)).export(
+        mode="scramble", format=format
+    ).getvalue()
+
+
+def unscramble(page: bytes, format: str) -> bytes:
+    return tiles.unscramble(page, dd(SEED), format).getvalue()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--size", type=int, nargs=2, default=(720, 1024))
+    parser.add_argument("--format", default="png")
+    args = parser.parse_args()
+
+    pages = [make_page(*args.size, index) for index in range(args.pages)]
+    print(
+        f"{args.pages} pages of {args.size[0]}x{args.size[1]}, "
+        f"output {args.format}"
+    )
+
+    expected = run("canvas", canvas, pages, args.format)
+    tiles.permutations.clear()
+    actual = run("tiles", unscramble, pages, args.format)
+
+    identical = all(a == b for a, b in zip(expected, actual))
+    print(f"byte-identical: {identical}")
+    print(f"permutation cache: {tiles.permutations}")
+
+
+if __name__ == "__main__":
+    main()
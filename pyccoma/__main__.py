@@ -4,16 +4,21 @@ import argparse
 
 import os
 import re
+import time
 import logging
 from getpass import getpass
+from contextlib import nullcontext
 from typing import Optional, Tuple, List
-from itertools import chain
 
 from pyccoma.jp.pyccoma import Pyccoma as Jp
 from pyccoma.fr.pyccoma import Pyccoma as Fr
+from pyccoma.cache import ResponseCache
+from pyccoma.ratelimit import RateLimiter
 from pyccoma.exceptions import PyccomaError
 from pyccoma.logger import setup_logging, levels
-from pyccoma.helpers import create_tags
+from pyccoma.filters import Filter, compile_expression
+from pyccoma.sync import LibrarySync
+from pyccoma.tracer import Tracer
 
 log = logging.getLogger(__name__)
 
@@ -35,16 +40,36 @@ def main() -> None:
         else:
             raise ValueError("Invalid region specified.")
 
-        url = args.url
         pyccoma.format = args.format
+        pyccoma.encoder_profile = args.encoder_profile
         pyccoma.manga = args.etype[0]
         pyccoma.smartoon = args.etype[1]
         pyccoma.novel = args.etype[2]
         pyccoma.zeropad = args.pad
         pyccoma.retry_count = args.retry_count
         pyccoma.retry_interval = args.retry_interval
+        pyccoma.retry_budget = args.retry_budget
         pyccoma.archive = args.archive
         pyccoma.omit_author = args.omit_author
+        pyccoma.resume = args.resume
+        pyccoma.workers = args.workers
+        pyccoma.prefetch = args.prefetch
+        pyccoma.unscramble_workers = args.unscramble_workers
+
+        if args.cache_dir:
+            pyccoma.cache = ResponseCache(args.cache_dir)
+
+        if args.trace:
+            pyccoma.tracer = Tracer()
+
+        if args.meta_rate or args.image_rate:
+            pyccoma.rate_limiter = RateLimiter(
+                args.meta_rate, args.image_rate, args.rate_file
+            )
+        elif args.rate_file:
+            raise PyccomaError(
+                "Use --rate-file along with --meta-rate or --image-rate."
+            )
 
         logging.getLogger().setLevel(args.loglevel)
 
@@ -71,51 +96,101 @@ def main() -> None:
 
             pyccoma.login(args.email, password)
 
-        if args.url and args.filter:
-            if args.url[0] in ('history', 'bookmark', 'purchase'):
-                if args.url[0] in 'history':
-                    url = pyccoma.get_history().values()
-                    log.info(
-                        f"Parsing ({len(url)}) titles from your history."
-                    )
-
-                elif args.url[0] in 'bookmark':
-                    url = pyccoma.get_bookmark().values()
-                    log.info(
-                        f"Parsing ({len(url)}) titles from your bookmarks."
-                    )
-
-                elif args.url[0] in 'purchase':
-                    url = pyccoma.get_purchase().values()
-                    log.info(
-                        f"Parsing ({len(url)}) titles from your purchases."
-                    )
-
-            elif valid_url(args.url[0], level=3):
-                raise PyccomaError(
-                    "There is nothing to aggregate. You should only use "
-                    "--filter on a product page or your library."
+        if args.watch and not args.filter:
+            raise PyccomaError("Use --watch along with --filter.")
+
+        profile = pyccoma.profile(args.profile, args.profile_dir) \
+            if args.profile else nullcontext()
+
+        with profile:
+            run(args)
+
+    except KeyboardInterrupt:
+        pass
+    except Exception as error:
+        parser.error(error)
+
+
+def run(args: argparse.Namespace) -> None:
+    if not args.watch:
+        try:
+            sync(args)
+        finally:
+            write_reports(args)
+        return
+
+    while True:
+        try:
+            sync(args)
+        except Exception as error:
+            # One failed sync, e.g. the site being down, must not end
+            # --watch; the next one may well succeed.
+            log.error(f"Unable to sync library. {error}")
+
+        write_reports(args)
+        log.info(f"Next sync in {args.watch} seconds.")
+        time.sleep(args.watch)
+
+
+def sync(args: argparse.Namespace) -> None:
+    """Resolves the urls given on the command line, including library
+    shorthands, and fetches them."""
+    url = args.url
+
+    if args.url and args.filter:
+        if args.url[0] in ('history', 'bookmark', 'purchase'):
+            if args.url[0] in 'history':
+                url = pyccoma.get_history().values()
+                log.info(
+                    f"Parsing ({len(url)}) titles from your history."
                 )
 
-        if any(map(valid_url, args.url)):
-            if not os.path.exists(args.output) and not args.output:
-                log.warning(
-                    "No path found, creating an extract folder inside "
-                    "the current working directory: {0}".format(os.getcwd())
+            elif args.url[0] in 'bookmark':
+                url = pyccoma.get_bookmark().values()
+                log.info(
+                    f"Parsing ({len(url)}) titles from your bookmarks."
                 )
-            fetch(
-                url,
-                args.filter,
-                args.range,
-                args.include,
-                args.exclude,
-                args.output
+
+            elif args.url[0] in 'purchase':
+                url = pyccoma.get_purchase().values()
+                log.info(
+                    f"Parsing ({len(url)}) titles from your purchases."
+                )
+
+        elif valid_url(args.url[0], level=3):
+            raise PyccomaError(
+                "There is nothing to aggregate. You should only use "
+                "--filter on a product page or your library."
             )
-        else:
-            raise ValueError("Invalid url.")
 
-    except Exception as error:
-        parser.error(error)
+    if any(map(valid_url, args.url)):
+        if not os.path.exists(args.output) and not args.output:
+            log.warning(
+                "No path found, creating an extract folder inside "
+                "the current working directory: {0}".format(os.getcwd())
+            )
+        fetch(
+            url,
+            args.filter,
+            args.range,
+            args.include,
+            args.exclude,
+            args.output,
+            args.sync or bool(args.watch)
+        )
+    else:
+        raise ValueError("Invalid url.")
+
+
+def write_reports(args: argparse.Namespace) -> None:
+    """Exports the stage timings, counters and trace gathered so far; they
+    add up across the syncs of --watch."""
+    if args.metrics_json:
+        pyccoma.metrics.write_json(args.metrics_json)
+    if args.metrics_prom:
+        pyccoma.metrics.write_prometheus(args.metrics_prom)
+    if args.trace:
+        pyccoma.tracer.write(args.trace)
 
 
 def construct_parser() -> argparse.ArgumentParser:
@@ -152,7 +227,10 @@ def construct_parser() -> argparse.ArgumentParser:
         "--format",
         type=str,
         default="png",
-        help="Image format: png, jpeg, jpg, gif, bmp (Default: png)"
+        help="""
+        Image format: png, jpeg, jpg, gif, bmp, webp, webp-lossless
+        (Default: png)
+        """
     )
     optional.add_argument(
         "-p",
@@ -169,6 +247,16 @@ def construct_parser() -> argparse.ArgumentParser:
         default=False,
         help="Output to cbz archive format."
     )
+    optional.add_argument(
+        "--resume",
+        dest="resume",
+        action="store_true",
+        default=False,
+        help="""
+        Record finished episodes and pages in the output directory and skip
+        them on later runs.
+        """
+    )
     optional.add_argument(
         "--omit-author",
         dest="omit_author",
@@ -177,6 +265,82 @@ def construct_parser() -> argparse.ArgumentParser:
         help="Omit author(s) in title naming scheme."
     )
 
+    performance = parser.add_argument_group("Performance options")
+    performance.add_argument(
+        "--workers",
+        type=int,
+        metavar=("COUNT"),
+        default=8,
+        help="Number of pages to download concurrently. (Default: 8)"
+    )
+    performance.add_argument(
+        "--prefetch",
+        type=int,
+        metavar=("COUNT"),
+        default=2,
+        help="""
+        Number of upcoming episodes to resolve while pages of earlier
+        episodes are still downloading. (Default: 2)
+        """
+    )
+    performance.add_argument(
+        "--encoder-profile",
+        type=str,
+        choices=("fast", "balanced", "small"),
+        default="balanced",
+        help="""
+        Trade encoding speed against file size of unscrambled pages: fast,
+        balanced, small. (Default: balanced)
+        """
+    )
+    performance.add_argument(
+        "--cache-dir",
+        type=str,
+        metavar=("PATH"),
+        help="""
+        Also keep product and bookshelf pages on disk under PATH, so that
+        later runs can reuse or revalidate them.
+        """
+    )
+    performance.add_argument(
+        "--meta-rate",
+        type=float,
+        metavar=("RATE"),
+        help="""
+        Maximum number of page and JSON requests per second. Lowered while
+        the server answers 429 or 5xx or slows down, and raised back once
+        it recovers. (Default: unlimited)
+        """
+    )
+    performance.add_argument(
+        "--image-rate",
+        type=float,
+        metavar=("RATE"),
+        help="""
+        Maximum number of image requests per second, adjusted like
+        --meta-rate. (Default: unlimited)
+        """
+    )
+    performance.add_argument(
+        "--rate-file",
+        type=str,
+        metavar=("PATH"),
+        help="""
+        Share the --meta-rate and --image-rate budgets with every other
+        pyccoma process using the same file.
+        """
+    )
+    performance.add_argument(
+        "--unscramble-workers",
+        type=int,
+        metavar=("COUNT"),
+        default=0,
+        help="""
+        Number of processes to unscramble pages on, independent of
+        --workers. Use 0 to unscramble in the download threads. (Default: 0)
+        """
+    )
+
     locale = parser.add_argument_group("Locale options")
     locale.add_argument(
         "--region",
@@ -198,7 +362,13 @@ def construct_parser() -> argparse.ArgumentParser:
         type=int,
         metavar=("SECONDS"),
         default=1,
-        help="Delay between each retry attempt. (Default: 1)"
+        help="Base delay between each retry attempt. (Default: 1)"
+    )
+    retry.add_argument(
+        "--retry-budget",
+        type=int,
+        metavar=("COUNT"),
+        help="Maximum number of retries to spend across the whole run."
     )
 
     user = parser.add_argument_group("Login options")
@@ -236,10 +406,26 @@ def construct_parser() -> argparse.ArgumentParser:
         metavar=("START", "END"),
         help="Range to use when scraping episodes or volumes."
     )
+    filter.add_argument(
+        "--sync",
+        dest="sync",
+        action="store_true",
+        default=False,
+        help="""
+        Only fetch episodes that are new or changed state (e.g. purchased or
+        freed) since the last sync of the same output directory.
+        """
+    )
+    filter.add_argument(
+        "--watch",
+        type=int,
+        metavar=("SECONDS"),
+        help="Sync again every SECONDS, implies --sync."
+    )
     filter.add_argument(
         "--include",
         type=include,
-        default="episode",
+        default="",
         help="""
         Arguments to include when parsing your library: is_purchased, is_free,
         is_zero_plus, is_already_read, is_read_for_free, is_wait_until_free
@@ -267,6 +453,57 @@ def construct_parser() -> argparse.ArgumentParser:
         """
     )
 
+    metrics = parser.add_argument_group("Metrics options")
+    metrics.add_argument(
+        "--metrics-json",
+        type=str,
+        metavar=("PATH"),
+        help="""
+        Write per-stage timings and counters as JSON to PATH when done, or
+        after every sync with --watch.
+        """
+    )
+    metrics.add_argument(
+        "--metrics-prom",
+        type=str,
+        metavar=("PATH"),
+        help="""
+        Write the same metrics in the Prometheus text format to PATH, e.g.
+        for the node exporter's textfile collector.
+        """
+    )
+
+    profiling = parser.add_argument_group("Profiling options")
+    profiling.add_argument(
+        "--profile",
+        type=str.lower,
+        choices=("cpu", "mem"),
+        help="""
+        Profile the run: cpu merges a cProfile of every download thread,
+        mem compares tracemalloc snapshots taken around each episode.
+        """
+    )
+    profiling.add_argument(
+        "--profile-dir",
+        type=str,
+        metavar=("PATH"),
+        default="profile",
+        help="""
+        Directory to write the per-episode and per-run reports of --profile
+        to. (Default: profile)
+        """
+    )
+    profiling.add_argument(
+        "--trace",
+        type=str,
+        metavar=("PATH"),
+        help="""
+        Write a timeline of every episode, page, request, unscramble, encode
+        and archive write per thread to PATH, as a Chrome trace to open in
+        Perfetto or chrome://tracing.
+        """
+    )
+
     info = parser.add_argument_group("Info")
     info.add_argument(
         "-h", "--help",
@@ -285,21 +522,21 @@ def construct_parser() -> argparse.ArgumentParser:
 
 def include(value: str) -> str:
     try:
-        include = create_tags(value).replace("&", " and ").replace("|", " or ")
-        return include
-    except Exception:
+        compile_expression(value)
+        return value
+    except ValueError as error:
         raise argparse.ArgumentTypeError(
-            'Specify type in this format: "is_free|is_already_read"'
+            f'{error} Specify type in this format: "is_free|is_already_read"'
         )
 
 
 def exclude(value: str) -> str:
     try:
-        exclude = create_tags(value).replace("&", " and ").replace("|", " or ")
-        return exclude
-    except Exception:
+        compile_expression(value)
+        return value
+    except ValueError as error:
         raise argparse.ArgumentTypeError(
-            'Specify type in this format: "is_free&is_already_read"'
+            f'{error} Specify type in this format: "is_free&is_already_read"'
         )
 
 
@@ -339,50 +576,69 @@ def fetch(
     range: Optional[Tuple[int, int]] = None,
     include: Optional[str] = None,
     exclude: Optional[str] = None,
-    output: Optional[str] = None
+    output: Optional[str] = None,
+    incremental: bool = False
 ) -> None:
     if mode:
         try:
             if not range:
                 range = (0, 0)
 
-            if exclude:
-                exclude = f" {'and ' if include else ''}not ({exclude})"
-
+            select = Filter(include or "", exclude or "")
             product = []
-
-            for title in url:
-                product.append([
+            library = LibrarySync(pyccoma.get_manifest(output)) \
+                if incremental else None
+
+            # Lists come back in the order of `url`, which min, max and
+            # custom selection rely on.
+            lists = list(zip(url, pyccoma.get_lists(url)))
+            selected = []
+            for _, episodes in lists:
+                selected.append([
                     episode['url']
-                    for episode in pyccoma.get_list(title).values()
-                    if eval((include) + (exclude))
+                    for episode in select.select(episodes.values())
                 ])
 
             if 'min' in mode:
-                product = [episode[0] for episode in product if episode]
+                picked = [episodes[:1] for episodes in selected]
             elif 'max' in mode:
-                product = [episode[-1] for episode in product if episode]
+                picked = [episodes[-1:] for episodes in selected]
             elif 'all' in mode:
-                product = list(chain.from_iterable(product))
+                picked = selected
             elif 'custom' in mode:
-                product = list(chain.from_iterable(product))[range[0]:range[1]]
+                flat = [
+                    (index, episode)
+                    for index, episodes in enumerate(selected)
+                    for episode in episodes
+                ][range[0]:range[1]]
+                picked = [
+                    [episode for owner, episode in flat if owner == index]
+                    for index, _ in enumerate(selected)
+                ]
             else:
                 raise ValueError
 
-            log.info("Fetching ({0}) items.".format(total := len(product)))
+            # The selection applies to whole lists; --sync then drops the
+            # picked episodes that were already synced.
+            for (title, episodes), urls in zip(lists, picked):
+                if library:
+                    product += library.diff(title, episodes, select, urls)
+                else:
+                    product += urls
+
+            log.info("Fetching ({0}) items.".format(len(product)))
+            completed = pyccoma.fetch_all(product, output)
 
-            for index, item in enumerate(product):
-                log.info(f"Fetching ({index+1}/{total})")
-                pyccoma.fetch(item, output)
+            if library:
+                library.commit(completed)
 
         except Exception as error:
             raise PyccomaError(error)
 
     else:
-        for index, link in enumerate(url):
+        for link in url:
             if valid_url(url=link, level=3):
-                log.info(f"Fetching ({index+1}/{len(url)})")
-                pyccoma.fetch(link, output)
+                continue
             elif valid_url(url=link, level=0):
                 raise PyccomaError(
                     "Use --filter to aggregate episodes in product pages."
@@ -390,6 +646,8 @@ def fetch(
             else:
                 raise ValueError("Invalid url.")
 
+        pyccoma.fetch_all(url, output)
+
 
 if __name__ == "__main__":
     main()
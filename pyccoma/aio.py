@@ -0,0 +1,375 @@
+import os
+import sys
+import asyncio
+import logging
+
+import aiohttp
+
+from lxml import html
+from time import perf_counter, gmtime, strftime
+from typing import Any, Iterable, List, Mapping, Optional, Set, Tuple
+
+from pyccoma.pyccoma import Scraper
+from pyccoma.archive import ArchiveWriter
+from pyccoma.encoding import get_format
+from pyccoma.episode import Episode
+from pyccoma.exceptions import PyccomaError, PageError
+from pyccoma.helpers import create_path, pad_string, safe_filename
+from pyccoma.ratelimit import RateLimiter
+from pyccoma.utils import (
+    display_progress_bar,
+    parse_retry_after,
+    retry_async
+)
+
+log = logging.getLogger(__name__)
+
+
+class AsyncScraper(Scraper):
+    """asyncio counterpart of Scraper.
+
+    Metadata and page requests of every episode share one event loop and
+    one aiohttp connection pool; `workers` caps the number of page
+    downloads in flight, and unscrambling runs in the default executor.
+
+    Metadata requests go straight to aiohttp, so `cache` is not used, and
+    `resume` is not supported: there is no manifest to skip saved
+    episodes and pages by. `workers` sizes the connection pool when it
+    opens, on the first request, and cannot be changed after that.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._rate_limiter = None
+        super().__init__(*args, **kwargs)
+        self._client = None
+        self._semaphore = None
+
+    @property
+    def client(self) -> aiohttp.ClientSession:
+        if self._client is None or self._client.closed:
+            self._client = aiohttp.ClientSession(
+                headers=self.headers,
+                connector=aiohttp.TCPConnector(limit=self.workers),
+                trace_configs=[self._trace_config()]
+            )
+            self._semaphore = asyncio.Semaphore(self.workers)
+        return self._client
+
+    @Scraper.workers.setter
+    def workers(self, value: int) -> None:
+        if value < 1:
+            raise ValueError("Number of workers must be at least one.")
+        if self._client is not None and not self._client.closed:
+            raise PyccomaError(
+                "Set workers before the first request; the connection pool "
+                "is already open."
+            )
+        self._workers = value
+
+    @property
+    def rate_limiter(self) -> Optional[RateLimiter]:
+        return self._rate_limiter
+
+    @rate_limiter.setter
+    def rate_limiter(self, value: Optional[RateLimiter]) -> None:
+        self._rate_limiter = value
+
+    @Scraper.resume.setter
+    def resume(self, value: bool) -> None:
+        if value:
+            raise PyccomaError(
+                "Resume is not supported by the asyncio scraper."
+            )
+        self._resume = value
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        """Caps page downloads in flight across all concurrent fetches."""
+        self.client
+        return self._semaphore
+
+    def _create_transport(self) -> None:
+        # Requests go through `client` instead.
+        return None
+
+    def _trace_config(self) -> aiohttp.TraceConfig:
+        """Applies `rate_limiter`, looked up on every request so it can be
+        set after the client was created."""
+
+        async def on_request_start(session, context, params) -> None:
+            context.limiter = limiter = self.rate_limiter
+            if limiter:
+                context.kind = limiter.classify(str(params.url))
+                await asyncio.sleep(limiter.reserve(context.kind))
+            context.start = perf_counter()
+
+        async def on_request_end(session, context, params) -> None:
+            if context.limiter:
+                context.limiter.observe(
+                    context.kind,
+                    params.response.status,
+                    perf_counter() - context.start,
+                    parse_retry_after(params.response.headers)
+                )
+
+        async def on_request_exception(session, context, params) -> None:
+            if context.limiter:
+                context.limiter.observe(
+                    context.kind, None, perf_counter() - context.start
+                )
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_request_end.append(on_request_end)
+        trace_config.on_request_exception.append(on_request_exception)
+        return trace_config
+
+    async def close(self) -> None:
+        if self._client:
+            await self._client.close()
+
+    async def __aenter__(self) -> "AsyncScraper":
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        await self.close()
+
+    def form(self, *fields: Tuple[str, Any]) -> List[Tuple[str, str]]:
+        """Flattens list values into repeated form fields, the way requests
+        encodes them."""
+        data = []
+        for name, value in fields:
+            values = value if isinstance(value, (list, tuple)) else [value]
+            data += [(name, str(item)) for item in values if item is not None]
+        return data
+
+    async def parse_page(self, url: str) -> html:
+        try:
+            with self.metrics.time('parse_page'):
+                async with self.client.get(url) as page:
+                    page.raise_for_status()
+                    return self.parse(await page.text())
+
+        except aiohttp.ClientResponseError:
+            raise PageError(url)
+        except aiohttp.ClientConnectionError:
+            raise PageError(url)
+        except Exception:
+            log.error("Failed to parse page.")
+
+    async def get_lists(
+        self,
+        urls: List[str]
+    ) -> List[Mapping[int, Episode]]:
+        """Resolves the episode lists of several titles concurrently, at
+        most `workers` at a time, returned in the order of `urls`."""
+        semaphore = self.semaphore
+
+        async def get_list(url: str) -> Mapping[int, Episode]:
+            async with semaphore:
+                return await self.get_list(url)
+
+        return list(await asyncio.gather(*(get_list(url) for url in urls)))
+
+    @retry_async()
+    async def get_img(self, img_url: str) -> bytes:
+        with self.metrics.time('image_ttfb'):
+            img = await self.client.get(img_url)
+        async with img:
+            img.raise_for_status()
+            with self.metrics.time('image_body'):
+                body = await img.read()
+        self.metrics.count('image_bytes', len(body))
+        return body
+
+    async def download(self, img_url: str, seed: str, output: str) -> bool:
+        try:
+            img = await self.get_img(img_url)
+            loop = asyncio.get_running_loop()
+
+            if seed.isupper():
+                await loop.run_in_executor(
+                    None, self.unscramble, img, seed, output
+                )
+                self.metrics.count('output_bytes', os.path.getsize(
+                    f"{output}.{get_format(self.format)}"
+                ))
+            else:
+                await loop.run_in_executor(
+                    None, self._write, f"{output}.{self.extension}", img
+                )
+            self.metrics.count('pages')
+            return True
+
+        except Exception as err:
+            log.error(f"Unable to download image. {err}")
+            self.metrics.count('pages_failed')
+
+        return False
+
+    async def compress(
+        self,
+        img_url: str,
+        seed: str,
+        page: str,
+        archive: ArchiveWriter,
+        index: int
+    ) -> None:
+        try:
+            img = await self.get_img(img_url)
+
+            if seed.isupper():
+                img = await asyncio.get_running_loop().run_in_executor(
+                    None, self.unscramble, img, seed
+                )
+                img = img.getbuffer()
+
+            archive.put(index, page, img)
+            return
+
+        except Exception as err:
+            log.error(f"Unable to download image. {err}")
+            self.metrics.count('pages_failed')
+
+        archive.skip(index)
+
+    def _write(self, output: str, content: bytes) -> None:
+        with self.metrics.time('write'), open(output, 'wb') as handler:
+            handler.write(content)
+        self.metrics.count('output_bytes', len(content))
+
+    async def fetch_all(
+        self,
+        urls: Iterable[str],
+        path: Optional[str] = None
+    ) -> Set[str]:
+        """Fetch several episodes one after another, the pages of each
+        concurrently. Returns the urls of the episodes that have every
+        page on disk."""
+        completed = set()
+        for url in urls:
+            if await self.fetch(url, path):
+                completed.add(url)
+        return completed
+
+    async def fetch(self, url: str, path: Optional[str] = None) -> bool:
+        """Fetch an episode; returns whether every page is on disk."""
+        try:
+            with self.metrics.time('get_pdata'):
+                pdata = await self.get_pdata(url)
+            sys.stdout.write(
+                f"\nTitle: {pdata['title']}\n"
+                f"Episode: {pdata['ep_title']}\n"
+            )
+
+            if not path:
+                path = os.path.join(os.getcwd(), 'extract')
+
+            start_time = perf_counter()
+            pages, skipped = await self._fetch(
+                pdata['img'],
+                pdata['title'],
+                pdata['ep_title'],
+                path
+            )
+            elapsed = perf_counter() - start_time
+            rate = pages / elapsed if elapsed else 0
+
+            exec_time = strftime("%H:%M:%S", gmtime(elapsed))
+            sys.stdout.write(
+                f"\nElapsed time: {exec_time} "
+                f"({pages} pages, {rate:.2f} pages/sec)\n\n"
+            )
+            sys.stdout.flush()
+            return pages + skipped == len(pdata['img'])
+
+        except TypeError:
+            log.error("Unable to fetch episode.")
+        except IndexError:
+            log.error(f"Unable to access page on {url}")
+        except Exception as err:
+            raise PyccomaError(err)
+
+        return False
+
+    async def _fetch(
+        self,
+        episode: List[str],
+        title: str,
+        ep_title: str,
+        path: str
+    ) -> Tuple[int, int]:
+        """Returns the number of pages saved and skipped."""
+        try:
+            count = saved = skipped = 0
+            episode_size = len(episode)
+            checksum = self.get_checksum(episode[0])
+            key = self.get_key(episode[0])
+            seed = self.get_seed(checksum, key)
+            title = safe_filename(title)
+            ep_title = safe_filename(ep_title)
+            semaphore = self.semaphore
+
+            if not self.archive:
+                head_path = os.path.join(path, f"{title}/{ep_title}/")
+                path = create_path(head_path)
+            else:
+                head_path = os.path.join(path, f"{title}_{ep_title}.cbz")
+                path = create_path(path)
+
+                if os.path.exists(head_path):
+                    log.warning(f"File already exists: {head_path}")
+
+                archive = ArchiveWriter(head_path, metrics=self.metrics)
+
+            async def fetch_page(func, *args) -> None:
+                nonlocal count, saved
+                async with semaphore:
+                    if await func(*args):
+                        saved += 1
+                count += 1
+                display_progress_bar(count, episode_size)
+
+            tasks = []
+
+            for index, url in enumerate(episode):
+                output = os.path.join(
+                    path,
+                    page := pad_string(str(index + 1), length=self.zeropad)
+                )
+
+                if not self.archive and os.path.exists(file_name := f"{output}.{self.extension}"):  # noqa:E501
+                    log.debug(f"File already exists: {file_name}")
+                    self.metrics.count('pages_skipped')
+                elif self.archive and (file_name := f"{page}.{self.extension}") in archive:  # noqa:E501
+                    log.debug(f"File already exists: {file_name}")
+                    self.metrics.count('pages_skipped')
+                    archive.skip(index)
+                elif self.archive:
+                    tasks.append(fetch_page(
+                        self.compress, url, seed, file_name, archive, index
+                    ))
+                    continue
+                else:
+                    tasks.append(fetch_page(self.download, url, seed, output))
+                    continue
+
+                skipped += 1
+                count += 1
+                display_progress_bar(count, episode_size)
+
+            await asyncio.gather(*tasks)
+
+            if self.archive:
+                await asyncio.get_running_loop().run_in_executor(
+                    None, archive.close
+                )
+                # Written by the archive thread, failed writes excluded.
+                return archive.written, skipped
+
+            return saved, skipped
+
+        except Exception as err:
+            log.error(f"Unable to fetch episode. {err}")
+
+        return 0, 0
@@ -0,0 +1,123 @@
+import queue
+import logging
+
+from threading import Thread
+from time import perf_counter
+from typing import Callable, Dict, List, Optional, Tuple, Union
+from zipfile import ZipFile, ZIP_STORED
+
+from pyccoma.metrics import Metrics
+
+log = logging.getLogger(__name__)
+
+Entry = Optional[Tuple[str, Union[bytes, memoryview]]]
+
+
+class ArchiveWriter:
+    """Owns one cbz archive and writes its entries from a dedicated thread.
+
+    Page workers hand over encoded pages with `put` and never wait on the
+    archive. Entries are written in page order: a page that completes early
+    is held back until every page before it has been written or skipped.
+    Pages are already compressed images, so entries are stored by default.
+
+    `on_write(index, name, data)` is called from the writer thread after
+    each entry is written, and writes are timed into `metrics` if given.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        compression: int = ZIP_STORED,
+        on_write: Optional[Callable[[int, str, bytes], None]] = None,
+        metrics: Optional[Metrics] = None
+    ):
+        self.path = path
+        self.on_write = on_write
+        self.metrics = metrics
+        self.file = ZipFile(path, "a", compression, False)
+        self.written = 0
+        self._names = set(self.file.namelist())
+        self._queue: "queue.Queue[Optional[Tuple[int, Entry]]]" = queue.Queue()
+        self._pending: Dict[int, Entry] = {}
+        self._next = 0
+        self._thread = Thread(
+            target=self._work,
+            name=f"pyccoma-archive-{id(self):x}",
+            daemon=True
+        )
+        self._thread.start()
+
+    def namelist(self) -> List[str]:
+        return list(self._names)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._names
+
+    def put(
+        self,
+        index: int,
+        name: str,
+        data: Union[bytes, memoryview]
+    ) -> None:
+        """Queues the entry for page `index`. `data` must not be reused by
+        the caller afterwards."""
+        self._queue.put((index, (name, data)))
+
+    def skip(self, index: int) -> None:
+        """Marks page `index` as having no entry, so later pages are not
+        held back waiting for it."""
+        self._queue.put((index, None))
+
+    def close(self) -> None:
+        """Writes out whatever is still held back, then closes the archive
+        so its central directory is flushed to disk."""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+    def _work(self) -> None:
+        try:
+            while (item := self._queue.get()) is not None:
+                index, entry = item
+                self._pending[index] = entry
+
+                while self._next in self._pending:
+                    self._write(self._next, self._pending.pop(self._next))
+                    self._next += 1
+
+            # Pages that were never reported leave gaps; keep the order of
+            # what did arrive.
+            for index in sorted(self._pending):
+                self._write(index, self._pending.pop(index))
+
+        finally:
+            self.file.close()
+
+    def _write(self, index: int, entry: Entry) -> None:
+        if entry is None:
+            return
+
+        name, data = entry
+        start = perf_counter()
+        try:
+            self.file.writestr(name, data)
+        except Exception as err:
+            log.error(f"Unable to write {name} to {self.path}. {err}")
+            if self.metrics:
+                self.metrics.count('pages_failed')
+            return
+
+        self._names.add(name)
+        self.written += 1
+
+        if self.metrics:
+            end = perf_counter()
+            self.metrics.observe('zip', end - start)
+            self.metrics.count('pages')
+            self.metrics.count('output_bytes', len(data))
+            if self.metrics.tracer:
+                self.metrics.tracer.add('zip', start, end, page=name)
+
+        if self.on_write:
+            self.on_write(index, name, data)
@@ -0,0 +1,358 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import json
+import shutil
+import logging
+import zipfile
+import argparse
+import tempfile
+import multiprocessing
+
+from contextlib import redirect_stdout
+from time import perf_counter, process_time
+from typing import Any, Dict, List
+
+try:
+    import resource
+except ImportError:  # pragma: no cover
+    resource = None
+
+from pyccoma.standin import StandIn, attach
+
+log = logging.getLogger(__name__)
+
+DRIVERS = ('fetch', 'main')
+MODES = ('directory', 'archive')
+
+
+def get_scraper(config: Dict[str, Any]):
+    if config['region'] == 'fr':
+        from pyccoma.fr.pyccoma import Pyccoma
+    else:
+        from pyccoma.jp.pyccoma import Pyccoma
+
+    scraper = Pyccoma()
+    scraper.workers = config['workers']
+    scraper.unscramble_workers = config['unscramble_workers']
+    scraper.format = config['format']
+    scraper.encoder_profile = config['encoder_profile']
+    scraper.archive = config['mode'] == 'archive'
+    return scraper
+
+
+def count_pages(path: str) -> int:
+    pages = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            if name.endswith(".cbz"):
+                with zipfile.ZipFile(os.path.join(root, name)) as archive:
+                    pages += len(archive.namelist())
+            elif not name.startswith("."):
+                pages += 1
+    return pages
+
+
+def get_peak_rss() -> float:
+    """Peak resident set size of this process in MB, if known."""
+    if not resource:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes elsewhere.
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+
+
+def get_children_cpu() -> float:
+    if not resource:
+        return 0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def run(
+    config: Dict[str, Any],
+    address: str,
+    urls: Dict[str, List[str]],
+    results: multiprocessing.Queue
+) -> None:
+    """Runs one scenario; meant to be its own process, so that CPU time
+    and peak RSS belong to that scenario alone."""
+    os.environ['XDG_CACHE_HOME'] = config['cache_dir']
+    logging.basicConfig(level=config['loglevel'])
+
+    scraper = get_scraper(config)
+    attach(scraper, address)
+    output = tempfile.mkdtemp(prefix="pyccoma-bench-")
+
+    try:
+        start = perf_counter()
+        cpu = process_time()
+
+        with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+            if config['driver'] == 'main':
+                from pyccoma import __main__ as cli
+                cli.pyccoma = scraper
+                cli.region = config['region']
+                cli.fetch(urls['products'], 'all', None, "", "", output)
+            else:
+                for url in urls['viewers']:
+                    scraper.fetch(url, output)
+
+            if scraper.unscramble_workers:
+                scraper.unscramble_pool.shutdown()
+
+        results.put({
+            'seconds': perf_counter() - start,
+            'cpu_seconds': process_time() - cpu + get_children_cpu(),
+            'peak_rss_mb': get_peak_rss(),
+            'pages': count_pages(output),
+        })
+
+    finally:
+        shutil.rmtree(output, ignore_errors=True)
+
+
+def bench(
+    standin: StandIn,
+    config: Dict[str, Any],
+    driver: str,
+    mode: str
+) -> Dict[str, Any]:
+    region = config['region']
+    urls = {
+        'products': standin.product_urls(region),
+        'viewers': standin.viewer_urls(region),
+    }
+    config = dict(config, driver=driver, mode=mode)
+    standin.counters(reset=True)
+
+    results = multiprocessing.Queue()
+    process = multiprocessing.Process(
+        target=run, args=(config, standin.address, urls, results)
+    )
+    process.start()
+    process.join()
+
+    if process.exitcode != 0 or results.empty():
+        raise RuntimeError(f"Benchmark {driver}/{mode} failed.")
+
+    result = results.get()
+    counters = standin.counters()
+    pages = result['pages']
+    seconds = result['seconds']
+
+    return {
+        'driver': driver,
+        'mode': mode,
+        'pages': pages,
+        'expected_pages': len(urls['viewers']) * standin.pages,
+        'seconds': seconds,
+        'pages_per_sec': pages / seconds if seconds else 0,
+        'mb_per_sec': counters['image_bytes'] / 2**20 / seconds
+        if seconds else 0,
+        'cpu_per_page': result['cpu_seconds'] / pages if pages else 0,
+        'peak_rss_mb': result['peak_rss_mb'],
+        'image_requests': counters['image_requests'],
+        'errors': counters['errors'],
+    }
+
+
+def construct_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="pyccoma-bench",
+        description="""
+        Measure pyccoma throughput against a local stand-in for Piccoma and
+        its image CDN, in directory and --archive mode.
+        """
+    )
+
+    site = parser.add_argument_group("Stand-in options")
+    site.add_argument(
+        "--region",
+        type=str.lower,
+        choices=("jp", "fr"),
+        default="jp",
+        help="Which site to stand in for. (Default: jp)"
+    )
+    site.add_argument(
+        "--products",
+        type=int,
+        metavar=("COUNT"),
+        default=2,
+        help="Number of titles. (Default: 2)"
+    )
+    site.add_argument(
+        "--episodes",
+        type=int,
+        metavar=("COUNT"),
+        default=4,
+        help="Number of episodes per title. (Default: 4)"
+    )
+    site.add_argument(
+        "--pages",
+        type=int,
+        metavar=("COUNT"),
+        default=12,
+        help="Number of pages per episode. (Default: 12)"
+    )
+    site.add_argument(
+        "--page-size",
+        type=int,
+        nargs=2,
+        metavar=("WIDTH", "HEIGHT"),
+        default=(800, 1131),
+        help="Size of each page. (Default: 800 1131)"
+    )
+    site.add_argument(
+        "--plain",
+        action="store_true",
+        help="Serve pages unscrambled, so nothing needs unscrambling."
+    )
+    site.add_argument(
+        "--latency",
+        type=float,
+        metavar=("MS"),
+        default=20,
+        help="Delay before every response, in milliseconds. (Default: 20)"
+    )
+    site.add_argument(
+        "--bandwidth",
+        type=float,
+        metavar=("MBPS"),
+        help="""
+        Rate at which each response body is sent, in megabytes per second.
+        (Default: unlimited)
+        """
+    )
+    site.add_argument(
+        "--error-rate",
+        type=float,
+        metavar=("RATIO"),
+        default=0,
+        help="Share of image requests answered with 503. (Default: 0)"
+    )
+
+    options = parser.add_argument_group("Run options")
+    options.add_argument(
+        "--drivers",
+        nargs="+",
+        choices=DRIVERS,
+        default=list(DRIVERS),
+        help="""
+        Code paths to drive: fetch calls Scraper.fetch for every episode,
+        main aggregates every title like `pyccoma URL --filter all`.
+        (Default: fetch main)
+        """
+    )
+    options.add_argument(
+        "--modes",
+        nargs="+",
+        choices=MODES,
+        default=list(MODES),
+        help="Output modes to run. (Default: directory archive)"
+    )
+    options.add_argument(
+        "--workers",
+        type=int,
+        metavar=("COUNT"),
+        default=8,
+        help="Number of pages to download concurrently. (Default: 8)"
+    )
+    options.add_argument(
+        "--unscramble-workers",
+        type=int,
+        metavar=("COUNT"),
+        default=0,
+        help="Number of processes to unscramble pages on. (Default: 0)"
+    )
+    options.add_argument(
+        "-f",
+        "--format",
+        type=str,
+        default="png",
+        help="Image format. (Default: png)"
+    )
+    options.add_argument(
+        "--encoder-profile",
+        type=str,
+        choices=("fast", "balanced", "small"),
+        default="balanced",
+        help="Encoder profile. (Default: balanced)"
+    )
+    options.add_argument(
+        "--json",
+        action="store_true",
+        help="Print results as JSON, e.g. to compare against a baseline."
+    )
+    options.add_argument(
+        "--loglevel",
+        type=str.upper,
+        default="ERROR",
+        help="Log level of the benchmarked scraper. (Default: ERROR)"
+    )
+
+    return parser
+
+
+def main() -> None:
+    parser = construct_parser()
+    args = parser.parse_args()
+
+    standin = StandIn(
+        products=args.products,
+        episodes=args.episodes,
+        pages=args.pages,
+        page_size=tuple(args.page_size),
+        scrambled=not args.plain,
+        latency=args.latency / 1000,
+        bandwidth=args.bandwidth * 2**20 if args.bandwidth else None,
+        error_rate=args.error_rate
+    ).start()
+    standin.serve_in_thread()
+    cache_dir = tempfile.mkdtemp(prefix="pyccoma-bench-cache-")
+
+    config = {
+        'region': args.region,
+        'workers': args.workers,
+        'unscramble_workers': args.unscramble_workers,
+        'format': args.format,
+        'encoder_profile': args.encoder_profile,
+        'cache_dir': cache_dir,
+        'loglevel': args.loglevel,
+    }
+
+    try:
+        results = []
+        for driver in args.drivers:
+            for mode in args.modes:
+                results.append(bench(standin, config, driver, mode))
+                if not args.json:
+                    print_result(results[-1])
+
+        if args.json:
+            json.dump({'config': vars(args), 'results': results}, sys.stdout)
+            sys.stdout.write("\n")
+
+    except KeyboardInterrupt:
+        pass
+    finally:
+        standin.shutdown()
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+def print_result(result: Dict[str, Any]) -> None:
+    missing = result['expected_pages'] - result['pages']
+    print(
+        f"{result['driver']:<6} {result['mode']:<10} "
+        f"{result['pages']:5d} pages {result['seconds']:7.2f}s "
+        f"{result['pages_per_sec']:8.1f} pages/s "
+        f"{result['mb_per_sec']:7.1f} MB/s "
+        f"{result['cpu_per_page'] * 1000:7.1f} ms CPU/page "
+        f"{result['peak_rss_mb']:7.1f} MB peak RSS"
+        + (f" ({missing} pages missing)" if missing else "")
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+import os
+import re
+import json
+import hashlib
+import logging
+import tempfile
+
+from collections import OrderedDict
+from threading import Lock
+from time import time
+from typing import Dict, List, Optional, Pattern, Tuple, Union
+
+from requests import Response, Session
+from requests.structures import CaseInsensitiveDict
+
+log = logging.getLogger(__name__)
+
+# Seconds a response stays fresh, by the first pattern its url matches.
+# Viewer pages carry signed image urls that expire, so they are never
+# cached; anything unlisted (login pages, the FR build id) is not either.
+DEFAULT_TTLS: List[Tuple[str, float]] = [
+    (r"/viewer/", 0),
+    (r"/bookshelf/", 60),
+    (r"/product/", 300),
+]
+
+VALIDATORS = ('ETag', 'Last-Modified', 'Content-Type')
+
+
+class CacheEntry:
+    """A stored 200 response: body, the headers needed to revalidate and
+    decode it, and when it was last confirmed fresh."""
+
+    __slots__ = ('url', 'content', 'headers', 'encoding', 'stored_at')
+
+    def __init__(
+        self,
+        url: str,
+        content: bytes,
+        headers: Dict[str, str],
+        encoding: Optional[str] = None,
+        stored_at: Optional[float] = None
+    ):
+        self.url = url
+        self.content = content
+        self.headers = headers
+        self.encoding = encoding
+        self.stored_at = time() if stored_at is None else stored_at
+
+    def age(self) -> float:
+        return time() - self.stored_at
+
+    def to_response(self) -> Response:
+        response = Response()
+        response.status_code = 200
+        response.url = self.url
+        response.headers = CaseInsensitiveDict(self.headers)
+        response.encoding = self.encoding
+        response._content = self.content
+        return response
+
+
+class MemoryStore:
+    """Bounded LRU of cache entries."""
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self._items: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        with self._lock:
+            entry = self._items.get(key)
+            if entry:
+                self._items.move_to_end(key)
+            return entry
+
+    def set(self, key: str, entry: CacheEntry) -> None:
+        with self._lock:
+            self._items[key] = entry
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+
+class DiskStore:
+    """Cache entries as a metadata and a body file per key under `path`,
+    so they survive between runs."""
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def _file(self, key: str) -> str:
+        return os.path.join(self.path, hashlib.sha1(key.encode()).hexdigest())
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        name = self._file(key)
+        try:
+            with open(f"{name}.json") as meta:
+                meta = json.load(meta)
+            with open(f"{name}.body", 'rb') as body:
+                return CacheEntry(content=body.read(), **meta)
+        except (OSError, ValueError, TypeError):
+            return None
+
+    def set(self, key: str, entry: CacheEntry) -> None:
+        name = self._file(key)
+        meta = {
+            'url': entry.url,
+            'headers': entry.headers,
+            'encoding': entry.encoding,
+            'stored_at': entry.stored_at,
+        }
+        try:
+            # Body first, so a metadata file always has a complete body.
+            for suffix, data, mode in (
+                ('body', entry.content, 'wb'),
+                ('json', json.dumps(meta), 'w'),
+            ):
+                # A temp file of its own per writer, as threads and other
+                # processes sharing the directory may store the same key.
+                fd, temp = tempfile.mkstemp(
+                    dir=self.path, prefix=f"{os.path.basename(name)}.",
+                    suffix=".tmp"
+                )
+                try:
+                    with os.fdopen(fd, mode) as file:
+                        file.write(data)
+                    os.replace(temp, f"{name}.{suffix}")
+                except BaseException:
+                    os.unlink(temp)
+                    raise
+        except OSError as err:
+            log.warning(f"Unable to write cache entry for {entry.url}. {err}")
+
+    def clear(self) -> None:
+        for name in os.listdir(self.path):
+            if name.endswith(('.json', '.body')):
+                os.remove(os.path.join(self.path, name))
+
+
+class ResponseCache:
+    """Caches GET responses for metadata pages.
+
+    Fresh entries are served without a request. Stale entries that carry
+    an ETag or Last-Modified are revalidated with a conditional request,
+    so an unchanged page costs a 304 instead of a full body. Entries are
+    looked up in memory first, then on disk if a `path` is given.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        ttls: Optional[List[Tuple[Union[str, Pattern], float]]] = None,
+        maxsize: int = 256
+    ):
+        self.stores: List[Union[MemoryStore, DiskStore]] = [
+            MemoryStore(maxsize)
+        ]
+        if path:
+            self.stores.append(DiskStore(path))
+
+        self.ttls = [
+            (re.compile(pattern), ttl)
+            for pattern, ttl in (DEFAULT_TTLS if ttls is None else ttls)
+        ]
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.bypassed = 0
+        self._lock = Lock()
+
+    def get_ttl(self, url: str) -> float:
+        for pattern, ttl in self.ttls:
+            if pattern.search(url):
+                return ttl
+        return 0
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _lookup(self, key: str) -> Optional[CacheEntry]:
+        for index, store in enumerate(self.stores):
+            entry = store.get(key)
+            if entry:
+                # Promote disk entries so the next lookup stays in memory.
+                for upper in self.stores[:index]:
+                    upper.set(key, entry)
+                return entry
+        return None
+
+    def _store(self, key: str, entry: CacheEntry) -> None:
+        for store in self.stores:
+            store.set(key, entry)
+
+    def get(
+        self,
+        session: Session,
+        url: str,
+        headers: Optional[Dict[str, str]] = None,
+        key: Optional[str] = None
+    ) -> Response:
+        """GETs `url` through the cache. `key` separates entries of the
+        same url, e.g. logged in and anonymous pages."""
+        ttl = self.get_ttl(url)
+
+        if ttl <= 0:
+            self._count('bypassed')
+            return session.get(url, headers=headers)
+
+        key = key or url
+        entry = self._lookup(key)
+
+        if entry and entry.age() < ttl:
+            self._count('hits')
+            return entry.to_response()
+
+        headers = dict(headers or {})
+        if entry and 'ETag' in entry.headers:
+            headers['If-None-Match'] = entry.headers['ETag']
+        if entry and 'Last-Modified' in entry.headers:
+            headers['If-Modified-Since'] = entry.headers['Last-Modified']
+
+        response = session.get(url, headers=headers)
+
+        if entry and response.status_code == 304:
+            self._count('revalidated')
+            entry.stored_at = time()
+            self._store(key, entry)
+            return entry.to_response()
+
+        self._count('misses')
+
+        if response.status_code == 200:
+            self._store(key, CacheEntry(
+                url,
+                response.content,
+                {
+                    name: response.headers[name] for name in VALIDATORS
+                    if name in response.headers
+                },
+                response.encoding
+            ))
+
+        return response
+
+    def clear(self) -> None:
+        for store in self.stores:
+            store.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'revalidated': self.revalidated,
+                'bypassed': self.bypassed,
+            }
+
+    def __str__(self) -> str:
+        stats = self.stats()
+        return (
+            f"{stats['hits']} hits, {stats['revalidated']} revalidated, "
+            f"{stats['misses']} misses, {stats['bypassed']} not cacheable"
+        )
@@ -1,3 +1,7 @@
+from functools import lru_cache
+
+
+@lru_cache(maxsize=64)
 def dd(input_string):
     result_bytearray = bytearray()
     for index, byte in enumerate(bytes(input_string, 'utf-8')):
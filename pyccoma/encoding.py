@@ -0,0 +1,48 @@
+from typing import Any, Dict
+
+FORMATS = ('png', 'jpg', 'jpeg', 'gif', 'bmp', 'webp', 'webp-lossless')
+
+# Encoder settings per profile. "balanced" keeps Pillow's defaults, so its
+# output stays byte-identical to pycasso.Canvas.
+PROFILES: Dict[str, Dict[str, Dict[str, Any]]] = {
+    'fast': {
+        'png': {'compress_level': 1},
+        'jpeg': {'quality': 65, 'subsampling': 2},
+        'webp': {'quality': 75, 'method': 0},
+        'webp-lossless': {'lossless': True, 'quality': 0, 'method': 0},
+    },
+    'balanced': {
+        'png': {},
+        'jpeg': {},
+        'webp': {'quality': 80, 'method': 4},
+        'webp-lossless': {'lossless': True, 'quality': 80, 'method': 4},
+    },
+    'small': {
+        'png': {'optimize': True},
+        'jpeg': {'optimize': True},
+        'webp': {'quality': 70, 'method': 6},
+        'webp-lossless': {'lossless': True, 'quality': 100, 'method': 6},
+    },
+}
+
+
+def get_format(format: str) -> str:
+    """Returns the Pillow format name for an output format."""
+    if format == "jpg":
+        return "jpeg"
+    if format == "webp-lossless":
+        return "webp"
+    return format
+
+
+def get_extension(format: str) -> str:
+    return "webp" if format == "webp-lossless" else format
+
+
+def get_options(format: str, profile: str = "balanced") -> Dict[str, Any]:
+    """Returns the keyword arguments to pass to Image.save."""
+    if profile not in PROFILES:
+        raise ValueError("Invalid profile.")
+
+    format = "jpeg" if format == "jpg" else format
+    return PROFILES[profile].get(format, {})
@@ -0,0 +1,131 @@
+import queue
+import logging
+
+from time import monotonic
+from threading import Thread, Condition, Lock
+from typing import Any, Callable, List, Optional
+
+log = logging.getLogger(__name__)
+
+
+class Batch:
+    """Tracks completion of a group of tasks submitted to a PageEngine."""
+
+    def __init__(
+        self,
+        callback: Optional[Callable[["Batch"], None]] = None
+    ):
+        self.callback = callback
+        self._submitted = 0
+        self._done = 0
+        self._settled = 0
+        self._cond = Condition()
+
+    @property
+    def submitted(self) -> int:
+        return self._submitted
+
+    @property
+    def done(self) -> int:
+        return self._done
+
+    @property
+    def pending(self) -> int:
+        return self._submitted - self._done
+
+    def _add(self) -> None:
+        with self._cond:
+            self._submitted += 1
+
+    def _complete(self) -> None:
+        with self._cond:
+            self._done += 1
+
+        # Run the callback before waking waiters so that progress output
+        # is complete by the time wait() returns.
+        if self.callback:
+            self.callback(self)
+
+        with self._cond:
+            self._settled += 1
+            self._cond.notify_all()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        deadline = None if timeout is None else monotonic() + timeout
+
+        with self._cond:
+            while self._settled < self._submitted:
+                remaining = 0.5 if deadline is None else deadline - monotonic()
+                if remaining <= 0:
+                    return False
+                # Wake up periodically so KeyboardInterrupt reaches the caller.
+                self._cond.wait(min(remaining, 0.5))
+            return True
+
+
+class PageEngine:
+    """Fixed pool of worker threads fed from a bounded work queue.
+
+    Submitting blocks once the queue is full, so producers never get
+    more than `queue_size` tasks ahead of the workers.
+    """
+
+    def __init__(self, workers: int = 8, queue_size: Optional[int] = None):
+        if workers < 1:
+            raise ValueError("Number of workers must be at least one.")
+
+        self.workers = workers
+        self.queue_size = queue_size or workers * 2
+        self._queue = queue.Queue(self.queue_size)
+        self._threads: List[Thread] = []
+        self._lock = Lock()
+
+    def start(self) -> None:
+        with self._lock:
+            if self._threads:
+                return
+
+            for index in range(self.workers):
+                thread = Thread(
+                    target=self._work,
+                    name=f"pyccoma-page-{index}",
+                    daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(
+        self,
+        batch: Batch,
+        func: Callable[..., Any],
+        *args: Any
+    ) -> None:
+        self.start()
+        batch._add()
+        self._queue.put((batch, func, args))
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._lock:
+            threads, self._threads = self._threads, []
+
+        for _ in threads:
+            self._queue.put(None)
+
+        if wait:
+            for thread in threads:
+                thread.join()
+
+    def _work(self) -> None:
+        while True:
+            task = self._queue.get()
+
+            if task is None:
+                break
+
+            batch, func, args = task
+            try:
+                func(*args)
+            except Exception as err:
+                log.error(f"Unhandled error in page worker. {err}")
+            finally:
+                batch._complete()
@@ -13,3 +13,10 @@ class LoginError(PyccomaError):
     def __init__(self):
         err = "Login required."
         Exception.__init__(self, err)
+
+
+class ParseError(PyccomaError):
+    def __init__(self, message, pos):
+        err = f"{message} at position {pos}"
+        Exception.__init__(self, err)
+        self.pos = pos
@@ -0,0 +1,150 @@
+import re
+
+from typing import Callable, Iterable, List, Mapping, Optional, TypeVar
+
+from pyccoma.episode import BITS, FLAGS, Episode
+
+TOKEN = re.compile(
+    r'\s*(?:(?P<open>\()|(?P<close>\))|(?P<and>&|and\b)|(?P<or>\||or\b)'
+    r'|(?P<not>!|not\b)|(?P<flag>\w+))'
+)
+
+T = TypeVar('T', bound=Mapping)
+Predicate = Callable[[int], bool]
+
+
+def episode_mask(episode: Mapping) -> int:
+    """Packs the state flags of an episode into an int; missing flags,
+    e.g. is_zero_plus on volumes, count as unset."""
+    if isinstance(episode, Episode):
+        return episode.flags
+
+    mask = 0
+    for flag, bit in BITS.items():
+        if episode.get(flag):
+            mask |= bit
+    return mask
+
+
+class ExpressionParser:
+    """Recursive descent over `a|b`, `a&b`, `!a` (or `or`, `and`, `not`)
+    and parentheses, `&` binding tighter than `|`."""
+
+    def __init__(self, expression: str):
+        self.expression = expression
+        self.tokens = []
+        pos = 0
+
+        while pos < len(expression.rstrip()):
+            match = TOKEN.match(expression, pos)
+            if not match:
+                raise ValueError(
+                    f"Unexpected {expression[pos:].strip()!r} in filter."
+                )
+            self.tokens.append((match.lastgroup, match.group(match.lastgroup)))
+            pos = match.end()
+
+        self.index = 0
+
+    def parse(self) -> Predicate:
+        predicate = self._or()
+        if self.index < len(self.tokens):
+            raise ValueError(
+                f"Unexpected {self.tokens[self.index][1]!r} in filter."
+            )
+        return predicate
+
+    def _peek(self) -> Optional[str]:
+        if self.index < len(self.tokens):
+            return self.tokens[self.index][0]
+        return None
+
+    def _next(self):
+        if self.index >= len(self.tokens):
+            raise ValueError(f"Incomplete filter: {self.expression!r}")
+        self.index += 1
+        return self.tokens[self.index - 1]
+
+    def _or(self) -> Predicate:
+        terms = [self._and()]
+        while self._peek() == 'or':
+            self._next()
+            terms.append(self._and())
+        if len(terms) == 1:
+            return terms[0]
+        return lambda mask: any(term(mask) for term in terms)
+
+    def _and(self) -> Predicate:
+        terms = [self._not()]
+        while self._peek() == 'and':
+            self._next()
+            terms.append(self._not())
+        if len(terms) == 1:
+            return terms[0]
+        return lambda mask: all(term(mask) for term in terms)
+
+    def _not(self) -> Predicate:
+        if self._peek() == 'not':
+            self._next()
+            term = self._not()
+            return lambda mask: not term(mask)
+        return self._atom()
+
+    def _atom(self) -> Predicate:
+        kind, value = self._next()
+
+        if kind == 'open':
+            predicate = self._or()
+            if self._next()[0] != 'close':
+                raise ValueError("Unbalanced parentheses in filter.")
+            return predicate
+
+        if kind == 'flag':
+            if value not in BITS:
+                raise ValueError(
+                    f"Unknown filter argument {value!r}, use one of: "
+                    f"{', '.join(FLAGS)}"
+                )
+            bit = BITS[value]
+            return lambda mask: bool(mask & bit)
+
+        raise ValueError(f"Unexpected {value!r} in filter.")
+
+
+def compile_expression(expression: str) -> Predicate:
+    """Compiles a filter expression; an empty one matches everything."""
+    if not expression.strip():
+        return lambda mask: True
+    return ExpressionParser(expression).parse()
+
+
+class Filter:
+    """Episode filter built from --include and --exclude expressions.
+
+    Both are compiled once into a truth table over every combination of
+    flags, so matching an episode is a single lookup by its flag mask.
+    """
+
+    def __init__(self, include: str = "", exclude: str = ""):
+        self.include = include
+        self.exclude = exclude
+        included = compile_expression(include)
+        excluded = compile_expression(exclude) if exclude.strip() \
+            else lambda mask: False
+        self.table = bytes(
+            included(mask) and not excluded(mask)
+            for mask in range(1 << len(FLAGS))
+        )
+
+    def matches(self, mask: int) -> bool:
+        return bool(self.table[mask])
+
+    def __call__(self, episode: Mapping) -> bool:
+        return bool(self.table[episode_mask(episode)])
+
+    def select(self, episodes: Iterable[T]) -> List[T]:
+        """Returns the matching episodes, in order."""
+        table = self.table
+        return [
+            episode for episode in episodes if table[episode_mask(episode)]
+        ]
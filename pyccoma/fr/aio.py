@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+
+import json
+import asyncio
+import logging
+
+import aiohttp
+
+from typing import Mapping, Optional, Union, Dict
+
+from pyccoma.aio import AsyncScraper
+from pyccoma.episode import Episode
+from pyccoma.exceptions import PageError, LoginError
+from pyccoma.fr.pyccoma import Parser
+
+from pyccoma.fr.urls import (
+    base_url,
+    login_url,
+    api_url,
+    history_url,
+    bookmark_url,
+    purchase_url,
+)
+
+log = logging.getLogger(__name__)
+
+
+class Pyccoma(Parser, AsyncScraper):
+    """The API url embeds the site's current buildId, which is resolved
+    on first use, from disk if a recent process already resolved it."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.api_url = None
+        self._api_lock = None
+
+    async def parse_json(self, url: str, refresh: bool = True) -> json:
+        try:
+            with self.metrics.time('parse_json'):
+                async with self.client.get(url) as page:
+                    stale = self.api_prefix(url)
+                    if page.status == 404 and refresh and stale:
+                        # Likely a new deployment, which another task may
+                        # have picked up already; retry once with the
+                        # current buildId.
+                        if (fresh := await self.get_api_url(stale)) != stale:
+                            return await self.parse_json(
+                                fresh + url[len(stale):], refresh=False
+                            )
+
+                    page.raise_for_status()
+                    return await page.json(content_type=None)
+
+        except aiohttp.ClientResponseError:
+            raise PageError(url)
+        except aiohttp.ClientConnectionError:
+            raise PageError(url)
+        except Exception:
+            log.error("Failed to parse page.")
+
+    async def get_api_url(self, stale: Optional[str] = None) -> str:
+        """Returns the API url, resolving it again if it is `stale`;
+        concurrent callers only resolve it once."""
+        if self.api_url and self.api_url != stale:
+            return self.api_url
+
+        # Created here rather than in __init__ so it binds to the running
+        # loop on Python 3.8 and 3.9.
+        if self._api_lock is None:
+            self._api_lock = asyncio.Lock()
+
+        async with self._api_lock:
+            # Resolved by another caller while this one was waiting.
+            if self.api_url and self.api_url != stale:
+                return self.api_url
+
+            build_id = None if stale else self.load_build_id()
+
+            if not build_id:
+                build_id = self.parse_build_id(
+                    await self.parse_page(base_url)
+                )
+                self.save_build_id(build_id)
+
+            self.api_url = api_url % build_id
+            return self.api_url
+
+    async def login(self, email: str, password: str) -> None:
+        try:
+            params = self.form(
+                ('email', email),
+                ('password', password),
+                ('redirect', '/fr/')
+            )
+
+            async with self.client.post(login_url, data=params) as login:
+                text = await login.text()
+
+                if login.ok and 'error' not in text:
+                    self._is_login = True
+                    self._account = email.lower()
+                    log.info(f"Successfully logged in as {email}")
+                else:
+                    self._is_login = False
+                    log.error(f"Failed to log in as {email}")
+
+        except Exception:
+            raise SystemExit("Failed to establish connection to server.")
+
+    async def get_list(self, url: str) -> Mapping[int, Episode]:
+        try:
+            return await self.get_episode_list(url)
+        except Exception:
+            raise PageError(url)
+
+    async def get_episode_list(
+        self,
+        url: str
+    ) -> Mapping[int, Episode]:
+        await self.get_api_url()
+        data = await self.parse_json(self.episode_list_url(url))
+        return self.parse_episode_list(url, data)
+
+    async def get_bdata(self, url: str) -> Dict[str, str]:
+        return self.parse_bdata(url, await self.parse_json(url))
+
+    async def get_pdata(self, url: str) -> Dict[str, Union[str, bool]]:
+        log.info(f"Parsing data from {url}")
+        await self.get_api_url()
+        return self.parse_pdata(await self.parse_json(self.pdata_url(url)))
+
+    async def get_history(self) -> Dict[str, str]:
+        if self._is_login:
+            url = history_url % await self.get_api_url()
+            return await self.get_bdata(url)
+        else:
+            raise LoginError
+
+    async def get_bookmark(self) -> Dict[str, str]:
+        if self._is_login:
+            url = bookmark_url % await self.get_api_url()
+            return await self.get_bdata(url)
+        else:
+            raise LoginError
+
+    async def get_purchase(self) -> Dict[str, str]:
+        if self._is_login:
+            url = purchase_url % await self.get_api_url()
+            return await self.get_bdata(url)
+        else:
+            raise LoginError
@@ -1,14 +1,20 @@
 #!/usr/bin/env python
 
+import os
+import re
 import json
 import logging
 import requests
+from lxml import html
+from threading import Lock
+from time import time
 from urllib.parse import parse_qs
-from typing import Mapping, Union, Dict
+from typing import Mapping, Optional, Union, Dict
 
 from pyccoma import Scraper
+from pyccoma.episode import Episode
 from pyccoma.exceptions import PyccomaError, PageError, LoginError
-from pyccoma.helpers import trunc_title
+from pyccoma.helpers import get_cache_dir, trunc_title, write_atomic
 
 from pyccoma.fr.urls import (
     base_url,
@@ -21,15 +27,22 @@ from pyccoma.fr.urls import (
 
 log = logging.getLogger(__name__)
 
+viewer_url = f"{base_url}/viewer"
+
+# The buildId changes with every deployment of the site; a stale one is
+# also detected by the 404 it causes, so this only bounds how long a
+# known-good id is trusted without asking.
+BUILD_ID_TTL = 24 * 60 * 60
+
+API_URL = re.compile(re.escape(api_url).replace('%s', r'[^/]+'))
+
+
+class Parser:
+    """Parsing shared by the sync and async Piccoma France scrapers; the
+    network-facing methods only fetch a document and hand it over."""
 
-class Pyccoma(Scraper):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.api_url = self.get_api_url()
-        self.history_url = history_url % self.api_url
-        self.bookmark_url = bookmark_url % self.api_url
-        self.purchase_url = purchase_url % self.api_url
-
         self._etype = {
             "manga": "volume",
             "smartoon": "episode",
@@ -69,87 +82,74 @@ class Pyccoma(Scraper):
         else:
             raise ValueError("Invalid type.")
 
-    def parse_json(self, url: str) -> json:
-        try:
-            page = self.session.get(url, headers=self.headers)
-            page.raise_for_status()
-            return page.json()
-
-        except requests.exceptions.HTTPError:
-            raise PageError(url)
-        except requests.exceptions.ConnectionError:
-            raise PageError(url)
-        except Exception:
-            log.error("Failed to parse page.")
-
-    def get_api_url(self) -> str:
+    def parse_build_id(self, page: html) -> str:
         try:
-            page = self.parse_page(base_url).xpath('//script[@id = "__NEXT_DATA__"]/text()')[0]  # noqa:E501
-            build_id = json.loads(page)['buildId']
-            new_api_url = api_url % build_id
-            return new_api_url
+            page = page.xpath('//script[@id = "__NEXT_DATA__"]/text()')[0]
+            return json.loads(page)['buildId']
         except IndexError:
             raise PageError(base_url)
 
-    def login(self, email: str, password: str) -> None:
+    def load_build_id(self) -> Optional[str]:
+        """Returns the buildId resolved by an earlier process, if recent."""
         try:
-            session = self.session.get(login_url, headers=self.headers)
-
-            params = {
-                'email': email,
-                'password': password,
-                'redirect': '/fr/',
-            }
-
-            login = self.session.post(
-                login_url,
-                data=params,
-                cookies=session.cookies,
-                headers=self.headers
-            )
-
-            if login.ok and not 'error' in login.text:
-                self._is_login = True
-                log.info(f"Successfully logged in as {email}")
-            else:
-                self._is_login = False
-                log.error(f"Failed to log in as {email}")
+            with open(self.build_id_path) as file:
+                data = json.load(file)
+            if time() - data['timestamp'] < BUILD_ID_TTL:
+                return data['build_id']
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+        return None
+
+    def save_build_id(self, build_id: str) -> None:
+        try:
+            write_atomic(self.build_id_path, json.dumps(
+                {'build_id': build_id, 'timestamp': time()}
+            ))
+        except OSError as err:
+            log.debug(f"Unable to save buildId. {err}")
+
+    def api_prefix(self, url: str) -> Optional[str]:
+        """Returns the API url `url` was built from, if any."""
+        if match := API_URL.match(url):
+            return match.group()
+        return None
 
-        except Exception:
-            raise SystemExit("Failed to establish connection to server.")
+    @property
+    def build_id_path(self) -> str:
+        return os.path.join(get_cache_dir(), "fr_build_id.json")
+
+    def episode_list_url(self, url: str) -> str:
+        if 'episode' in url:
+            type = 'episode'
+        elif 'volume' in url:
+            type = 'volume'
+        else:
+            raise ValueError("Invalid url.")
 
-    def get_list(self, url: str) -> Mapping[int, Dict[str, bool]]:
-        try:
-            return self.get_episode_list(url)
-        except Exception:
-            raise PageError(url)
+        product_id = url.split("/")[-1]
+        return self.api_url + f"/product/{type}/{product_id}.json?id={product_id}&pathname=%2Fproduct%2F%5Bid%5D"  # noqa:E501
 
-    def get_episode_list(
+    def parse_episode_list(
         self,
-        url: str
-    ) -> Mapping[int, Dict[str, Union[str, bool]]]:
+        url: str,
+        data: json
+    ) -> Mapping[int, Episode]:
         try:
-            if 'episode' in url:
-                type = 'episode'
-            elif 'volume' in url:
-                type = 'volume'
-            else:
-                raise ValueError("Invalid url.")
-
             product_id = url.split("/")[-1]
-            url = self.api_url + f"/product/{type}/{product_id}.json?id={product_id}&pathname=%2Fproduct%2F%5Bid%5D"  # noqa:E501
-            page = self.parse_json(url)['pageProps']['initialState']['episode']['episodeList']['episode_list']  # noqa:E501
+            page = data['pageProps']['initialState']['episode']['episodeList']['episode_list']  # noqa:E501
 
             episodes = {
-                id + 1: {
-                    'title': episode['title'],
-                    'url': f"{base_url}/viewer/{product_id}/{episode['id']}",  # noqa:E501
-                    'is_free': True if 'FR01' in episode['use_type'] else False,  # noqa:E501
-                    'is_read_for_free': True if 'RD01' in episode['use_type'] else False,  # noqa:E501
-                    'is_wait_until_free': True if 'WF15' in episode['use_type'] else False,  # noqa:E501
-                    'is_purchased': True if 'AB01' in episode['use_type'] else False,  # noqa:E501
-                    'is_already_read': episode['is_read'] if self._is_login else False,  # noqa:E501
-                }
+                id + 1: Episode(
+                    episode['title'],
+                    viewer_url,
+                    product_id,
+                    episode['id'],
+                    is_free='FR01' in episode['use_type'],
+                    is_read_for_free='RD01' in episode['use_type'],
+                    is_wait_until_free='WF15' in episode['use_type'],
+                    is_purchased='AB01' in episode['use_type'],
+                    is_already_read=episode['is_read'] if self._is_login else False,  # noqa:E501
+                )
                 for id, episode in enumerate(page)
             }
 
@@ -165,9 +165,9 @@ class Pyccoma(Scraper):
         except Exception as err:
             raise PyccomaError(err)
 
-    def get_bdata(self, url: str) -> Dict[str, str]:
+    def parse_bdata(self, url: str, data: json) -> Dict[str, str]:
         try:
-            page = self.parse_json(url)['pageProps']['initialState']
+            page = data['pageProps']['initialState']
 
             if 'history' in url:
                 page = page['history']['products']
@@ -192,13 +192,14 @@ class Pyccoma(Scraper):
         except Exception:
             log.error("Failed to parse library.")
 
-    def get_pdata(self, url: str) -> Dict[str, Union[str, bool]]:
+    def pdata_url(self, url: str) -> str:
+        product_id = url.split("/")[-2]
+        episode_id = url.split("/")[-1]
+        return self.api_url + f"/viewer/{product_id}/{episode_id}.json?productId={product_id}&episodeId={episode_id}"  # noqa:E501
+
+    def parse_pdata(self, data: json) -> Dict[str, Union[str, bool]]:
         try:
-            log.info(f"Parsing data from {url}")
-            product_id = url.split("/")[-2]
-            episode_id = url.split("/")[-1]
-            url = self.api_url + f"/viewer/{product_id}/{episode_id}.json?productId={product_id}&episodeId={episode_id}"  # noqa:E501
-            page = self.parse_json(url)['pageProps']['initialState']
+            page = data['pageProps']['initialState']
 
             authors = ' '.join([author['name'] for author in page['productDetail']['productDetail']['product']['authors']])  # noqa:E501
             title = page['productDetail']['productDetail']['product']['title'] + f" ({authors})"  # noqa:E501
@@ -218,6 +219,124 @@ class Pyccoma(Scraper):
     def get_checksum(self, img_url: str) -> str:
         return ' '.join(parse_qs(img_url)['q'])
 
+
+class Pyccoma(Parser, Scraper):
+    """The API url embeds the site's current buildId, which is resolved
+    on first use, from disk if a recent process already resolved it."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._api_url = None
+        self._api_lock = Lock()
+
+    @property
+    def api_url(self) -> str:
+        with self._api_lock:
+            if not self._api_url:
+                self._api_url = self.get_api_url()
+            return self._api_url
+
+    @property
+    def history_url(self) -> str:
+        return history_url % self.api_url
+
+    @property
+    def bookmark_url(self) -> str:
+        return bookmark_url % self.api_url
+
+    @property
+    def purchase_url(self) -> str:
+        return purchase_url % self.api_url
+
+    def parse_json(self, url: str) -> json:
+        try:
+            with self.metrics.time('parse_json'):
+                page = self.get_cached(url)
+
+                if page.status_code == 404 and \
+                        (stale := self.api_prefix(url)):
+                    # Likely a new deployment, which another thread may
+                    # have picked up already; retry once with the current
+                    # buildId.
+                    if (fresh := self.refresh_api_url(stale)) != stale:
+                        page = self.get_cached(fresh + url[len(stale):])
+
+                page.raise_for_status()
+                return page.json()
+
+        except requests.exceptions.HTTPError:
+            raise PageError(url)
+        except requests.exceptions.ConnectionError:
+            raise PageError(url)
+        except Exception:
+            log.error("Failed to parse page.")
+
+    def get_api_url(self, refresh: bool = False) -> str:
+        build_id = None if refresh else self.load_build_id()
+
+        if not build_id:
+            build_id = self.parse_build_id(self.parse_page(base_url))
+            self.save_build_id(build_id)
+
+        return api_url % build_id
+
+    def refresh_api_url(self, stale: str) -> str:
+        """Re-resolves the buildId after `stale` was rejected; concurrent
+        callers holding the same stale url only resolve it once."""
+        with self._api_lock:
+            if self._api_url in (stale, None):
+                self._api_url = self.get_api_url(refresh=True)
+                log.debug(f"Resolved new API url {self._api_url}")
+            return self._api_url
+
+    def login(self, email: str, password: str) -> None:
+        try:
+            session = self.session.get(login_url, headers=self.headers)
+
+            params = {
+                'email': email,
+                'password': password,
+                'redirect': '/fr/',
+            }
+
+            login = self.session.post(
+                login_url,
+                data=params,
+                cookies=session.cookies,
+                headers=self.headers
+            )
+
+            if login.ok and not 'error' in login.text:
+                self._is_login = True
+                self._account = email.lower()
+                log.info(f"Successfully logged in as {email}")
+            else:
+                self._is_login = False
+                log.error(f"Failed to log in as {email}")
+
+        except Exception:
+            raise SystemExit("Failed to establish connection to server.")
+
+    def get_list(self, url: str) -> Mapping[int, Episode]:
+        try:
+            return self.get_episode_list(url)
+        except Exception:
+            raise PageError(url)
+
+    def get_episode_list(
+        self,
+        url: str
+    ) -> Mapping[int, Episode]:
+        data = self.parse_json(self.episode_list_url(url))
+        return self.parse_episode_list(url, data)
+
+    def get_bdata(self, url: str) -> Dict[str, str]:
+        return self.parse_bdata(url, self.parse_json(url))
+
+    def get_pdata(self, url: str) -> Dict[str, Union[str, bool]]:
+        log.info(f"Parsing data from {url}")
+        return self.parse_pdata(self.parse_json(self.pdata_url(url)))
+
     def get_history(self) -> Dict[str, str]:
         if self._is_login:
             return self.get_bdata(self.history_url)
@@ -1,6 +1,7 @@
 import os
 import re
 import logging
+import tempfile
 
 from typing import Optional
 
@@ -26,23 +27,6 @@ def create_path(path: str) -> str:
     return path
 
 
-def create_tags(text: str) -> str:
-    identifiers = [
-        r'is_read_for_free',
-        r"is_wait_until_free",
-        r"is_already_read",
-        r"is_free",
-        r"is_zero_plus",
-        r"is_purchased",
-    ]
-    identifiers = "|".join(identifiers)
-    pattern = r"(\b" + identifiers + r")\b(\s*(" + identifiers + r")\b)*"
-
-    regex = re.compile(pattern, re.I)
-    tags = regex.sub(r"episode['\1']", text.strip('"'))
-    return tags
-
-
 def trunc_title(title: str) -> str:
     return re.sub(r"\((?:[^)(]|\([^)(]*\))*\)", "", title)
 
@@ -57,3 +41,26 @@ def pad_string(
             padding += "0"
         text = f"{padding}{text}"
     return text
+
+
+def get_cache_dir() -> str:
+    cache_home = os.environ.get("XDG_CACHE_HOME") or \
+        os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache_home, "pyccoma")
+
+
+def write_atomic(path: str, content: str) -> None:
+    """Replaces `path` in one rename, so readers never see a partial
+    file; each writer gets its own temp file next to it."""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, temp = tempfile.mkstemp(
+        dir=directory, prefix=f"{os.path.basename(path)}.", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, 'w') as file:
+            file.write(content)
+        os.replace(temp, path)
+    except OSError as err:
+        os.unlink(temp)
+        log.error(f"Unable to write {path}. {err}")
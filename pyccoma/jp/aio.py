@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+
+import asyncio
+import logging
+
+from typing import Mapping, Union, Dict
+
+from pyccoma.aio import AsyncScraper
+from pyccoma.episode import Episode
+from pyccoma.exceptions import PageError, LoginError
+from pyccoma.jp.pyccoma import Parser
+
+from pyccoma.jp.urls import (
+    login_url,
+    history_url,
+    bookmark_url,
+    purchase_url,
+    product_url
+)
+
+log = logging.getLogger(__name__)
+
+
+class Pyccoma(Parser, AsyncScraper):
+    async def get_login_status(self) -> bool:
+        return self.parse_login_status(await self.parse_page(login_url))
+
+    async def login(self, email: str, password: str) -> None:
+        try:
+            self.csrf = self.parse_csrf(await self.parse_page(login_url))
+
+            params = self.form(
+                ('csrfmiddlewaretoken', self.csrf),
+                ('next_url', '/web/'),
+                ('email', email),
+                ('password', password)
+            )
+            async with self.client.post(login_url, data=params) as response:
+                await response.read()
+
+            if await self.get_login_status():
+                self._is_login = True
+                self._account = email.lower()
+                log.info(f"Successfully logged in as {email}")
+            else:
+                self._is_login = False
+                log.error(f"Failed to log in as {email}")
+
+        except Exception:
+            raise SystemExit("Failed to establish connection to server.")
+
+    async def get_list(self, url: str) -> Mapping[int, Episode]:
+        try:
+            if url.endswith('V'):
+                return await self.get_volume_list(url)
+            elif url.endswith('E'):
+                return await self.get_episode_list(url)
+            else:
+                raise ValueError("Invalid input.")
+
+        except Exception:
+            raise PageError(url)
+
+    async def get_episode_list(
+        self,
+        url: str
+    ) -> Mapping[int, Episode]:
+        return self.parse_episode_list(url, await self.parse_page(url))
+
+    async def get_volume_list(
+        self,
+        url: str
+    ) -> Mapping[int, Episode]:
+        return self.parse_volume_list(url, await self.parse_page(url))
+
+    async def get_bdata(self, url: str, shelf: str) -> Dict[str, str]:
+        try:
+            batches = self.product_batches(
+                self.parse_bookshelf(await self.parse_page(url), shelf)
+            )
+            bdata = {}
+
+            # gather() returns results in the order of its arguments.
+            for products in await asyncio.gather(
+                *map(self.get_products, batches)
+            ):
+                bdata.update(products)
+
+            return bdata
+
+        except Exception:
+            log.error("Failed to parse library.")
+
+    async def get_products(self, products: str) -> Dict[str, str]:
+        params = self.form(
+            ('csrfmiddlewaretoken', self.csrf),
+            ('products', products)
+        )
+        async with self.semaphore:
+            async with self.client.post(product_url, data=params) as response:
+                return self.parse_products(await response.read())
+
+    async def get_pdata(self, url: str) -> Dict[str, Union[str, bool]]:
+        return self.parse_pdata(url, await self.parse_page(url))
+
+    async def get_history(self) -> Dict[str, str]:
+        if self._is_login:
+            return await self.get_bdata(history_url, "history")
+        else:
+            raise LoginError
+
+    async def get_bookmark(self) -> Dict[str, str]:
+        if self._is_login:
+            return await self.get_bdata(bookmark_url, "bookmark")
+        else:
+            raise LoginError
+
+    async def get_purchase(self) -> Dict[str, str]:
+        if self._is_login:
+            return await self.get_bdata(purchase_url, "purchase")
+        else:
+            raise LoginError
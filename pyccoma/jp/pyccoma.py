@@ -4,11 +4,15 @@ import re
 import json
 import logging
 
-from typing import Mapping, Union, Dict
+from concurrent.futures import ThreadPoolExecutor
+from lxml import etree, html
+from typing import Mapping, Optional, Set, Tuple, Union, Dict, List
 
 from pyccoma import Scraper
+from pyccoma.episode import Episode
 from pyccoma.exceptions import PyccomaError, PageError, LoginError
 from pyccoma.helpers import trunc_title
+from pyccoma.jsdata import find_literal
 
 from pyccoma.jp.urls import (
     base_url,
@@ -21,8 +25,47 @@ from pyccoma.jp.urls import (
 
 log = logging.getLogger(__name__)
 
+viewer_url = f"{base_url}/web/viewer"
+
+episode_list = etree.XPath('//ul[@id="js_episodeList"]')
+volume_list = etree.XPath('//ul[@id="js_volumeList"]')
+list_items = etree.XPath('./li')
+
+
+def parse_list_item(
+    item: html.HtmlElement,
+    title_class: str,
+    button_class: Optional[str]
+) -> Tuple[Optional[str], Optional[str], Set[str]]:
+    """Reads an episode or volume <li> in a single walk over its elements.
+
+    Returns the title, the episode id of the first viewer link and every
+    class name used in the item, which carry its status. The link is a
+    direct child of the item, or of the `button_class` element if given.
+    """
+    title = id = None
+    status = set()
+
+    for element in item.iter(etree.Element):
+        value = element.get('class', '')
+        status.update(value.split())
+
+        if id is None and element.tag == 'a' and (
+            element.getparent().get('class') == button_class
+            if button_class else element.getparent() is item
+        ):
+            id = element.get('data-episode_id')
+        elif title is None and value == title_class:
+            if (heading := next(element.iter('h2'), None)) is not None:
+                title = heading.text_content()
+
+    return title, id, status
+
+
+class Parser:
+    """Parsing shared by the sync and async Piccoma Japan scrapers; the
+    network-facing methods only fetch a page and hand it over."""
 
-class Pyccoma(Scraper):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.csrf = None
@@ -31,6 +74,7 @@ class Pyccoma(Scraper):
             "smartoon": "E",
             "novel": "E"
         }
+        self._product_batch_size = 200
 
     @property
     def manga(self) -> str:
@@ -44,6 +88,10 @@ class Pyccoma(Scraper):
     def novel(self) -> str:
         return self._etype['novel']
 
+    @property
+    def product_batch_size(self) -> int:
+        return self._product_batch_size
+
     @manga.setter
     def manga(self, value: str) -> None:
         if value in ('volume', 'episode'):
@@ -65,93 +113,51 @@ class Pyccoma(Scraper):
         else:
             raise ValueError("Invalid type.")
 
-    def get_login_status(self) -> bool:
-        is_login = self.parse_page(login_url).xpath(
+    @product_batch_size.setter
+    def product_batch_size(self, value: int) -> None:
+        if value >= 1:
+            self._product_batch_size = value
+        else:
+            raise ValueError("Invalid product batch size.")
+
+    def parse_login_status(self, page: html) -> bool:
+        is_login = page.xpath(
             '//script[contains(text(), "login")]/text()'
         )[0].split(":")[1].split(",")[0].strip().title()
         return eval(is_login)
 
-    def login(self, email: str, password: str) -> None:
-        try:
-            session = self.session.get(login_url, headers=self.headers)
-            self.csrf = self.parse(session.text).xpath(
-                f'//input[@name = "csrfmiddlewaretoken"]/@value'
-            )
-
-            params = {
-                'csrfmiddlewaretoken': self.csrf,
-                'next_url': '/web/',
-                'email': email,
-                'password': password
-            }
-            self.session.post(
-                login_url,
-                data=params,
-                cookies=session.cookies,
-                headers=self.headers
-            )
-
-            if self.get_login_status():
-                self._is_login = True
-                log.info(f"Successfully logged in as {email}")
-            else:
-                self._is_login = False
-                log.error(f"Failed to log in as {email}")
+    def parse_csrf(self, page: html) -> List[str]:
+        return page.xpath('//input[@name = "csrfmiddlewaretoken"]/@value')
 
-        except Exception:
-            raise SystemExit("Failed to establish connection to server.")
-
-    def get_list(self, url: str) -> Mapping[int, Dict[str, bool]]:
-        try:
-            if url.endswith('V'):
-                return self.get_volume_list(url)
-            elif url.endswith('E'):
-                return self.get_episode_list(url)
-            else:
-                raise ValueError("Invalid input.")
-
-        except Exception:
-            raise PageError(url)
-
-    def get_episode_list(
+    def parse_episode_list(
         self,
-        url: str
-    ) -> Mapping[int, Dict[str, Union[str, bool]]]:
+        url: str,
+        page: html
+    ) -> Mapping[int, Episode]:
         try:
-            page = self.parse_page(url).xpath('//ul[@id="js_episodeList"]')[0]
-            episode_title = [
-                title.text_content() for title in page.xpath(
-                    './/div[@class="PCM-epList_title"]/h2'
-                )
-            ]
-            episode_id = [id for id in page.xpath('./li/a/@data-episode_id')]
+            page = episode_list(page)[0]
             series_id = url.split('/')[-2]
+            episodes = {}
 
-            episode_link = [
-                "https://piccoma.com/web/viewer/{0}/{1}"
-                .format(series_id, id) for id in episode_id
-            ]
-
-            status = [_status for _status in page.xpath('./li')]
-
-            episodes = {
-                id: {
-                    'title': title,
-                    'url': link,
-                    'is_free': True if _status.find_class('PCM-epList_status_free') else False,  # noqa:E501
-                    'is_zero_plus': True if _status.find_class('PCM-epList_status_zeroPlus') else False,  # noqa:E501
-                    'is_read_for_free': True if _status.find_class('PCM-epList_status_waitfreeRead') else False,  # noqa:E501
-                    'is_already_read': True if _status.find_class('PCM-epList_read') else False,  # noqa:E501
-                    'is_wait_until_free': True if _status.find_class('PCM-epList_status_webwaitfree') else False,  # noqa:E501
-                    'is_purchased': True if _status.find_class('PCM-epList_status_buy') else False  # noqa:E501
-                }
-                for id, title, link, _status in zip(
-                    episode_id,
-                    episode_title,
-                    episode_link,
-                    status
+            for item in list_items(page):
+                title, id, status = parse_list_item(
+                    item, 'PCM-epList_title', None
+                )
+                if id is None:
+                    continue
+
+                episodes[id] = Episode(
+                    title,
+                    viewer_url,
+                    series_id,
+                    id,
+                    is_free='PCM-epList_status_free' in status,
+                    is_zero_plus='PCM-epList_status_zeroPlus' in status,
+                    is_read_for_free='PCM-epList_status_waitfreeRead' in status,  # noqa:E501
+                    is_already_read='PCM-epList_read' in status,
+                    is_wait_until_free='PCM-epList_status_webwaitfree' in status,  # noqa:E501
+                    is_purchased='PCM-epList_status_buy' in status
                 )
-            }
 
             if not episodes:
                 log.debug(f"No episodes found on {url}")
@@ -165,48 +171,34 @@ class Pyccoma(Scraper):
         except Exception as err:
             raise PyccomaError(err)
 
-    def get_volume_list(
+    def parse_volume_list(
         self,
-        url: str
-    ) -> Mapping[int, Dict[str, Union[str, bool]]]:
+        url: str,
+        page: html
+    ) -> Mapping[int, Episode]:
         try:
-            page = self.parse_page(url).xpath('//ul[@id="js_volumeList"]')[0]
-            volume_title = [
-                title.text_content() for title in page.xpath(
-                    './/div[@class="PCM-prdVol_title"]//h2'
-                )
-            ]
+            page = volume_list(page)[0]
             series_id = url.split('/')[-2]
-            volume_id = [
-                [id for id in links.xpath('./a/@data-episode_id')]
-                for links in page.xpath('//div[@class="PCM-prdVol_btns"]')
-            ]
-            volume_link = [
-                "https://piccoma.com/web/viewer/{0}/{1}"
-                .format(series_id, id[0]) for id in volume_id
-            ]
-
-            xpath_status = './li'
-            status = [_status for _status in page.xpath(f'{xpath_status}')]
-
-            volumes = {
-                id + 1: {
-                    'title': title,
-                    'url': link,
-                    'is_free': True if _status.find_class('PCM-prdVol_freeBtn') else False,  # noqa:E501
-                    'is_read_for_free': True if (_status.find_class('PCM-prdVol_readBtn') and _status.find_class('PCM-prdVol_campaign_free')) else False,  # noqa:E501
-                    'is_already_read': True if _status.find_class('PCM-volList_read') else False,  # noqa:E501
-                    'is_wait_until_free': True if _status.find_class('PCM-prdVol_campaign_free') else False,  # noqa:E501
-                    'is_purchased': True if _status.find_class('PCM-prdVol_readBtn') else False  # noqa:E501
-                }
-                for id, (title, link, _status) in enumerate(
-                    zip(
-                        volume_title,
-                        volume_link,
-                        status
-                    )
+            volumes = {}
+
+            for item in list_items(page):
+                title, id, status = parse_list_item(
+                    item, 'PCM-prdVol_title', 'PCM-prdVol_btns'
+                )
+                if id is None:
+                    continue
+
+                volumes[len(volumes) + 1] = Episode(
+                    title,
+                    viewer_url,
+                    series_id,
+                    id,
+                    is_free='PCM-prdVol_freeBtn' in status,
+                    is_read_for_free='PCM-prdVol_readBtn' in status and 'PCM-prdVol_campaign_free' in status,  # noqa:E501
+                    is_already_read='PCM-volList_read' in status,
+                    is_wait_until_free='PCM-prdVol_campaign_free' in status,  # noqa:E501
+                    is_purchased='PCM-prdVol_readBtn' in status
                 )
-            }
 
             if not volumes:
                 log.debug(f"No volumes found on {url}")
@@ -220,53 +212,50 @@ class Pyccoma(Scraper):
         except Exception as err:
             raise PyccomaError(err)
 
-    def get_bdata(self, url: str, shelf: str) -> Dict[str, str]:
-        try:
-            page = self.parse_page(url).xpath(
-                '//script[contains(.,"_init_.api")]/text()'
-            )[0]
-            bad_json = page.split("_init_.data =")[1].split("_init_.gtm")[0]
-            corrected_json = re.sub(r'(?<!["\'])\b([a-zA-Z_][a-zA-Z0-9_]*)\b(?=\s*:)', r'"\1"', bad_json)
-            data = json.loads(corrected_json)
-            product_id = [value["id"] for value in data[shelf]]
-            product_id = ','.join([str(value["id"]) for value in data[shelf]])
-
-            params = {
-                'csrfmiddlewaretoken': self.csrf,
-                'products': product_id
-            }
-
-            product_json = self.session.post(product_url, data=params, headers=self.headers).content
-            product = json.loads(product_json)['data']['products']
-
-            product_title = [_title['title'] for _title in product]
-
-            product_type = [
-                self.smartoon if _type['is_smartoon'] else
-                self.novel if _type['is_novel'] else self.manga
-                for _type in product
-            ]
-
-            product_link = [
-                base_url + "/web/product/" + str(_id['id']) + "/episodes?etype="
-                for _id in product
-            ]
-
-            bdata = {
-                title: link + type for title, link, type in zip(
-                    product_title, product_link, product_type
-                )
-            }
-
-            return bdata
+    def parse_bookshelf(self, page: html, shelf: str) -> List[str]:
+        page = page.xpath('//script[contains(.,"_init_.api")]/text()')[0]
+        data = find_literal(page, "_init_.data =")
+        return [str(value["id"]) for value in data[shelf]]
+
+    def product_batches(self, products: List[str]) -> List[str]:
+        """Splits product ids into the comma-separated `products` values of
+        separate product lookups."""
+        size = self.product_batch_size
+        return [
+            ','.join(products[index:index + size])
+            for index in range(0, len(products), size)
+        ]
+
+    def parse_products(self, product_json: bytes) -> Dict[str, str]:
+        product = json.loads(product_json)['data']['products']
+
+        product_title = [_title['title'] for _title in product]
+
+        product_type = [
+            self.smartoon if _type['is_smartoon'] else
+            self.novel if _type['is_novel'] else self.manga
+            for _type in product
+        ]
+
+        product_link = [
+            base_url + "/web/product/" + str(_id['id']) + "/episodes?etype="
+            for _id in product
+        ]
+
+        bdata = {
+            title: link + type for title, link, type in zip(
+                product_title, product_link, product_type
+            )
+        }
 
-        except Exception:
-            log.error("Failed to parse library.")
+        return bdata
 
-    def get_pdata(self, url: str) -> Dict[str, Union[str, bool]]:
+    def parse_pdata(
+        self,
+        url: str,
+        page: html
+    ) -> Dict[str, Union[str, bool]]:
         try:
-            page = self.parse_page(url)
-
             log.info(f"Parsing data from {url}")
 
             title = page.xpath('//title')[0].text_content().split("｜")[1]
@@ -290,6 +279,97 @@ class Pyccoma(Scraper):
     def get_checksum(self, img_url: str) -> str:
         return img_url.split('/')[-2]
 
+
+class Pyccoma(Parser, Scraper):
+    def get_login_status(self) -> bool:
+        return self.parse_login_status(self.parse_page(login_url))
+
+    def login(self, email: str, password: str) -> None:
+        try:
+            session = self.session.get(login_url, headers=self.headers)
+            self.csrf = self.parse_csrf(self.parse(session.text))
+
+            params = {
+                'csrfmiddlewaretoken': self.csrf,
+                'next_url': '/web/',
+                'email': email,
+                'password': password
+            }
+            self.session.post(
+                login_url,
+                data=params,
+                cookies=session.cookies,
+                headers=self.headers
+            )
+
+            if self.get_login_status():
+                self._is_login = True
+                self._account = email.lower()
+                log.info(f"Successfully logged in as {email}")
+            else:
+                self._is_login = False
+                log.error(f"Failed to log in as {email}")
+
+        except Exception:
+            raise SystemExit("Failed to establish connection to server.")
+
+    def get_list(self, url: str) -> Mapping[int, Episode]:
+        try:
+            if url.endswith('V'):
+                return self.get_volume_list(url)
+            elif url.endswith('E'):
+                return self.get_episode_list(url)
+            else:
+                raise ValueError("Invalid input.")
+
+        except Exception:
+            raise PageError(url)
+
+    def get_episode_list(
+        self,
+        url: str
+    ) -> Mapping[int, Episode]:
+        return self.parse_episode_list(url, self.parse_page(url))
+
+    def get_volume_list(
+        self,
+        url: str
+    ) -> Mapping[int, Episode]:
+        return self.parse_volume_list(url, self.parse_page(url))
+
+    def get_bdata(self, url: str, shelf: str) -> Dict[str, str]:
+        try:
+            batches = self.product_batches(
+                self.parse_bookshelf(self.parse_page(url), shelf)
+            )
+            bdata = {}
+
+            with ThreadPoolExecutor(
+                max_workers=max(min(self.workers, len(batches)), 1),
+                thread_name_prefix="pyccoma-meta"
+            ) as executor:
+                # map() yields in submission order, so products keep the
+                # order of the bookshelf.
+                for products in executor.map(self.get_products, batches):
+                    bdata.update(products)
+
+            return bdata
+
+        except Exception:
+            log.error("Failed to parse library.")
+
+    def get_products(self, products: str) -> Dict[str, str]:
+        params = {
+            'csrfmiddlewaretoken': self.csrf,
+            'products': products
+        }
+
+        product_json = self.session.post(product_url, data=params, headers=self.headers).content  # noqa:E501
+        return self.parse_products(product_json)
+
+    def get_pdata(self, url: str) -> Dict[str, Union[str, bool]]:
+        return self.parse_pdata(url, self.parse_page(url))
+
     def get_history(self) -> Dict[str, str]:
         if self._is_login:
             return self.get_bdata(history_url, "history")
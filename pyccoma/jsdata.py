@@ -0,0 +1,226 @@
+import re
+
+from json.decoder import JSONDecoder, scanstring
+from typing import Any, List, Tuple
+
+from pyccoma.exceptions import ParseError
+
+# Whitespace and comments between tokens.
+SKIP = re.compile(r'(?:\s+|//[^\n]*|/\*.*?\*/)*', re.S)
+IDENTIFIER = re.compile(r'[A-Za-z_$][\w$]*')
+NUMBER = re.compile(
+    r'[-+]?(?:0[xX][0-9a-fA-F]+|(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)'
+)
+SINGLE_QUOTED = re.compile(r"'((?:[^'\\]|\\.)*)'", re.S)
+DOUBLE_QUOTED = re.compile(r'"((?:[^"\\]|\\.)*)"', re.S)
+ESCAPE = re.compile(r'\\(u[0-9a-fA-F]{4}|x[0-9a-fA-F]{2}|.)', re.S)
+ESCAPES = {
+    'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t', 'v': '\v',
+    '0': '\0',
+}
+# A bare key in text with strings masked out, split as (prefix, key, colon).
+BARE_KEY = re.compile(r'([{,]\s*)([A-Za-z_$][\w$]*)(\s*:)')
+BRACKET = re.compile(r'[][{}]')
+CONSTANTS = {
+    'true': True,
+    'false': False,
+    'null': None,
+    'undefined': None,
+    'NaN': float('nan'),
+    'Infinity': float('inf'),
+}
+
+
+def parse_literal(text: str, pos: int = 0) -> Tuple[Any, int]:
+    """Parses one JavaScript object literal, or any other literal value,
+    starting at `pos` and returns it with the position right after it.
+
+    Unlike JSON, keys may be unquoted identifiers, strings may use single
+    quotes, and comments and trailing commas are allowed. Text after the
+    value is never looked at, so it can be embedded in a larger script.
+    """
+    pos = SKIP.match(text, pos).end()
+
+    try:
+        char = text[pos]
+    except IndexError:
+        raise ParseError("Unexpected end of data", pos)
+
+    if char == '{':
+        return _parse_object(text, pos + 1)
+    if char == '[':
+        return _parse_array(text, pos + 1)
+    if char in '"\'':
+        return _parse_string(text, pos)
+
+    if match := NUMBER.match(text, pos):
+        number = match.group()
+        if number.lstrip('+-')[:2] in ('0x', '0X'):
+            return int(number, 16), match.end()
+        if any(c in number for c in '.eE'):
+            return float(number), match.end()
+        return int(number), match.end()
+
+    if (match := IDENTIFIER.match(text, pos)) and \
+            match.group() in CONSTANTS:
+        return CONSTANTS[match.group()], match.end()
+
+    raise ParseError(f"Unexpected {char!r}", pos)
+
+
+def find_literal(text: str, marker: str) -> Any:
+    """Parses the literal that follows the first `marker` in `text`, e.g.
+    the value assigned in `_init_.data = {...};`."""
+    pos = text.find(marker)
+    if pos < 0:
+        raise ParseError(f"{marker!r} not found", 0)
+    pos += len(marker)
+
+    try:
+        return _decode_json_like(text[pos:])
+    except ValueError:
+        return parse_literal(text, pos)[0]
+
+
+def _decode_json_like(text: str) -> Any:
+    """Fast path for an object or array that is JSON apart from bare keys:
+    quotes the keys outside of strings with a regex and hands the result
+    to the C decoder. Raises ValueError for anything else.
+
+    This is a regex rewrite, kept on purpose: on a 5,000 title bookshelf
+    it takes 40 to 70 ms, against about 200 ms for parse_literal, which
+    is only used when this fails.
+    """
+    parts = _split_strings(text)
+    # Even parts are outside of double-quoted strings.
+    code = '\0'.join(parts[0::2])
+
+    # Only the value itself is checked and rewritten; the rest of the
+    # script may well hold comments or single quotes.
+    code = code[:_value_end(code)]
+    if "'" in code or '/' in code:
+        raise ValueError("Not JSON-like")
+
+    pieces = BARE_KEY.split(code)
+    pieces[2::4] = ['"' + key + '"' for key in pieces[2::4]]
+    outside = ''.join(pieces).split('\0')
+    parts = parts[:2 * len(outside) - 1]
+    parts[0::2] = outside
+
+    return JSONDecoder().raw_decode('"'.join(parts).lstrip())[0]
+
+
+def _value_end(code: str) -> int:
+    """Returns the end of the object or array at the start of `code`,
+    which has its strings masked out."""
+    if code.lstrip()[:1] not in ('{', '['):
+        raise ValueError("Not JSON-like")
+
+    depth = 0
+    for match in BRACKET.finditer(code):
+        depth += 1 if match.group() in '{[' else -1
+        if not depth:
+            return match.end()
+    raise ValueError("Not JSON-like")
+
+
+def _split_strings(text: str) -> List[str]:
+    parts = text.split('"')
+    if '\\"' not in text:
+        return parts
+
+    merged: List[str] = []
+    for part in parts:
+        # An odd number of backslashes before a quote escapes it.
+        if merged and len(merged) % 2 == 0 and \
+                (len(merged[-1]) - len(merged[-1].rstrip('\\'))) % 2:
+            merged[-1] += '"' + part
+        else:
+            merged.append(part)
+    return merged
+
+
+def _parse_string(text: str, pos: int) -> Tuple[str, int]:
+    if text[pos] == '"':
+        try:
+            # JSON's C scanner covers nearly every double-quoted string.
+            return scanstring(text, pos + 1)
+        except ValueError:
+            pass
+
+    match = (SINGLE_QUOTED if text[pos] == "'" else DOUBLE_QUOTED).match(
+        text, pos
+    )
+    if not match:
+        raise ParseError("Unterminated string", pos)
+    value = match.group(1)
+    if '\\' in value:
+        value = ESCAPE.sub(_unescape, value)
+    return value, match.end()
+
+
+def _unescape(match: re.Match) -> str:
+    escape = match.group(1)
+    if escape[0] in 'ux':
+        return chr(int(escape[1:], 16))
+    return ESCAPES.get(escape, escape)
+
+
+def _parse_key(text: str, pos: int) -> Tuple[str, int]:
+    if text[pos:pos + 1] in ('"', "'"):
+        return _parse_string(text, pos)
+    if match := IDENTIFIER.match(text, pos):
+        return match.group(), match.end()
+    if match := NUMBER.match(text, pos):
+        return match.group(), match.end()
+
+    raise ParseError("Expected property name", pos)
+
+
+def _parse_object(text: str, pos: int) -> Tuple[dict, int]:
+    result = {}
+
+    while True:
+        pos = SKIP.match(text, pos).end()
+
+        if text[pos:pos + 1] == '}':
+            return result, pos + 1
+
+        key, pos = _parse_key(text, pos)
+        pos = SKIP.match(text, pos).end()
+
+        if text[pos:pos + 1] != ':':
+            raise ParseError("Expected ':'", pos)
+
+        result[key], pos = parse_literal(text, pos + 1)
+        pos = SKIP.match(text, pos).end()
+        char = text[pos:pos + 1]
+
+        if char == ',':
+            pos += 1
+        elif char == '}':
+            return result, pos + 1
+        else:
+            raise ParseError("Expected ',' or '}'", pos)
+
+
+def _parse_array(text: str, pos: int) -> Tuple[list, int]:
+    result = []
+
+    while True:
+        pos = SKIP.match(text, pos).end()
+
+        if text[pos:pos + 1] == ']':
+            return result, pos + 1
+
+        value, pos = parse_literal(text, pos)
+        result.append(value)
+        pos = SKIP.match(text, pos).end()
+        char = text[pos:pos + 1]
+
+        if char == ',':
+            pos += 1
+        elif char == ']':
+            return result, pos + 1
+        else:
+            raise ParseError("Expected ',' or ']'", pos)
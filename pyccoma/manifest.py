@@ -0,0 +1,180 @@
+import os
+import json
+import sqlite3
+import hashlib
+import logging
+
+from threading import Lock
+from time import time
+from typing import Any, Dict, Iterable, Mapping, Optional, Union
+
+log = logging.getLogger(__name__)
+
+MANIFEST_NAME = ".pyccoma.sqlite3"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS episodes (
+    url TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    ep_title TEXT NOT NULL,
+    output TEXT NOT NULL,
+    pages INTEGER NOT NULL,
+    completed_at REAL,
+    target TEXT NOT NULL DEFAULT ''
+);
+CREATE TABLE IF NOT EXISTS pages (
+    url TEXT NOT NULL,
+    page INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    sha1 TEXT NOT NULL,
+    PRIMARY KEY (url, page)
+);
+CREATE TABLE IF NOT EXISTS listings (
+    title TEXT NOT NULL,
+    url TEXT NOT NULL,
+    state TEXT NOT NULL,
+    PRIMARY KEY (title, url)
+);
+"""
+
+
+class Manifest:
+    """Record of finished episodes and pages under one output directory,
+    keyed by viewer url, so that reruns can skip finished episodes before
+    requesting their metadata and resume others at the first missing page.
+
+    An episode only counts as finished for the target it was saved as,
+    e.g. "cbz:png" or "dir:jpg", so switching --archive or --format
+    fetches it again.
+    """
+
+    def __init__(self, path: str):
+        self.path = os.path.join(path, MANIFEST_NAME)
+        self._lock = Lock()
+        self._db = sqlite3.connect(
+            self.path, check_same_thread=False, isolation_level=None
+        )
+        # Page records arrive one at a time from many threads; WAL keeps
+        # each of those commits from waiting on a full fsync.
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+
+        columns = {
+            row[1] for row in self._db.execute("PRAGMA table_info(episodes)")
+        }
+        if 'target' not in columns:
+            # Manifests written before targets were recorded; their
+            # episodes are checked page by page on the next run.
+            self._db.execute(
+                "ALTER TABLE episodes ADD COLUMN target TEXT NOT NULL "
+                "DEFAULT ''"
+            )
+
+    def is_complete(self, url: str, target: str) -> bool:
+        """Whether every page of the episode was saved as `target` and its
+        output is still on disk."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT output FROM episodes WHERE url = ? AND target = ? "
+                "AND completed_at IS NOT NULL",
+                (url, target)
+            ).fetchone()
+        return bool(row) and os.path.exists(row[0])
+
+    def get_pages(self, url: str) -> Dict[int, str]:
+        """Returns the file names of the saved pages of an episode, by
+        page index."""
+        with self._lock:
+            return dict(self._db.execute(
+                "SELECT page, name FROM pages WHERE url = ?", (url,)
+            ))
+
+    def add_episode(
+        self,
+        url: str,
+        title: str,
+        ep_title: str,
+        output: str,
+        pages: int,
+        target: str = ''
+    ) -> None:
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO episodes "
+                "(url, title, ep_title, output, pages, target) "
+                "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (url) DO UPDATE SET "
+                "title = excluded.title, ep_title = excluded.ep_title, "
+                "output = excluded.output, pages = excluded.pages, "
+                "target = excluded.target, completed_at = NULL",
+                (url, title, ep_title, output, pages, target)
+            )
+
+    def add_page(
+        self,
+        url: str,
+        page: int,
+        name: str,
+        data: Optional[Union[bytes, memoryview]] = None
+    ) -> None:
+        """Records a saved page. Without `data`, size and hash are taken
+        from the file at `name`."""
+        if data is None:
+            with open(name, 'rb') as file:
+                data = file.read()
+
+        sha1 = hashlib.sha1(data).hexdigest()
+
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO pages (url, page, name, size, sha1) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (url, page, os.path.basename(name), len(data), sha1)
+            )
+
+    def finish_episode(self, url: str) -> None:
+        with self._lock:
+            self._db.execute(
+                "UPDATE episodes SET completed_at = ? WHERE url = ?",
+                (time(), url)
+            )
+
+    def get_listing(self, title: str) -> Dict[str, Dict[str, Any]]:
+        """Returns the episodes of a title as last seen, by viewer url."""
+        with self._lock:
+            return {
+                url: json.loads(state) for url, state in self._db.execute(
+                    "SELECT url, state FROM listings WHERE title = ?",
+                    (title,)
+                )
+            }
+
+    def set_listing(
+        self,
+        title: str,
+        episodes: Iterable[Mapping[str, Any]]
+    ) -> None:
+        rows = [
+            (title, episode['url'], json.dumps(dict(episode)))
+            for episode in episodes
+        ]
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                self._db.execute(
+                    "DELETE FROM listings WHERE title = ?", (title,)
+                )
+                self._db.executemany(
+                    "INSERT INTO listings (title, url, state) "
+                    "VALUES (?, ?, ?)",
+                    rows
+                )
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,217 @@
+import json
+import logging
+
+from bisect import bisect_left
+from threading import Lock
+from contextlib import contextmanager
+from time import perf_counter, time
+from typing import Any, Dict, Iterator, Optional, Sequence
+
+from pyccoma.helpers import write_atomic
+from pyccoma.tracer import Tracer
+
+log = logging.getLogger(__name__)
+
+# Upper bounds in seconds, from a cached parse to a slow page download.
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+    30, 60
+)
+
+STAGES = {
+    'parse_page': "GET and parse of an HTML page",
+    'parse_json': "GET and decode of a JSON document",
+    'get_pdata': "Resolving the page list of an episode",
+    'image_ttfb': "Image GET until the response headers",
+    'image_body': "Reading an image body (straight to disk if passthrough)",
+    'unscramble': "Decoding and unscrambling a page",
+    'encode': "Encoding an unscrambled page, into its file if not archived",
+    'write': "Writing a page file (unscrambled ones are written by encode)",
+    'zip': "Writing a page into its archive",
+}
+
+COUNTERS = {
+    'image_bytes': "Bytes of image bodies downloaded",
+    'output_bytes': "Bytes of pages written to files and archives",
+    'pages': "Pages saved",
+    'pages_skipped': "Pages skipped as already saved",
+    'pages_failed': "Pages that could not be saved",
+    'episodes_skipped': "Episodes skipped as already fetched",
+    'retries': "Request retries",
+}
+
+
+class Histogram:
+    """Fixed-bucket histogram; an observation is a bisect and three
+    increments under a lock."""
+
+    __slots__ = ('buckets', 'counts', 'count', 'sum', 'max', '_lock')
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        # The last slot counts observations above every bucket.
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._lock = Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+            if value > self.max:
+                self.max = value
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile."""
+        with self._lock:
+            rank = q * self.count
+            seen = 0
+            for bound, count in zip(self.buckets, self.counts):
+                seen += count
+                if count and seen >= rank:
+                    return bound
+            return self.max
+
+    def as_dict(self) -> Dict[str, float]:
+        with self._lock:
+            count, total, peak = self.count, self.sum, self.max
+        return {
+            'count': count,
+            'sum': total,
+            'mean': total / count if count else 0,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'max': peak,
+        }
+
+
+class Metrics:
+    """Per-stage timings and counters of a scraper, see STAGES and
+    COUNTERS; other names are accepted too.
+
+    Exported with `report` or `write_json` as a run report, and with
+    `write_prometheus` as a node exporter textfile. Stages timed with
+    `time` are also recorded as spans on `tracer`, if set.
+    """
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.started_at = time()
+        self._histograms: Dict[str, Histogram] = {}
+        self._counters: Dict[str, float] = {}
+        self._lock = Lock()
+        self.tracer: Optional[Tracer] = None
+
+    def histogram(self, stage: str) -> Histogram:
+        try:
+            return self._histograms[stage]
+        except KeyError:
+            with self._lock:
+                return self._histograms.setdefault(
+                    stage, Histogram(self.buckets)
+                )
+
+    def observe(self, stage: str, seconds: float) -> None:
+        self.histogram(stage).observe(seconds)
+
+    @contextmanager
+    def time(self, stage: str) -> Iterator[None]:
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            end = perf_counter()
+            self.histogram(stage).observe(end - start)
+            if self.tracer:
+                self.tracer.add(stage, start, end)
+
+    def count(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def counter(self, name: str) -> float:
+        return self._counters.get(name, 0)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+            self.started_at = time()
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            histograms = dict(self._histograms)
+            counters = dict(self._counters)
+
+        return {
+            'started_at': self.started_at,
+            'elapsed': time() - self.started_at,
+            'counters': counters,
+            'stages': {
+                stage: histogram.as_dict()
+                for stage, histogram in sorted(histograms.items())
+            },
+        }
+
+    def prometheus(self, prefix: str = "pyccoma") -> str:
+        """Renders the metrics in the Prometheus text format."""
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+
+        name = f"{prefix}_stage_duration_seconds"
+        lines = [
+            f"# HELP {name} Time spent per pipeline stage.",
+            f"# TYPE {name} histogram",
+        ]
+
+        for stage, histogram in histograms:
+            with histogram._lock:
+                counts = list(histogram.counts)
+                total = histogram.sum
+            seen = 0
+            for bound, count in zip(histogram.buckets, counts):
+                seen += count
+                lines.append(
+                    f'{name}_bucket{{stage="{stage}",le="{bound:g}"}} {seen}'
+                )
+            seen += counts[-1]
+            lines += [
+                f'{name}_bucket{{stage="{stage}",le="+Inf"}} {seen}',
+                f'{name}_sum{{stage="{stage}"}} {total:.6f}',
+                f'{name}_count{{stage="{stage}"}} {seen}',
+            ]
+
+        for counter, value in counters:
+            metric = f"{prefix}_{counter}_total"
+            lines += [
+                f"# HELP {metric} {COUNTERS.get(counter, counter)}.",
+                f"# TYPE {metric} counter",
+                f"{metric} {value}",
+            ]
+
+        lines += [
+            f"# HELP {prefix}_start_time_seconds Start of the run.",
+            f"# TYPE {prefix}_start_time_seconds gauge",
+            f"{prefix}_start_time_seconds {self.started_at:.3f}",
+        ]
+        return "\n".join(lines) + "\n"
+
+    def write_json(self, path: str) -> None:
+        write_atomic(path, json.dumps(self.report(), indent=2))
+
+    def write_prometheus(self, path: str, prefix: str = "pyccoma") -> None:
+        # The node exporter may read the file at any time, so it is
+        # replaced in one rename.
+        write_atomic(path, self.prometheus(prefix))
+
+    def __str__(self) -> str:
+        return ", ".join(
+            f"{stage} {stats['count']}x {stats['mean'] * 1000:.1f} ms "
+            f"(p95 {stats['p95'] * 1000:g} ms)"
+            for stage, stats in self.report()['stages'].items()
+        ) or "no stages timed"
@@ -0,0 +1,237 @@
+import os
+import sys
+import pstats
+import cProfile
+import logging
+import tracemalloc
+
+from threading import Lock, get_ident, local
+from time import perf_counter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+log = logging.getLogger(__name__)
+
+MODES = ('cpu', 'mem')
+
+# Python 3.12 moved cProfile onto sys.monitoring, where a single profiler
+# sees every thread and a second one cannot be enabled alongside it.
+PER_THREAD = sys.version_info < (3, 12)
+
+# Allocations of the profiler itself and of imports are left out of the
+# memory reports.
+IGNORED = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+class Profiler:
+    """CPU or memory profile of a run, reported per episode and overall
+    under `path`.
+
+    In cpu mode every thread gets its own cProfile.Profile per episode,
+    enabled only while it runs a task wrapped with `wrap`, and the
+    profiles are merged into `episodes/<episode>.pstats` when the
+    episode is done and into `run.pstats` when the run ends; a `.txt`
+    next to each lists the `top` functions by cumulative time. On Python
+    3.12 and later one profile covers every thread, so there is only the
+    run report.
+
+    In mem mode tracemalloc snapshots are taken when an episode starts
+    and ends, and `episodes/<episode>.txt` lists the `top` allocators in
+    between. Snapshots cover the whole process, so episodes fetched side
+    by side show up in each other's reports.
+    """
+
+    def __init__(
+        self,
+        mode: str = 'cpu',
+        path: str = 'profile',
+        top: int = 30,
+        frames: int = 1
+    ):
+        if mode not in MODES:
+            raise ValueError(f"Unknown profile mode {mode!r}.")
+
+        self.mode = mode
+        self.path = path
+        self.top = top
+        self.frames = frames
+        self._lock = Lock()
+        self._local = local()
+        # Profiles by episode and thread; None for work outside episodes.
+        self._profiles: Dict[Tuple[Optional[str], int], cProfile.Profile] = {}  # noqa:E501
+        self._run_stats: List[pstats.Stats] = []
+        self._snapshots: Dict[str, tracemalloc.Snapshot] = {}
+        self._started: Dict[Optional[str], float] = {}
+        self._profile: Optional[cProfile.Profile] = None
+        self._tracing = False
+
+    def start(self) -> None:
+        os.makedirs(os.path.join(self.path, 'episodes'), exist_ok=True)
+        self._started[None] = perf_counter()
+
+        if self.mode == 'mem':
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(self.frames)
+                self._tracing = True
+            self._snapshots[None] = self._snapshot()
+            return
+
+        # Covers the calling thread, and every thread past Python 3.11.
+        self._profile = cProfile.Profile()
+        self._profile.enable()
+        self._local.active = True
+
+    def stop(self) -> None:
+        elapsed = perf_counter() - self._started[None]
+
+        if self.mode == 'mem':
+            first = self._snapshots.pop(None)
+            self._write_mem(
+                'run', elapsed, self._snapshot().compare_to(first, 'lineno')
+            )
+            if self._tracing:
+                tracemalloc.stop()
+                self._tracing = False
+            return
+
+        self._profile.disable()
+        self._local.active = False
+
+        with self._lock:
+            profiles, self._profiles = list(self._profiles.values()), {}
+        stats = self._run_stats + [
+            self._stats(profile) for profile in [self._profile, *profiles]
+        ]
+        self._run_stats = []
+        self._write_cpu('run', elapsed, stats)
+        log.info(f"Profile written to {os.path.abspath(self.path)}")
+
+    def begin_episode(self, name: str) -> str:
+        """Starts the report of an episode and returns its key, `name`
+        made unique among episodes in progress."""
+        with self._lock:
+            key, count = name, 1
+            while key in self._started:
+                count += 1
+                key = f"{name}-{count}"
+            self._started[key] = perf_counter()
+
+        if self.mode == 'mem':
+            self._snapshots[key] = self._snapshot()
+        return key
+
+    def finish_episode(self, key: str) -> None:
+        with self._lock:
+            elapsed = perf_counter() - self._started.pop(key)
+
+        try:
+            if self.mode == 'mem':
+                first = self._snapshots.pop(key)
+                self._write_mem(
+                    os.path.join('episodes', key), elapsed,
+                    self._snapshot().compare_to(first, 'lineno')
+                )
+                return
+
+            if not PER_THREAD:
+                return
+
+            with self._lock:
+                profiles = [
+                    self._profiles.pop(owner)
+                    for owner in list(self._profiles) if owner[0] == key
+                ]
+            stats = [self._stats(profile) for profile in profiles]
+            with self._lock:
+                self._run_stats += stats
+            self._write_cpu(os.path.join('episodes', key), elapsed, stats)
+
+        except Exception as err:
+            log.error(f"Unable to write profile of {key}. {err}")
+
+    def wrap(
+        self,
+        func: Callable[..., Any],
+        episode: Optional[str] = None
+    ) -> Callable[..., Any]:
+        """Returns `func` profiled on whichever thread runs it, as part of
+        `episode` if given."""
+        if self.mode != 'cpu' or not PER_THREAD:
+            return func
+
+        def profiled(*args: Any, **kwargs: Any) -> Any:
+            # Only one profile can be enabled per thread; calls made while
+            # one is already running are counted in that one.
+            if getattr(self._local, 'active', False):
+                return func(*args, **kwargs)
+
+            owner = (episode, get_ident())
+            with self._lock:
+                if not (profile := self._profiles.get(owner)):
+                    profile = self._profiles[owner] = cProfile.Profile()
+
+            self._local.active = True
+            profile.enable()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profile.disable()
+                self._local.active = False
+
+        return profiled
+
+    def _snapshot(self) -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces(IGNORED)
+
+    @staticmethod
+    def _stats(profile: cProfile.Profile) -> pstats.Stats:
+        # create_stats() would also disable whatever profile is running on
+        # the calling thread, so take the snapshot directly.
+        profile.snapshot_stats()
+        stats = pstats.Stats()
+        stats.stats = profile.stats
+        stats.get_top_level_stats()
+        return stats
+
+    def _write_cpu(
+        self,
+        name: str,
+        elapsed: float,
+        stats: List[pstats.Stats]
+    ) -> None:
+        merged = pstats.Stats()
+        merged.add(*stats)
+        output = os.path.join(self.path, name)
+        merged.dump_stats(f"{output}.pstats")
+
+        with open(f"{output}.txt", 'w') as handler:
+            handler.write(
+                f"{name}: {elapsed:.2f}s elapsed, "
+                f"{len(stats)} thread profiles merged\n"
+            )
+            merged.stream = handler
+            merged.sort_stats('cumulative').print_stats(self.top)
+
+    def _write_mem(
+        self,
+        name: str,
+        elapsed: float,
+        differences: List[tracemalloc.StatisticDiff]
+    ) -> None:
+        current, peak = tracemalloc.get_traced_memory()
+        growth = sum(stat.size_diff for stat in differences)
+
+        with open(os.path.join(self.path, f"{name}.txt"), 'w') as handler:
+            handler.write(
+                f"{name}: {elapsed:.2f}s elapsed, "
+                f"{growth / 2**20:+.1f} MB, "
+                f"{current / 2**20:.1f} MB traced, "
+                f"{peak / 2**20:.1f} MB peak\n\n"
+                f"Top {self.top} allocators by growth:\n"
+            )
+            for stat in differences[:self.top]:
+                handler.write(f"{stat}\n")
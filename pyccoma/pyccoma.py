@@ -3,25 +3,42 @@
 import os
 import sys
 import logging
-import zipfile
 import requests
 
+from io import BytesIO
 from lxml import html
 from urllib.parse import parse_qs
 from abc import ABCMeta, abstractmethod
-
-from zipfile import ZipFile
-from threading import Thread, Lock
-from time import time, gmtime, strftime
-from requests import get, session, Response
-from typing import Optional, Mapping, Union, Dict, List
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+
+from threading import Lock
+from time import perf_counter, gmtime, strftime
+from requests import Response
+from typing import (
+    Any, ContextManager, Dict, Iterable, Iterator, List, Mapping, Optional,
+    Set, Union
+)
 from functools import lru_cache
 
-from pycasso import Canvas
-
+from pyccoma import tiles
+from pyccoma.archive import ArchiveWriter
+from pyccoma.cache import ResponseCache
+from pyccoma.encoding import FORMATS, PROFILES, get_extension, get_format
+from pyccoma.engine import PageEngine
+from pyccoma.episode import Episode
 from pyccoma.exceptions import PyccomaError, PageError
 from pyccoma.helpers import create_path, pad_string, safe_filename
-from pyccoma.utils import display_progress_bar, retry
+from pyccoma.manifest import Manifest
+from pyccoma.metrics import Metrics
+from pyccoma.profiler import Profiler
+from pyccoma.ratelimit import RateLimiter
+from pyccoma.scheduler import EpisodeJob, Pipeline
+from pyccoma.streams import copy_body, read_body
+from pyccoma.tracer import Tracer
+from pyccoma.transport import Transport
+from pyccoma.unscramble import UnscramblePool
+from pyccoma.utils import RetryBudget, display_progress_bar, retry
 from pyccoma.dd import dd
 
 log = logging.getLogger(__name__)
@@ -35,21 +52,47 @@ class Scraper(metaclass=ABCMeta):
                           'Chrome/92.0.4515.107 Safari/537.36',
             'Referer': 'https://piccoma.com/'
         }
-        self.session = session()
-        self.session.verify = True
+        self._workers = 8
+        self._prefetch = 2
+        self.transport = self._create_transport()
+        self.session = self.transport.session if self.transport else None
         self.__is_login = False
+        self._account = ""
         self._lock = Lock()
         self._format = "png"
+        self._encoder_profile = "balanced"
         self._archive = False
         self._omit_author = False
         self._retry_count = 3
         self._retry_interval = 1
+        self._retry_budget = RetryBudget()
         self._zeropad = 0
+        self._engine = None
+        self._unscramble_workers = 0
+        self._unscramble_pool = None
+        self._resume = False
+        self._manifests: Dict[str, Manifest] = {}
+        self._cache: Optional[ResponseCache] = ResponseCache()
+        self._metrics = Metrics()
+        self._profiler: Optional[Profiler] = None
 
     @property
     def format(self) -> str:
         return self._format
 
+    @property
+    def encoder_profile(self) -> str:
+        return self._encoder_profile
+
+    @property
+    def extension(self) -> str:
+        return get_extension(self.format)
+
+    @property
+    def target(self) -> str:
+        """Output mode and page format, as recorded in resume manifests."""
+        return f"{'cbz' if self.archive else 'dir'}:{self.extension}"
+
     @property
     def archive(self) -> bool:
         return self._archive
@@ -66,17 +109,102 @@ class Scraper(metaclass=ABCMeta):
     def retry_interval(self) -> int:
         return self._retry_interval
 
+    @property
+    def retry_budget(self) -> RetryBudget:
+        return self._retry_budget
+
     @property
     def zeropad(self) -> int:
         return self._zeropad
 
+    @property
+    def workers(self) -> int:
+        return self._workers
+
+    @property
+    def prefetch(self) -> int:
+        return self._prefetch
+
+    @property
+    def resume(self) -> bool:
+        return self._resume
+
+    @property
+    def cache(self) -> Optional[ResponseCache]:
+        return self._cache
+
+    @property
+    def rate_limiter(self) -> Optional[RateLimiter]:
+        return self.transport.limiter
+
+    @property
+    def metrics(self) -> Metrics:
+        return self._metrics
+
+    @property
+    def profiler(self) -> Optional[Profiler]:
+        return self._profiler
+
+    @property
+    def tracer(self) -> Optional[Tracer]:
+        return self.metrics.tracer
+
+    @property
+    def unscramble_workers(self) -> int:
+        return self._unscramble_workers
+
+    @property
+    def unscramble_pool(self) -> UnscramblePool:
+        with self._lock:
+            if not self._unscramble_pool:
+                self._unscramble_pool = UnscramblePool(
+                    self.unscramble_workers
+                )
+            return self._unscramble_pool
+
+    @property
+    def engine(self) -> PageEngine:
+        with self._lock:
+            if not self._engine:
+                self._engine = PageEngine(self.workers)
+            return self._engine
+
     @format.setter
     def format(self, value: str) -> None:
-        if value in ('png', 'jpg', 'gif', 'bmp', 'jpeg'):
+        if value.lower() in FORMATS:
             self._format = value.lower()
         else:
             raise ValueError("Invalid format.")
 
+    @encoder_profile.setter
+    def encoder_profile(self, value: str) -> None:
+        if value.lower() in PROFILES:
+            self._encoder_profile = value.lower()
+        else:
+            raise ValueError("Invalid encoder profile.")
+
+    @cache.setter
+    def cache(self, value: Optional[ResponseCache]) -> None:
+        self._cache = value
+
+    @rate_limiter.setter
+    def rate_limiter(self, value: Optional[RateLimiter]) -> None:
+        self.transport.limiter = value
+
+    @metrics.setter
+    def metrics(self, value: Metrics) -> None:
+        value.tracer = self.tracer
+        self._metrics = value
+
+    @tracer.setter
+    def tracer(self, value: Optional[Tracer]) -> None:
+        # Stages timed by the metrics are recorded as spans too.
+        self.metrics.tracer = value
+
+    @resume.setter
+    def resume(self, value: bool) -> None:
+        self._resume = value
+
     @archive.setter
     def archive(self, value: bool) -> None:
         self._archive = value
@@ -93,10 +221,46 @@ class Scraper(metaclass=ABCMeta):
     def retry_interval(self, value: int) -> None:
         self._retry_interval = value
 
+    @retry_budget.setter
+    def retry_budget(self, value: Optional[int]) -> None:
+        self._retry_budget = RetryBudget(value)
+
     @zeropad.setter
     def zeropad(self, value: int) -> None:
         self._zeropad = value
 
+    @workers.setter
+    def workers(self, value: int) -> None:
+        if value < 1:
+            raise ValueError("Number of workers must be at least one.")
+
+        with self._lock:
+            engine, self._engine = self._engine, None
+            self._workers = value
+
+        if engine:
+            engine.shutdown()
+
+        self.transport.resize(value)
+
+    @unscramble_workers.setter
+    def unscramble_workers(self, value: int) -> None:
+        if value < 0:
+            raise ValueError("Invalid number of unscramble workers.")
+
+        with self._lock:
+            pool, self._unscramble_pool = self._unscramble_pool, None
+            self._unscramble_workers = value
+
+        if pool:
+            pool.shutdown()
+
+    @prefetch.setter
+    def prefetch(self, value: int) -> None:
+        if value < 1:
+            raise ValueError("Prefetch depth must be at least one.")
+        self._prefetch = value
+
     @property
     def _is_login(self) -> bool:
         return self.__is_login
@@ -106,15 +270,46 @@ class Scraper(metaclass=ABCMeta):
         self.__is_login = value
 
 
+    @contextmanager
+    def profile(
+        self,
+        mode: str = 'cpu',
+        path: str = 'profile'
+    ) -> Iterator[Profiler]:
+        """Profiles every episode fetched inside the block, writing reports
+        per episode and for the whole block under `path`. See Profiler
+        for the cpu and mem modes."""
+        profiler = Profiler(mode, path)
+        profiler.start()
+        self._profiler = profiler
+        try:
+            yield profiler
+        finally:
+            self._profiler = None
+            profiler.stop()
+
     def parse(self, page: str) -> html:
         return html.fromstring(page)
 
+    def get_cached(self, url: str) -> Response:
+        """GET a metadata url through the response cache, if any."""
+        if not self.cache:
+            return self.session.get(url, headers=self.headers)
+
+        # Pages carry the purchase and read states of the account that is
+        # logged in, so every account gets its own entries; a shared
+        # --cache-dir must not serve one account's pages to another.
+        account = self._account if self._is_login else ""
+        return self.cache.get(
+            self.session, url, self.headers, key=f"{account} {url}"
+        )
+
     def parse_page(self, url: str) -> html:
         try:
-            page = self.session.get(url, headers=self.headers)
-            page.raise_for_status()
-            soup = self.parse(page.text)
-            return soup
+            with self.metrics.time('parse_page'):
+                page = self.get_cached(url)
+                page.raise_for_status()
+                return self.parse(page.text)
 
         except requests.exceptions.HTTPError:
             raise PageError(url)
@@ -128,14 +323,25 @@ class Scraper(metaclass=ABCMeta):
         pass
 
     @abstractmethod
-    def get_list(self, url: str) -> Mapping[int, Dict[str, bool]]:
+    def get_list(self, url: str) -> Mapping[int, Episode]:
         pass
 
+    def get_lists(self, urls: List[str]) -> List[Mapping[int, Episode]]:
+        """Resolves the episode lists of several titles concurrently, at
+        most `workers` at a time, returned in the order of `urls`."""
+        if len(urls) < 2:
+            return [self.get_list(url) for url in urls]
+
+        # The session's connection pool is sized by `workers` as well, so
+        # listing never queues on it.
+        with ThreadPoolExecutor(
+            max_workers=min(self.workers, len(urls)),
+            thread_name_prefix="pyccoma-meta"
+        ) as executor:
+            return list(executor.map(self.get_list, urls))
+
     @abstractmethod
-    def get_episode_list(
-        self,
-        url: str
-    ) -> Mapping[int, Dict[str, Union[str, bool]]]:
+    def get_episode_list(self, url: str) -> Mapping[int, Episode]:
         pass
 
     @abstractmethod
@@ -148,30 +354,111 @@ class Scraper(metaclass=ABCMeta):
 
     @retry()
     def get_img(self, img_url: str) -> Response:
-        try:
-            img = get(img_url, headers=self.headers, stream=True)
-            return img
-        except requests.exceptions.ConnectionError:
-            raise Exception(img_url)
+        return self._get_img(img_url)
+
+    @retry()
+    def get_body(self, img_url: str) -> Optional[memoryview]:
+        """Reads a page into the thread's reusable buffer; a body cut short
+        is requested again like a failed request."""
+        with self._get_img(img_url) as img:
+            return self.read_img(img)
 
-    def download(self, img_url: str, seed: str, output: str) -> None:
+    @retry()
+    def save_body(self, img_url: str, file_name: str) -> Optional[int]:
+        """Streams a page that is not scrambled into `file_name` and
+        returns its size; a body cut short is requested again."""
+        try:
+            with self._get_img(img_url) as img, self.metrics.time('write'), \
+                    open(file_name, 'wb') as handler:
+                with self.metrics.time('image_body'):
+                    size = copy_body(img, handler)
+        except Exception:
+            # A partial page would be skipped as saved by the next run.
+            if os.path.exists(file_name):
+                os.remove(file_name)
+            raise
+        self.metrics.count('image_bytes', size)
+        self.metrics.count('output_bytes', size)
+        return size
+
+    def _get_img(self, img_url: str) -> Response:
+        with self.metrics.time('image_ttfb'):
+            img = self.session.get(img_url, headers=self.headers, stream=True)
         try:
-            img = self.get_img(img_url)
+            img.raise_for_status()
+        except requests.exceptions.HTTPError:
+            img.close()
+            raise
+        return img
+
+    def unscramble(
+        self,
+        content: bytes,
+        seed: str,
+        output: Optional[str] = None
+    ) -> Optional[BytesIO]:
+        """Unscramble a page, either encoding it straight into `output` or
+        returning the encoded image."""
+        timings = {}
+
+        if self.unscramble_workers:
+            img = self.unscramble_pool.unscramble(
+                content, dd(seed), self.format, output, self.encoder_profile,
+                timings
+            )
+        else:
+            img = tiles.unscramble(
+                content, dd(seed), self.format, output, self.encoder_profile,
+                timings=timings
+            )
 
+        for stage, seconds in timings.items():
+            self.metrics.observe(stage, seconds)
+
+        if tracer := self.tracer:
+            # Only durations come back, from the pool in particular, so
+            # lay the spans out back from the end of the call.
+            end = perf_counter()
+            encoded = end - timings.get('encode', 0)
+            unscrambled = encoded - timings.get('unscramble', 0)
+            tracer.add('unscramble', unscrambled, encoded)
+            tracer.add('encode', encoded, end)
+        return img
+
+    def read_img(self, img: Response) -> memoryview:
+        """Reads an image body into the thread's reusable buffer."""
+        with self.metrics.time('image_body'):
+            body = read_body(img)
+        self.metrics.count('image_bytes', len(body))
+        return body
+
+    def download(
+        self,
+        img_url: str,
+        seed: str,
+        output: str
+    ) -> Optional[str]:
+        """Saves a page to `output` and returns the name of the file."""
+        try:
             if seed.isupper():
-                Canvas(img.raw, (50, 50), dd(seed)).export(
-                    mode="scramble",
-                    path=output,
-                    format=self.format
-                )
-            else:
-                with open(f"{output}.{self.format}", 'wb') as handler:
-                    for chunk in img.iter_content(1024):
-                        if chunk:
-                            handler.write(chunk)
+                if (body := self.get_body(img_url)) is None:
+                    raise PageError(img_url)
+
+                # Encoded straight into the file, so the write is timed
+                # as part of encode.
+                self.unscramble(body, seed, output)
+                file_name = f"{output}.{get_format(self.format)}"
+                self.metrics.count('output_bytes', os.path.getsize(file_name))
+                return file_name
+
+            file_name = f"{output}.{self.extension}"
+            if self.save_body(img_url, file_name) is None:
+                raise PageError(img_url)
+            return file_name
 
         except Exception as err:
             log.error(f"Unable to download image. {err}")
+            self.metrics.count('pages_failed')
         except KeyboardInterrupt:
             pass
 
@@ -180,47 +467,69 @@ class Scraper(metaclass=ABCMeta):
         img_url: str,
         seed: str,
         page: str,
-        file: ZipFile
+        archive: ArchiveWriter,
+        index: int
     ) -> None:
         try:
-            img = self.get_img(img_url)
+            if (img := self.get_body(img_url)) is None:
+                raise PageError(img_url)
 
             if seed.isupper():
-                img = Canvas(img.raw, (50, 50), dd(seed)).export(
-                    mode="scramble",
-                    format=self.format
-                )
-                img = img.getvalue()
+                img = self.unscramble(img, seed).getbuffer()
             else:
-                img = img.content
+                # The body buffer is reused by this thread's next page.
+                img = bytes(img)
 
-            with self._lock:
-                file.writestr(page, img)
+            archive.put(index, page, img)
+            return
 
         except Exception as err:
             log.error(f"Unable to download image. {err}")
+            self.metrics.count('pages_failed')
         except KeyboardInterrupt:
             pass
 
+        archive.skip(index)
+
     def fetch(self, url: str, path: Optional[str] = None) -> None:
         try:
-            pdata = self.get_pdata(url)
+            if not path:
+                path = os.path.join(os.getcwd(), 'extract')
+
+            if self.resume and \
+                    self.get_manifest(path).is_complete(url, self.target):
+                log.info(f"Skipping {url}, already fetched.")
+                self.metrics.count('episodes_skipped')
+                return
+
+            with self.metrics.time('get_pdata'):
+                pdata = self.get_pdata(url)
             sys.stdout.write(
                 f"\nTitle: {pdata['title']}\n"
                 f"Episode: {pdata['ep_title']}\n"
             )
 
-            if not path:
-                path = os.path.join(os.getcwd(), 'extract')
-
-            start_time = time()
-            self._fetch(pdata['img'], pdata['title'], pdata['ep_title'], path)
+            start_time = perf_counter()
+            pages = self._fetch(
+                pdata['img'],
+                pdata['title'],
+                pdata['ep_title'],
+                path,
+                url
+            )
+            elapsed = perf_counter() - start_time
+            rate = pages / elapsed if elapsed else 0
 
             with self._lock:
-                exec_time = strftime("%H:%M:%S", gmtime(time() - start_time))
-                sys.stdout.write(f"\nElapsed time: {exec_time}\n\n")
+                exec_time = strftime("%H:%M:%S", gmtime(elapsed))
+                sys.stdout.write(
+                    f"\nElapsed time: {exec_time} "
+                    f"({pages} pages, {rate:.2f} pages/sec)\n\n"
+                )
                 sys.stdout.flush()
 
+            self._log_stats()
+
         except TypeError:
             log.error("Unable to fetch episode.")
         except IndexError:
@@ -230,65 +539,188 @@ class Scraper(metaclass=ABCMeta):
         except KeyboardInterrupt:
             pass
 
+    def fetch_all(
+        self,
+        urls: Iterable[str],
+        path: Optional[str] = None
+    ) -> Set[str]:
+        """Fetch several episodes, resolving the metadata of upcoming
+        episodes while earlier ones are still downloading. Returns the urls
+        of the episodes that have every page on disk."""
+        pipeline = Pipeline(self, prefetch=self.prefetch)
+        pipeline.run(urls, path)
+        return pipeline.completed
+
     def _fetch(
         self,
         episode: List[str],
         title: str,
         ep_title: str,
-        path: str
-    ) -> None:
+        path: str,
+        url: Optional[str] = None
+    ) -> int:
+        """Download every page of an episode and block until all of them
+        are on disk. Returns the number of pages that were fetched."""
         try:
-            count = 0
-            episode_size = len(episode)
-            checksum = self.get_checksum(episode[0])
-            key = self.get_key(episode[0])
-            seed = self.get_seed(checksum, key)
-            title = safe_filename(title)
-            ep_title = safe_filename(ep_title)
-
-            if not self.archive:
-                head_path = os.path.join(path, f"{title}/{ep_title}/")
-                path = create_path(head_path)
-            else:
-                head_path = os.path.join(path, f"{title}_{ep_title}.cbz")
-                path = create_path(path)
+            return self._submit(
+                episode, title, ep_title, path, progress=True, url=url
+            ).wait()
 
-                if os.path.exists(head_path):
-                    log.warning(f"File already exists: {head_path}")
+        except Exception as err:
+            log.error(f"Unable to fetch episode. {err}")
+        except KeyboardInterrupt:
+            pass
 
-                file = ZipFile(head_path, "a", zipfile.ZIP_DEFLATED, False)
+        return 0
 
-            for page, url in enumerate(episode):
-                output = os.path.join(
-                    path,
-                    page := pad_string(str(page + 1), length=self.zeropad)
-                )
+    def _submit(
+        self,
+        episode: List[str],
+        title: str,
+        ep_title: str,
+        path: str,
+        progress: bool = False,
+        url: Optional[str] = None
+    ) -> EpisodeJob:
+        """Queue the pages of an episode on the page engine without waiting
+        for them to complete.
+
+        With `resume` enabled, pages of `url` recorded in the manifest are
+        skipped and newly saved pages are recorded.
+        """
+        checksum = self.get_checksum(episode[0])
+        key = self.get_key(episode[0])
+        seed = self.get_seed(checksum, key)
+        title = safe_filename(title)
+        ep_title = safe_filename(ep_title)
+        job = EpisodeJob(title, ep_title, len(episode))
+        manifest = self.get_manifest(path) if self.resume and url else None
+
+        if progress:
+            job.batch.callback = lambda batch: self._progress(job)
+
+        compress, download = self.compress, self._download
+        if profiler := self.profiler:
+            name = profiler.begin_episode(f"{title}_{ep_title}")
+            job.on_finish.append(
+                lambda job: profiler.finish_episode(name)
+            )
+            compress = profiler.wrap(compress, name)
+            download = profiler.wrap(download, name)
+
+        if tracer := self.tracer:
+            job.on_finish.append(lambda job: tracer.add_async(
+                f"{job.title} - {job.ep_title}", job.start_time,
+                job.end_time, id(job), pages=job.pages, skipped=job.skipped
+            ))
+            compress = tracer.wrap(compress, 'page', episode=ep_title)
+            download = tracer.wrap(download, 'page', episode=ep_title)
+
+        if not self.archive:
+            head_path = os.path.join(path, f"{title}/{ep_title}/")
+            path = create_path(head_path)
+        else:
+            head_path = os.path.join(path, f"{title}_{ep_title}.cbz")
+            path = create_path(path)
+
+            if os.path.exists(head_path):
+                log.warning(f"File already exists: {head_path}")
+
+            job.archive = ArchiveWriter(
+                head_path, on_write=job.record, metrics=self.metrics
+            )
+
+        done = {}
+        if manifest:
+            job.track(url, manifest)
+            manifest.add_episode(
+                url, title, ep_title, head_path, job.size, self.target
+            )
+            done = manifest.get_pages(url)
 
-                if not self.archive and os.path.exists(file_name := f"{output}.{self.format}"):  # noqa:E501
-                    log.debug(f"File already exists: {file_name}")
-                elif self.archive and (file_name := f"{page}.{self.format}") in file.namelist():  # noqa:E501
-                    log.debug(f"File already exists: {file_name}")
+        # Unscrambled pages are named after the Pillow format, e.g. jpeg.
+        extensions = {self.extension, get_format(self.format)}
+
+        engine = self.engine
+
+        for index, img_url in enumerate(episode):
+            output = os.path.join(
+                path,
+                page := pad_string(str(index + 1), length=self.zeropad)
+            )
+
+            if not self.archive and index in done and \
+                    done[index] in {f"{page}.{ext}" for ext in extensions} \
+                    and os.path.exists(os.path.join(path, done[index])):
+                log.debug(f"Page already saved: {page}")
+            elif not self.archive and os.path.exists(file_name := f"{output}.{self.extension}"):  # noqa:E501
+                log.debug(f"File already exists: {file_name}")
+            elif self.archive and (file_name := f"{page}.{self.extension}") in job.archive:  # noqa:E501
+                log.debug(f"File already exists: {file_name}")
+                job.archive.skip(index)
+            else:
+                if self.archive:
+                    engine.submit(
+                        job.batch, compress, img_url, seed, file_name,
+                        job.archive, index
+                    )
                 else:
-                    if self.archive:
-                        fetch = Thread(
-                            target=self.compress,
-                            args=(url, seed, file_name, file)
-                        )
-                    else:
-                        fetch = Thread(
-                            target=self.download,
-                            args=(url, seed, output)
-                        )
-                    fetch.start()
-
-                with self._lock:
-                    count += 1
-                    display_progress_bar(count, episode_size)
+                    engine.submit(
+                        job.batch, download, job, index, img_url, seed,
+                        output
+                    )
+                continue
 
-        except Exception as err:
-            log.error(f"Unable to fetch episode. {err}")
-        except KeyboardInterrupt:
-            pass
+            job.skipped += 1
+            self.metrics.count('pages_skipped')
+            if progress:
+                self._progress(job)
+
+        return job
+
+    def _download(
+        self,
+        job: EpisodeJob,
+        index: int,
+        img_url: str,
+        seed: str,
+        output: str
+    ) -> None:
+        if file_name := self.download(img_url, seed, output):
+            self.metrics.count('pages')
+            job.record(index, file_name)
+
+    def get_manifest(self, path: str) -> Manifest:
+        """Returns the resume manifest of an output directory."""
+        path = os.path.abspath(path)
+        with self._lock:
+            if path not in self._manifests:
+                os.makedirs(path, exist_ok=True)
+                self._manifests[path] = Manifest(path)
+            return self._manifests[path]
+
+    def _create_transport(self) -> Optional[Transport]:
+        transport = Transport(pool_size=self._workers)
+        transport.session.verify = True
+        return transport
+
+    def _log_stats(self) -> None:
+        log.debug(f"Transport: {self.transport.stats}")
+        log.debug(f"Response cache: {self.cache}")
+        log.debug(f"Rate limiter: {self.rate_limiter or 'unlimited'}")
+        log.debug(f"Permutation cache: {tiles.permutations}")
+        log.debug(f"Stages: {self.metrics}")
+
+    def _span(self, name: str, **args: Any) -> ContextManager:
+        tracer = self.tracer
+        return tracer.span(name, **args) if tracer else nullcontext()
+
+    def _progress(self, job: EpisodeJob) -> None:
+        # Every page worker goes through here, so waits on the lock show
+        # up in the trace.
+        with self._span('progress'), self._lock:
+            # Pages that are done, whether they were saved or failed.
+            display_progress_bar(job.skipped + job.batch.done, job.size)
 
     @abstractmethod
     def get_checksum(img_url: str) -> str:
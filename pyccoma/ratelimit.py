@@ -0,0 +1,272 @@
+import os
+import struct
+import logging
+
+from threading import Lock
+from contextlib import contextmanager
+from time import monotonic, sleep, time
+from urllib.parse import urlsplit
+from typing import Dict, Iterator, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+log = logging.getLogger(__name__)
+
+# Hosts serving pages and JSON; anything else is the image CDN.
+META_HOSTS = ('piccoma.com', 'www.piccoma.com', 'fr.piccoma.com')
+
+KINDS = ('meta', 'image')
+
+# Bucket state: tokens, last refill, current rate, latency average, latency
+# baseline and time of the last decrease.
+TOKENS, UPDATED, RATE, LATENCY, BASELINE, DECREASED = range(6)
+STATE = struct.Struct('6d')
+
+
+class TokenBucket:
+    """Token bucket whose rate follows AIMD: it is cut by `decrease` when
+    the server answers 429 or 5xx, or when latency climbs to
+    `latency_factor` times its baseline, and grows back by `increase`
+    requests per second for every second of healthy responses, up to
+    `max_rate`.
+
+    Tokens are reserved rather than waited for, so the bucket may go into
+    debt; each caller then sleeps until its own token is due, which keeps
+    callers in arrival order and lets asyncio callers wait without
+    blocking the loop.
+    """
+
+    clock = staticmethod(monotonic)
+
+    def __init__(
+        self,
+        max_rate: float,
+        burst: Optional[float] = None,
+        min_rate: Optional[float] = None,
+        adaptive: bool = True,
+        decrease: float = 0.5,
+        increase: float = 1.0,
+        latency_factor: float = 3.0
+    ):
+        if max_rate <= 0:
+            raise ValueError("Rate must be positive.")
+
+        self.max_rate = max_rate
+        self.min_rate = min(min_rate or 0.5, max_rate)
+        self.burst = burst or max(max_rate, 1)
+        self.adaptive = adaptive
+        self.decrease = decrease
+        self.increase = increase
+        self.latency_factor = latency_factor
+        self._lock = Lock()
+        self._state = self._initial()
+
+    def _initial(self) -> List[float]:
+        return [self.burst, self.clock(), self.max_rate, 0, 0, 0]
+
+    @contextmanager
+    def _locked(self) -> Iterator[List[float]]:
+        with self._lock:
+            yield self._state
+
+    def _refill(self, state: List[float], now: float) -> None:
+        elapsed = max(now - state[UPDATED], 0)
+        state[TOKENS] = min(self.burst, state[TOKENS] + elapsed * state[RATE])
+        state[UPDATED] = now
+
+    @property
+    def rate(self) -> float:
+        with self._locked() as state:
+            return state[RATE]
+
+    def reserve(self, tokens: float = 1) -> float:
+        """Takes `tokens` and returns how long to wait before using them."""
+        with self._locked() as state:
+            self._refill(state, self.clock())
+            state[TOKENS] -= tokens
+            return max(-state[TOKENS] / state[RATE], 0)
+
+    def acquire(self, tokens: float = 1) -> float:
+        delay = self.reserve(tokens)
+        if delay:
+            sleep(delay)
+        return delay
+
+    def observe(
+        self,
+        status: Optional[int],
+        latency: float,
+        retry_after: Optional[float] = None
+    ) -> None:
+        """Adjusts the rate to the outcome of one request. A missing status
+        means the request failed without a response."""
+        with self._locked() as state:
+            now = self.clock()
+            self._refill(state, now)
+
+            throttled = status is None or status == 429 or status >= 500
+            if not throttled:
+                state[LATENCY] = latency if not state[LATENCY] \
+                    else state[LATENCY] * 0.8 + latency * 0.2
+                # The baseline follows the fastest sustained latency, and
+                # drifts up slowly in case the route itself got slower.
+                if not state[BASELINE] or state[LATENCY] < state[BASELINE]:
+                    state[BASELINE] = state[LATENCY]
+                else:
+                    state[BASELINE] += (state[LATENCY] - state[BASELINE]) * .01
+
+            if retry_after:
+                # Everyone sharing the bucket holds off, not just the
+                # request that got the answer.
+                state[TOKENS] = min(state[TOKENS], -retry_after * state[RATE])
+
+            if not self.adaptive:
+                return
+
+            slow = (
+                state[BASELINE] > 0
+                and state[LATENCY] > state[BASELINE] * self.latency_factor
+            )
+            if throttled or slow:
+                # Responses to requests sent before the last cut still
+                # report the old load, so cut at most once per window.
+                window = max(1 / state[RATE], state[LATENCY], 1)
+                if now - state[DECREASED] >= window:
+                    rate = max(state[RATE] * self.decrease, self.min_rate)
+                    log.debug(
+                        f"Rate lowered to {rate:.2f}/s "
+                        f"({status if throttled else 'slow'})"
+                    )
+                    state[RATE] = rate
+                    state[DECREASED] = now
+            else:
+                state[RATE] = min(
+                    state[RATE] + self.increase / state[RATE], self.max_rate
+                )
+
+
+class FileBucket(TokenBucket):
+    """TokenBucket kept in a file at `path`, so every process using the
+    same file shares one budget. `slot` selects the bucket in the file;
+    access is serialized with flock()."""
+
+    clock = staticmethod(time)
+
+    def __init__(self, path: str, slot: int, *args, **kwargs):
+        self.path = path
+        self.offset = slot * STATE.size
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        super().__init__(*args, **kwargs)
+
+    @contextmanager
+    def _locked(self) -> Iterator[List[float]]:
+        with self._lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                data = os.pread(self._fd, STATE.size, self.offset)
+                state = list(STATE.unpack(data)) \
+                    if len(data) == STATE.size else self._initial()
+
+                # Another process may have been started with a lower cap.
+                state[RATE] = min(max(state[RATE], self.min_rate), self.max_rate)  # noqa:E501
+                yield state
+                os.pwrite(self._fd, STATE.pack(*state), self.offset)
+
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def close(self) -> None:
+        os.close(self._fd)
+
+
+class RateLimiter:
+    """Separate request budgets for metadata and images, in requests per
+    second; a rate of None leaves that kind unlimited. With `path`, the
+    budgets are shared by every process using the same file."""
+
+    def __init__(
+        self,
+        meta_rate: Optional[float] = None,
+        image_rate: Optional[float] = None,
+        path: Optional[str] = None,
+        adaptive: bool = True
+    ):
+        if path and not fcntl:
+            log.warning("Rate file is not supported on this platform.")
+            path = None
+
+        self.path = path
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.waits = {kind: 0 for kind in KINDS}
+        self.wait_time = {kind: 0.0 for kind in KINDS}
+        self._lock = Lock()
+
+        for slot, (kind, rate) in enumerate(zip(KINDS, (meta_rate, image_rate))):  # noqa:E501
+            if not rate:
+                continue
+            if path:
+                self.buckets[kind] = FileBucket(
+                    path, slot, rate, adaptive=adaptive
+                )
+            else:
+                self.buckets[kind] = TokenBucket(rate, adaptive=adaptive)
+
+    @staticmethod
+    def classify(url: str) -> str:
+        return 'meta' if urlsplit(url).hostname in META_HOSTS else 'image'
+
+    def reserve(self, kind: str) -> float:
+        bucket = self.buckets.get(kind)
+        if not bucket:
+            return 0
+
+        delay = bucket.reserve()
+        if delay:
+            with self._lock:
+                self.waits[kind] += 1
+                self.wait_time[kind] += delay
+        return delay
+
+    def acquire(self, kind: str) -> float:
+        delay = self.reserve(kind)
+        if delay:
+            sleep(delay)
+        return delay
+
+    def observe(
+        self,
+        kind: str,
+        status: Optional[int],
+        latency: float,
+        retry_after: Optional[float] = None
+    ) -> None:
+        bucket = self.buckets.get(kind)
+        if bucket:
+            bucket.observe(status, latency, retry_after)
+
+    def close(self) -> None:
+        for bucket in self.buckets.values():
+            if isinstance(bucket, FileBucket):
+                bucket.close()
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {
+                kind: {
+                    'rate': bucket.rate,
+                    'max_rate': bucket.max_rate,
+                    'waits': self.waits[kind],
+                    'wait_time': self.wait_time[kind],
+                }
+                for kind, bucket in self.buckets.items()
+            }
+
+    def __str__(self) -> str:
+        return ", ".join(
+            f"{kind} {stats['rate']:.2f}/{stats['max_rate']:g} per second, "
+            f"{stats['waits']} waits ({stats['wait_time']:.1f}s)"
+            for kind, stats in self.stats().items()
+        ) or "unlimited"
@@ -0,0 +1,231 @@
+import os
+import sys
+import queue
+import logging
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock, Thread
+from time import perf_counter, gmtime, strftime
+from typing import (
+    TYPE_CHECKING, Any, Callable, Dict, Iterable, List, Optional, Set, Union
+)
+
+from pyccoma.archive import ArchiveWriter
+from pyccoma.engine import Batch
+from pyccoma.manifest import Manifest
+
+if TYPE_CHECKING:
+    from pyccoma.pyccoma import Scraper
+
+log = logging.getLogger(__name__)
+
+
+class EpisodeJob:
+    """Pages of one episode that have been handed to the page engine."""
+
+    def __init__(self, title: str, ep_title: str, size: int):
+        self.title = title
+        self.ep_title = ep_title
+        self.size = size
+        self.skipped = 0
+        self._lock = Lock()
+        self.batch = Batch()
+        self.saved = 0
+        self._written = 0
+        self.archive: Optional[ArchiveWriter] = None
+        self.url: Optional[str] = None
+        self.manifest: Optional[Manifest] = None
+        self.start_time = perf_counter()
+        self.end_time: Optional[float] = None
+        self.on_finish: List[Callable[["EpisodeJob"], None]] = []
+
+    @property
+    def pages(self) -> int:
+        """Pages written so far, failed ones excluded."""
+        return self._written
+
+    @property
+    def elapsed(self) -> float:
+        return (self.end_time or perf_counter()) - self.start_time
+
+    def track(self, url: str, manifest: Manifest) -> None:
+        """Records pages saved from now on under `url` in `manifest`."""
+        self.url = url
+        self.manifest = manifest
+
+    def record(
+        self,
+        index: int,
+        name: str,
+        data: Optional[Union[bytes, memoryview]] = None
+    ) -> None:
+        """Called for every page written, by the download path or by the
+        archive writer; also records it in the manifest when tracked."""
+        with self._lock:
+            self._written += 1
+
+        if not self.manifest:
+            return
+
+        try:
+            self.manifest.add_page(self.url, index, name, data)
+        except Exception as err:
+            log.error(f"Unable to record page {name}. {err}")
+            return
+
+        with self._lock:
+            self.saved += 1
+
+    def wait(self) -> int:
+        self.batch.wait()
+
+        if self.archive:
+            self.archive.close()
+
+        if self.manifest and self.skipped + self.saved == self.size:
+            self.manifest.finish_episode(self.url)
+
+        self.end_time = perf_counter()
+        for callback in self.on_finish:
+            callback(self)
+        return self.pages
+
+
+class Pipeline:
+    """Fetches many episodes through three overlapping stages.
+
+    1. Metadata: get_pdata for the next `prefetch` episodes is resolved on
+       a small thread pool while earlier episodes are still downloading.
+    2. Pages: every page is submitted to the scraper's shared page engine,
+       so `workers` is a page-level limit across the whole run and the
+       next episode starts as soon as workers free up.
+    3. Output: a finisher thread waits for episodes in order, closes their
+       archives and reports per-episode timing.
+
+    With `resume` enabled, episodes the manifest records as complete are
+    skipped before their metadata is requested. The urls of episodes
+    that ended up with every page on disk are kept in `completed`.
+    """
+
+    def __init__(self, scraper: "Scraper", prefetch: int = 2):
+        self.scraper = scraper
+        self.prefetch = max(prefetch, 1)
+        self.pages = 0
+        self.completed: Set[str] = set()
+
+    def run(self, urls: Iterable[str], path: Optional[str] = None) -> int:
+        urls = list(urls)
+        total = len(urls)
+
+        if not path:
+            path = os.path.join(os.getcwd(), 'extract')
+
+        self.pages = 0
+        self.completed = set()
+        start_time = perf_counter()
+        jobs = queue.Queue(self.prefetch)
+        finisher = Thread(
+            target=self._finish,
+            args=(jobs, total),
+            name="pyccoma-output",
+            daemon=True
+        )
+        finisher.start()
+
+        manifest = self.scraper.get_manifest(path) \
+            if self.scraper.resume else None
+        target = self.scraper.target
+
+        get_pdata = self._get_pdata
+        if profiler := self.scraper.profiler:
+            get_pdata = profiler.wrap(get_pdata)
+
+        with ThreadPoolExecutor(
+            max_workers=self.prefetch,
+            thread_name_prefix="pyccoma-meta"
+        ) as executor:
+            pending = deque()
+            items = iter(enumerate(urls))
+
+            def resolve_ahead() -> None:
+                while len(pending) <= self.prefetch:
+                    try:
+                        index, url = next(items)
+                    except StopIteration:
+                        return
+                    if manifest and manifest.is_complete(url, target):
+                        log.info(
+                            f"Skipping ({index + 1}/{total}) {url}, "
+                            "already fetched."
+                        )
+                        self.scraper.metrics.count('episodes_skipped')
+                        self.completed.add(url)
+                        continue
+                    pending.append(
+                        (index, url, executor.submit(get_pdata, url))
+                    )
+
+            resolve_ahead()
+
+            while pending:
+                index, url, future = pending.popleft()
+                resolve_ahead()
+
+                try:
+                    pdata = future.result()
+                    job = self.scraper._submit(
+                        pdata['img'],
+                        pdata['title'],
+                        pdata['ep_title'],
+                        path,
+                        url=url
+                    )
+                except Exception as err:
+                    log.error(f"Unable to fetch episode on {url}. {err}")
+                    continue
+
+                log.info(
+                    f"Fetching ({index + 1}/{total}) {pdata['title']} - "
+                    f"{pdata['ep_title']}"
+                )
+                jobs.put((index, url, job))
+
+        jobs.put(None)
+        finisher.join()
+
+        elapsed = perf_counter() - start_time
+        rate = self.pages / elapsed if elapsed else 0
+        exec_time = strftime("%H:%M:%S", gmtime(elapsed))
+        sys.stdout.write(
+            f"\nElapsed time: {exec_time} "
+            f"({self.pages} pages, {rate:.2f} pages/sec)\n\n"
+        )
+        sys.stdout.flush()
+        self.scraper._log_stats()
+
+        return self.pages
+
+    def _get_pdata(self, url: str) -> Dict[str, Any]:
+        with self.scraper.metrics.time('get_pdata'):
+            return self.scraper.get_pdata(url)
+
+    def _finish(self, jobs: queue.Queue, total: int) -> None:
+        while (item := jobs.get()) is not None:
+            index, url, job = item
+
+            try:
+                pages = job.wait()
+            except Exception as err:
+                log.error(f"Unable to finish episode. {err}")
+                continue
+
+            self.pages += pages
+            if job.skipped + pages == job.size:
+                self.completed.add(url)
+            rate = pages / job.elapsed if job.elapsed else 0
+            log.info(
+                f"Fetched ({index + 1}/{total}) {job.title} - {job.ep_title}"
+                f" ({pages} pages, {job.skipped} skipped, "
+                f"{rate:.2f} pages/sec)"
+            )
@@ -0,0 +1,352 @@
+import re
+import json
+import random
+import logging
+
+from io import BytesIO
+from time import sleep
+from threading import Lock, Thread
+from urllib.parse import urlsplit, urlunsplit
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image, ImageDraw
+from pycasso import Canvas
+
+from pyccoma.dd import dd
+from pyccoma.transport import PooledAdapter, TransportStats
+
+log = logging.getLogger(__name__)
+
+# Requests to these are answered by the stand-in instead.
+SITE_URL = "https://piccoma.com"
+CDN_URL = "https://cdn.pyccoma.invalid"
+
+# Uppercase checksums mark scrambled pages, as on the real CDN.
+CHECKSUM = "PYCCOMABENCHSTANDINKEY"
+EXPIRES = "1700000000"
+BUILD_ID = "standin"
+
+ROUTES = (
+    ('jp_list', re.compile(r"/web/product/(\d+)/episodes")),
+    ('jp_viewer', re.compile(r"/web/viewer/(\d+)/(\d+)")),
+    ('fr_list', re.compile(r"/fr/_next/data/[^/]+/fr/product/episode/(\d+)\.json")),  # noqa:E501
+    ('fr_viewer', re.compile(r"/fr/_next/data/[^/]+/fr/viewer/(\d+)/(\d+)\.json")),  # noqa:E501
+    ('fr_home', re.compile(r"/fr/?$")),
+    ('image', re.compile(r"/img/(\w+)/(\d+)\.png")),
+)
+
+
+def get_seed(checksum: str, expires: str) -> str:
+    # Same rotation as Scraper.get_seed.
+    for num in expires:
+        if int(num) != 0:
+            checksum = checksum[-int(num):] + checksum[:len(checksum)-int(num)]
+    return checksum
+
+
+def make_pages(
+    count: int,
+    size: Tuple[int, int],
+    seed: int = 0
+) -> List[bytes]:
+    """Encodes `count` distinct PNG pages of line art and screentone, so
+    that decoding and encoding them costs about what real pages do."""
+    rng = random.Random(seed)
+    width, height = size
+    pages = []
+
+    for _ in range(count):
+        img = Image.new("L", size, 255)
+        draw = ImageDraw.Draw(img)
+
+        for _ in range(40):
+            box = sorted(rng.randrange(width) for _ in range(2)), \
+                sorted(rng.randrange(height) for _ in range(2))
+            (x0, x1), (y0, y1) = box
+            draw.rectangle((x0, y0, x1, y1), fill=rng.randrange(160, 256))
+        for _ in range(300):
+            draw.line(
+                [(rng.randrange(width), rng.randrange(height))
+                 for _ in range(2)],
+                fill=rng.randrange(64), width=rng.randrange(1, 4)
+            )
+
+        # A little grain, as on scanned pages.
+        noise = Image.effect_noise(size, 4)
+        img = Image.blend(img, noise, 0.03).convert("RGB")
+        data = BytesIO()
+        img.save(data, "png")
+        pages.append(data.getvalue())
+
+    return pages
+
+
+class StandIn:
+    """Local HTTP server that answers like piccoma.com and its image CDN.
+
+    It serves JP product and viewer pages, FR `_next/data` JSON and PNG
+    pages, scrambled or not, for `products` titles of `episodes` episodes
+    of `pages` pages each. Every response waits `latency` seconds, bodies
+    are sent at `bandwidth` bytes per second if given, and a share
+    `error_rate` of image requests fails with 503.
+    """
+
+    def __init__(
+        self,
+        products: int = 2,
+        episodes: int = 4,
+        pages: int = 12,
+        page_size: Tuple[int, int] = (800, 1131),
+        scrambled: bool = True,
+        latency: float = 0.02,
+        bandwidth: Optional[float] = None,
+        error_rate: float = 0.0
+    ):
+        self.products = products
+        self.episodes = episodes
+        self.pages = pages
+        self.page_size = page_size
+        self.scrambled = scrambled
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.error_rate = error_rate
+        self.server = None
+        self._lock = Lock()
+        self._counters = {'image_requests': 0, 'image_bytes': 0, 'errors': 0}
+        self._images: Dict[str, List[bytes]] = {}
+
+    @property
+    def address(self) -> str:
+        return "%s:%d" % self.server.server_address[:2]
+
+    @property
+    def product_ids(self) -> List[int]:
+        return [1000 + index for index in range(self.products)]
+
+    def episode_ids(self, product_id: int) -> List[int]:
+        return [
+            product_id * 100 + index + 1 for index in range(self.episodes)
+        ]
+
+    def product_urls(self, region: str) -> List[str]:
+        if region == 'fr':
+            return [
+                f"{SITE_URL}/fr/product/episode/{id}"
+                for id in self.product_ids
+            ]
+        return [
+            f"{SITE_URL}/web/product/{id}/episodes?etype=E"
+            for id in self.product_ids
+        ]
+
+    def viewer_urls(self, region: str) -> List[str]:
+        prefix = f"{SITE_URL}/fr/viewer" if region == 'fr' \
+            else f"{SITE_URL}/web/viewer"
+        return [
+            f"{prefix}/{product_id}/{episode_id}"
+            for product_id in self.product_ids
+            for episode_id in self.episode_ids(product_id)
+        ]
+
+    def image_urls(self, region: str) -> List[str]:
+        checksum = CHECKSUM if self.scrambled else CHECKSUM.lower()
+        if region == 'fr':
+            return [
+                f"{CDN_URL}/img/{checksum}/{index}.png?v=1&q={checksum}&expires={EXPIRES}"  # noqa:E501
+                for index in range(self.pages)
+            ]
+        # The JP viewer page lists protocol-relative urls.
+        return [
+            f"{CDN_URL[6:]}/img/{checksum}/{index}.png?v=1&expires={EXPIRES}"
+            for index in range(self.pages)
+        ]
+
+    def start(self) -> "StandIn":
+        originals = make_pages(min(self.pages, 4), self.page_size)
+        key = dd(get_seed(CHECKSUM, EXPIRES))
+        self._images = {
+            CHECKSUM.lower(): originals,
+            CHECKSUM: [
+                Canvas(BytesIO(page), (50, 50), key).export(
+                    mode="unscramble", format="png"
+                ).getvalue()
+                for page in originals
+            ],
+        }
+
+        handler = type("Handler", (StandInHandler,), {'standin': self})
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.server.daemon_threads = True
+        return self
+
+    def serve_forever(self) -> None:
+        self.server.serve_forever()
+
+    def serve_in_thread(self) -> Thread:
+        thread = Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+    def shutdown(self) -> None:
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+    def count(self, **counts: int) -> None:
+        with self._lock:
+            for name, value in counts.items():
+                self._counters[name] += value
+
+    def counters(self, reset: bool = False) -> Dict[str, int]:
+        with self._lock:
+            counters = dict(self._counters)
+            if reset:
+                self._counters = dict.fromkeys(counters, 0)
+            return counters
+
+    def jp_list(self, product_id: str) -> Tuple[str, bytes]:
+        items = "".join(
+            f'<li><a href="#" data-episode_id="{id}" data-user_access="1">'
+            f'<div class="PCM-epList_title"><h2>第{index + 1}話</h2></div>'
+            f'<div class="PCM-epList_status">'
+            f'<div class="PCM-epList_status_free"><span>無料</span></div>'
+            f'</div></a></li>'
+            for index, id in enumerate(self.episode_ids(int(product_id)))
+        )
+        return "text/html; charset=utf-8", (
+            f'<html><head><title>Product {product_id}</title></head><body>'
+            f'<ul id="js_episodeList" class="PCM-epList">{items}</ul>'
+            '</body></html>'
+        ).encode()
+
+    def jp_viewer(self, product_id: str, episode_id: str) -> Tuple[str, bytes]:
+        images = ",".join(
+            f"{{'path':'{url}', 'width' : {self.page_size[0]}}}"
+            for url in self.image_urls('jp')
+        )
+        return "text/html; charset=utf-8", (
+            f'<html><head><title>第{episode_id}話｜Product {product_id}'
+            '｜ピッコマ</title></head><body><script>var _pdata_ = {'
+            f"'title' : 'Episode {episode_id}', 'img' : [{images}]"
+            '};</script></body></html>'
+        ).encode()
+
+    def fr_home(self) -> Tuple[str, bytes]:
+        data = json.dumps({'buildId': BUILD_ID})
+        return "text/html; charset=utf-8", (
+            '<html><body><script id="__NEXT_DATA__" '
+            f'type="application/json">{data}</script></body></html>'
+        ).encode()
+
+    def fr_list(self, product_id: str) -> Tuple[str, bytes]:
+        episodes = [
+            {'title': f"Episode {id}", 'id': id, 'use_type': ['FR01'],
+             'is_read': False}
+            for id in self.episode_ids(int(product_id))
+        ]
+        return "application/json", json.dumps({'pageProps': {
+            'initialState': {
+                'episode': {'episodeList': {'episode_list': episodes}}
+            }
+        }}).encode()
+
+    def fr_viewer(self, product_id: str, episode_id: str) -> Tuple[str, bytes]:
+        return "application/json", json.dumps({'pageProps': {
+            'initialState': {
+                'productDetail': {'productDetail': {'product': {
+                    'title': f"Product {product_id}",
+                    'authors': [{'name': "Stand-in"}]
+                }}},
+                'viewer': {'pData': {
+                    'title': f"Episode {episode_id}",
+                    'img': [{'path': url} for url in self.image_urls('fr')]
+                }}
+            }
+        }}).encode()
+
+    def image(self, checksum: str, index: str) -> Tuple[str, bytes]:
+        images = self._images[checksum]
+        return "image/png", images[int(index) % len(images)]
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    standin: StandIn
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        standin = self.standin
+        path = urlsplit(self.path).path
+        sleep(standin.latency)
+
+        for name, pattern in ROUTES:
+            if match := pattern.match(path):
+                break
+        else:
+            return self.reply(404, "text/plain", b"")
+
+        if name == 'image':
+            standin.count(image_requests=1)
+            if standin.error_rate and random.random() < standin.error_rate:
+                standin.count(errors=1)
+                return self.reply(503, "text/plain", b"")
+
+        try:
+            content_type, body = getattr(standin, name)(*match.groups())
+        except (KeyError, ValueError):
+            return self.reply(404, "text/plain", b"")
+
+        if name == 'image':
+            standin.count(image_bytes=len(body))
+
+        self.reply(200, content_type, body)
+
+    def do_POST(self) -> None:
+        self.reply(404, "text/plain", b"")
+
+    def reply(self, status: int, content_type: str, body: bytes) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+
+        bandwidth = self.standin.bandwidth
+        if not bandwidth:
+            self.wfile.write(body)
+            return
+
+        # Sent in 64 KiB chunks, paced to the configured bandwidth.
+        chunk = 1 << 16
+        for start in range(0, len(body), chunk):
+            self.wfile.write(body[start:start + chunk])
+            sleep(min(chunk, len(body) - start) / bandwidth)
+
+
+class StandInAdapter(PooledAdapter):
+    """Sends requests for the real hosts to the stand-in at `address`."""
+
+    def __init__(self, address: str, stats: TransportStats, pool_size: int):
+        self.address = address
+        super().__init__(stats, pool_size)
+
+    def send(self, request, **kwargs):
+        parts = urlsplit(request.url)
+        request.url = urlunsplit(
+            ('http', self.address, parts.path, parts.query, '')
+        )
+        return super().send(request, **kwargs)
+
+
+def attach(scraper, address: str) -> None:
+    """Routes the requests of a sync scraper to the stand-in listening on
+    `address`, which may run in another process."""
+    # Site and CDN requests share one host here, so give them the two
+    # pools' worth of connections they would have against the real hosts.
+    adapter = StandInAdapter(
+        address, scraper.transport.stats, scraper.workers * 2
+    )
+    for prefix in (f"{SITE_URL}/", f"{CDN_URL}/"):
+        scraper.session.mount(prefix, adapter)
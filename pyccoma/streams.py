@@ -0,0 +1,102 @@
+import io
+import shutil
+import threading
+
+from typing import BinaryIO, Union
+from requests import Response
+from requests.exceptions import ChunkedEncodingError
+
+CHUNK_SIZE = 1 << 20
+
+_local = threading.local()
+
+
+class BufferReader(io.RawIOBase):
+    """Seekable read-only file object over a buffer, so a decoder can read
+    a response body in place instead of from a BytesIO copy."""
+
+    def __init__(self, buffer: Union[bytes, bytearray, memoryview]):
+        self._view = memoryview(buffer)
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        size = min(len(b), len(self._view) - self._position)
+        if size <= 0:
+            return 0
+        b[:size] = self._view[self._position:self._position + size]
+        self._position += size
+        return size
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        self._position = max(offset, 0)
+        return self._position
+
+    def tell(self) -> int:
+        return self._position
+
+    def close(self) -> None:
+        self._view.release()
+        super().close()
+
+
+def get_buffer(size: int) -> bytearray:
+    """Returns this thread's body buffer, replaced by a larger one when a
+    page does not fit. Only valid until the thread reads the next page."""
+    buffer = getattr(_local, 'buffer', None)
+    if buffer is None or len(buffer) < size:
+        buffer = _local.buffer = bytearray(size)
+    return buffer
+
+
+def read_body(response: Response) -> memoryview:
+    """Reads a streamed response body into the thread's reusable buffer.
+    Raises ChunkedEncodingError if it ends before its Content-Length."""
+    length = response.headers.get('Content-Length')
+
+    if not length or response.headers.get('Content-Encoding'):
+        return memoryview(response.content)
+
+    length = int(length)
+    view = memoryview(get_buffer(length))[:length]
+    read = 0
+
+    while read < length:
+        size = response.raw.readinto(view[read:read + CHUNK_SIZE])
+        if not size:
+            break
+        read += size
+
+    check_length(response, read)
+    return view
+
+
+def copy_body(response: Response, handler: BinaryIO) -> int:
+    """Streams a response body to a file in large chunks and returns its
+    size. Raises ChunkedEncodingError if it ends before its
+    Content-Length."""
+    start = handler.tell()
+    response.raw.decode_content = True
+    shutil.copyfileobj(response.raw, handler, CHUNK_SIZE)
+    size = handler.tell() - start
+
+    if not response.headers.get('Content-Encoding'):
+        check_length(response, size)
+    return size
+
+
+def check_length(response: Response, size: int) -> None:
+    length = response.headers.get('Content-Length')
+    if length and size < int(length):
+        raise ChunkedEncodingError(
+            f"Body of {response.url} ended after {size} of {length} bytes."
+        )
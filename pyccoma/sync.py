@@ -0,0 +1,99 @@
+import logging
+
+from typing import (
+    Any, Callable, Dict, Iterable, List, Mapping, Optional, Set, Union
+)
+
+from pyccoma.episode import Episode
+from pyccoma.manifest import Manifest
+
+log = logging.getLogger(__name__)
+
+
+class LibrarySync:
+    """Schedules only the episodes that changed since the last sync.
+
+    The episode list of every title is kept in the manifest. An episode is
+    scheduled when it passes the filter now but did not on the stored
+    list, either because it is new or because its state changed, e.g. it
+    was purchased or became free. Lists are only stored by `commit`, and
+    only for episodes that were fetched completely, so an interrupted run
+    or a failed download schedules the same episodes again.
+
+    When only some of the episodes that pass the filter are picked, e.g.
+    by --filter min or --range, the others are left out of the diff and
+    keep their stored state, so a later sync that picks them still sees
+    them as changed.
+    """
+
+    def __init__(self, manifest: Manifest):
+        self.manifest = manifest
+        self._seen: Dict[str, List[Episode]] = {}
+        self._previous: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._changed: Dict[str, List[str]] = {}
+        self._held: Dict[str, Set[str]] = {}
+
+    def diff(
+        self,
+        title: str,
+        episodes: Mapping[Any, Episode],
+        select: Callable[[Union[Episode, Dict[str, Any]]], bool],
+        picked: Optional[Iterable[str]] = None
+    ) -> List[str]:
+        """Returns the urls of episodes of `title` to fetch, in list order,
+        out of the `picked` urls if given."""
+        previous = self.manifest.get_listing(title)
+        self._seen[title] = list(episodes.values())
+        passing = [episode for episode in episodes.values() if select(episode)]
+        picked = {episode['url'] for episode in passing} \
+            if picked is None else set(picked)
+        changed = [
+            episode['url'] for episode in passing
+            if episode['url'] in picked and not (
+                episode['url'] in previous
+                and select(previous[episode['url']])
+            )
+        ]
+        log.debug(
+            f"{title}: {len(changed)} of {len(episodes)} episodes changed."
+        )
+        self._previous[title] = previous
+        self._changed[title] = changed
+        self._held[title] = {
+            episode['url'] for episode in passing
+            if episode['url'] not in picked
+        }
+        return changed
+
+    def commit(self, completed: Iterable[str]) -> None:
+        """Stores the episode lists seen by `diff` as the new baseline.
+
+        Changed episodes whose url is not in `completed`, and episodes
+        that were not picked, keep their previous state, or stay unlisted
+        if they are new, so that the next sync schedules them again.
+        """
+        completed = set(completed)
+
+        for title, episodes in self._seen.items():
+            previous = self._previous[title]
+            failed = set(self._changed[title]) - completed
+            if failed:
+                log.info(
+                    f"{title}: {len(failed)} episodes will be retried on "
+                    "the next sync."
+                )
+
+            held = failed | self._held[title]
+            listing = [
+                episode if episode['url'] not in held
+                else previous[episode['url']]
+                for episode in episodes
+                if episode['url'] not in held
+                or episode['url'] in previous
+            ]
+            self.manifest.set_listing(title, listing)
+
+        self._seen.clear()
+        self._previous.clear()
+        self._changed.clear()
+        self._held.clear()
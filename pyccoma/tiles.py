@@ -0,0 +1,309 @@
+import math
+import logging
+
+from io import BytesIO
+from threading import Event, Lock
+from time import perf_counter
+from collections import OrderedDict
+from typing import BinaryIO, Dict, List, Optional, Tuple, Union
+
+from PIL import Image
+
+from pyccoma.encoding import get_format, get_options
+from pyccoma.streams import BufferReader
+from pycasso.shuffleseed import shuffle
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+log = logging.getLogger(__name__)
+
+# pycasso keeps its ARC4 state in module globals, so concurrent shuffles
+# corrupt each other.
+pycasso_lock = Lock()
+
+# Modes that can be gathered directly; anything else is pasted tile by tile.
+FAST_MODES = ('1', 'L', 'LA', 'RGB', 'RGBA')
+
+Box = Tuple[int, int, int, int, int, int]
+
+
+def get_slices(
+    width: int,
+    height: int,
+    slice_width: int,
+    slice_height: int
+) -> List[List[dict]]:
+    """Splits an image into tiles grouped by tile size, in the same order
+    as pycasso.Canvas.get_slices."""
+    slices = {}
+    columns = math.ceil(width / slice_width)
+    total = columns * math.ceil(height / slice_height)
+
+    for i in range(total):
+        row = int(i / columns)
+        col = i - row * columns
+        x = col * slice_width
+        y = row * slice_height
+        w = slice_width - max(x + slice_width - width, 0)
+        h = slice_height - max(y + slice_height - height, 0)
+        slices.setdefault((w, h), []).append({'x': x, 'y': y, 'w': w, 'h': h})
+
+    return list(slices.values())
+
+
+def get_cols_in_group(slices: List[dict], height: int, slice_height: int):
+    # Mirrors pycasso.Canvas.get_cols_in_group, quirks included.
+    if len(slices) == 1:
+        return 1
+
+    y = slices[0]['y']
+    for i in range(len(slices)):
+        if y != slices[i]['y']:
+            return i
+    return i if (height % slice_height) == 0 else i + 1
+
+
+def get_plan(
+    key: str,
+    width: int,
+    height: int,
+    slice_size: Tuple[int, int] = (50, 50)
+) -> List[Box]:
+    """Returns the (src_x, src_y, dst_x, dst_y, width, height) tile moves
+    that pycasso.Canvas.export(mode="scramble") performs, in paste order.
+    """
+    slice_width, slice_height = slice_size
+    plan = []
+
+    for group in get_slices(width, height, slice_width, slice_height):
+        cols = get_cols_in_group(group, height, slice_height)
+
+        with pycasso_lock:
+            order = shuffle(list(range(len(group))), key)
+
+        for i, tile in enumerate(group):
+            row = int(order[i] / cols)
+            col = order[i] - row * cols
+            plan.append((
+                group[0]['x'] + col * tile['w'],
+                group[0]['y'] + row * tile['h'],
+                tile['x'],
+                tile['y'],
+                tile['w'],
+                tile['h']
+            ))
+
+    return plan
+
+
+class TilePermutation:
+    """The unscramble permutation for one seed and image geometry.
+
+    With NumPy the tile moves are flattened into a single gather index
+    over the source pixels; without it they are replayed as crop/paste
+    calls, which is what pycasso.Canvas does minus the shuffle.
+    """
+
+    def __init__(
+        self,
+        key: str,
+        width: int,
+        height: int,
+        slice_size: Tuple[int, int] = (50, 50)
+    ):
+        self.width = width
+        self.height = height
+        self.plan = get_plan(key, width, height, slice_size)
+        self.outside = False
+        self.index = self.get_index() if np is not None else None
+
+    def get_index(self) -> "np.ndarray":
+        # Source pixels outside the image read as zero, like PIL's crop;
+        # they are mapped to one extra pixel appended to the source.
+        size = self.width * self.height
+        source = np.arange(size, dtype=np.int32).reshape(
+            self.height, self.width
+        )
+        padded = np.full(
+            (self.height * 2, self.width * 2), size, dtype=np.int32
+        )
+        padded[:self.height, :self.width] = source
+        index = np.full((self.height, self.width), size, dtype=np.int32)
+
+        for sx, sy, dx, dy, w, h in self.plan:
+            tile = padded[sy:sy + h, sx:sx + w]
+            index[dy:dy + tile.shape[0], dx:dx + tile.shape[1]] = tile
+
+        index = index.ravel()
+        self.outside = bool((index == size).any())
+        return index
+
+    def gather(self, pixels: "np.ndarray", mode: str) -> "np.ndarray":
+        """Moves every RGBA pixel of a page, packed into one 32-bit word, to
+        its unscrambled position with a single take()."""
+        if self.outside:
+            # Zero in the source mode, converted the way paste() would.
+            blank = Image.new(mode, (1, 1), 0).convert("RGBA")
+            blank = np.frombuffer(blank.tobytes(), dtype=np.uint32)
+            pixels = np.concatenate((pixels, blank))
+
+        return pixels.take(self.index)
+
+    def apply(self, img: Image.Image, mode: str = "RGBA") -> Image.Image:
+        if self.index is None or img.mode not in FAST_MODES:
+            return self.paste(img, mode)
+
+        source_mode = img.mode
+        # Rebinding drops the previous stage, so at most two copies of the
+        # page are alive at any point.
+        img = img.convert("RGBA")
+        pixels = np.frombuffer(img.tobytes(), dtype=np.uint32)
+        img = Image.frombuffer(
+            "RGBA", img.size, self.gather(pixels, source_mode),
+            'raw', "RGBA", 0, 1
+        )
+        return img if mode == "RGBA" else img.convert(mode)
+
+    def paste(self, img: Image.Image, mode: str = "RGBA") -> Image.Image:
+        canvas = Image.new(mode, img.size, (255, 255, 255))
+
+        for sx, sy, dx, dy, w, h in self.plan:
+            canvas.paste(
+                img.crop((sx, sy, sx + w, sy + h)),
+                (dx, dy, dx + w, dy + h)
+            )
+
+        return canvas
+
+
+class PermutationCache:
+    """Bounded, thread-safe LRU of TilePermutation keyed by seed, image
+    size and tile size. Concurrent misses on the same key wait for a
+    single computation instead of repeating the shuffle."""
+
+    def __init__(self, maxsize: int = 16):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._items: "OrderedDict[tuple, TilePermutation]" = OrderedDict()
+        self._pending: Dict[tuple, Event] = {}
+        self._lock = Lock()
+
+    def get(
+        self,
+        key: str,
+        width: int,
+        height: int,
+        slice_size: Tuple[int, int] = (50, 50)
+    ) -> TilePermutation:
+        item = (key, width, height, tuple(slice_size))
+
+        while True:
+            with self._lock:
+                if item in self._items:
+                    self.hits += 1
+                    self._items.move_to_end(item)
+                    return self._items[item]
+
+                pending = self._pending.get(item)
+                if not pending:
+                    self.misses += 1
+                    self._pending[item] = Event()
+                    break
+
+            pending.wait()
+
+        try:
+            permutation = TilePermutation(key, width, height, slice_size)
+
+            with self._lock:
+                self._items[item] = permutation
+                while len(self._items) > self.maxsize:
+                    self._items.popitem(last=False)
+
+            return permutation
+
+        finally:
+            with self._lock:
+                self._pending.pop(item).set()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self.hits = self.misses = 0
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0,
+                'size': len(self._items),
+                'maxsize': self.maxsize,
+            }
+
+    def __str__(self) -> str:
+        stats = self.stats()
+        return (
+            f"{stats['hits']} hits, {stats['misses']} misses "
+            f"({stats['hit_ratio']:.1%}), {stats['size']}/{stats['maxsize']}"
+            " cached"
+        )
+
+
+# Shared by every scraper in the process, so pages of an episode and
+# reruns of the same episode never recompute a shuffle.
+permutations = PermutationCache()
+
+
+def unscramble(
+    content: Union[bytes, memoryview, BinaryIO],
+    key: str,
+    format: str,
+    output: Optional[str] = None,
+    profile: str = "balanced",
+    slice_size: Tuple[int, int] = (50, 50),
+    timings: Optional[Dict[str, float]] = None
+) -> Optional[BytesIO]:
+    """Unscrambles a page, producing the same bytes as pycasso.Canvas with
+    the default "balanced" encoder profile.
+
+    The result is encoded straight into `output` when given and returned
+    as a BytesIO otherwise. Seconds spent unscrambling and encoding are
+    stored in `timings`, if given.
+    """
+    if isinstance(content, (bytes, bytearray, memoryview)):
+        # Released on return so callers can reuse or free the buffer.
+        with BufferReader(content) as reader:
+            return unscramble(
+                reader, key, format, output, profile, slice_size, timings
+            )
+
+    options = get_options(format, profile)
+    format = get_format(format)
+    start = perf_counter()
+
+    with Image.open(content) as img:
+        permutation = permutations.get(key, *img.size, slice_size)
+        # Canvas pastes onto an RGBA canvas, converted to RGB for JPEG.
+        img = permutation.apply(img, "RGB" if format == "jpeg" else "RGBA")
+
+    unscrambled = perf_counter()
+    img_bytes = None
+
+    if output:
+        with open(f"{output}.{format}", 'wb') as file:
+            img.save(file, format, **options)
+    else:
+        img_bytes = BytesIO()
+        img.save(img_bytes, format, **options)
+
+    if timings is not None:
+        timings['unscramble'] = unscrambled - start
+        timings['encode'] = perf_counter() - unscrambled
+
+    return img_bytes
@@ -0,0 +1,146 @@
+import os
+import json
+import logging
+
+from threading import Lock, current_thread, get_ident
+from contextlib import contextmanager
+from time import perf_counter
+from typing import Any, Callable, Dict, Iterator, List
+
+from pyccoma.helpers import write_atomic
+
+log = logging.getLogger(__name__)
+
+
+class Tracer:
+    """Records spans of work per thread and writes them as a Chrome Trace
+    Event file, to open in Perfetto or chrome://tracing.
+
+    Spans nest per thread, so idle workers show up as gaps and waits on a
+    shared lock as spans lined up one after another across threads.
+    Episodes are recorded as async spans since their pages run on many
+    threads. At most `max_events` events are kept.
+    """
+
+    def __init__(self, max_events: int = 1_000_000):
+        self.max_events = max_events
+        self.dropped = 0
+        self.pid = os.getpid()
+        self._origin = perf_counter()
+        self._events: List[Dict[str, Any]] = []
+        self._threads: Dict[int, str] = {}
+        self._lock = Lock()
+
+    def _us(self, timestamp: float) -> float:
+        return round((timestamp - self._origin) * 1e6, 3)
+
+    def _append(self, *events: Dict[str, Any]) -> None:
+        tid = get_ident()
+        with self._lock:
+            if tid not in self._threads:
+                self._threads[tid] = current_thread().name
+
+            if len(self._events) + len(events) > self.max_events:
+                if not self.dropped:
+                    log.warning(
+                        f"Trace is full at {self.max_events} events, "
+                        "dropping the rest."
+                    )
+                self.dropped += len(events)
+                return
+            self._events += events
+
+    def add(
+        self,
+        name: str,
+        start: float,
+        end: float,
+        category: str = 'stage',
+        **args: Any
+    ) -> None:
+        """Records a span of the calling thread between two perf_counter()
+        timestamps."""
+        event = {
+            'name': name,
+            'cat': category,
+            'ph': 'X',
+            'ts': self._us(start),
+            'dur': self._us(end) - self._us(start),
+            'pid': self.pid,
+            'tid': get_ident(),
+        }
+        if args:
+            event['args'] = args
+        self._append(event)
+
+    def add_async(
+        self,
+        name: str,
+        start: float,
+        end: float,
+        id: Any,
+        category: str = 'episode',
+        **args: Any
+    ) -> None:
+        """Records a span that is not bound to a thread, e.g. an episode
+        whose pages run on every worker."""
+        event = {
+            'name': name,
+            'cat': category,
+            'id': str(id),
+            'pid': self.pid,
+            'tid': get_ident(),
+        }
+        self._append(
+            dict(event, ph='b', ts=self._us(start), args=args),
+            dict(event, ph='e', ts=self._us(end)),
+        )
+
+    @contextmanager
+    def span(
+        self,
+        name: str,
+        category: str = 'stage',
+        **args: Any
+    ) -> Iterator[None]:
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, start, perf_counter(), category, **args)
+
+    def wrap(
+        self,
+        func: Callable[..., Any],
+        name: str,
+        category: str = 'task',
+        **args: Any
+    ) -> Callable[..., Any]:
+        """Returns `func` recorded as a span on whichever thread runs it."""
+        def traced(*func_args: Any, **kwargs: Any) -> Any:
+            with self.span(name, category, **args):
+                return func(*func_args, **kwargs)
+
+        return traced
+
+    def events(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            threads = dict(self._threads)
+            events = list(self._events)
+
+        metadata = [
+            {'name': 'process_name', 'ph': 'M', 'pid': self.pid,
+             'args': {'name': "pyccoma"}},
+        ] + [
+            {'name': 'thread_name', 'ph': 'M', 'pid': self.pid, 'tid': tid,
+             'args': {'name': name}}
+            for tid, name in threads.items()
+        ]
+        return metadata + events
+
+    def write(self, path: str) -> None:
+        write_atomic(path, json.dumps({
+            'traceEvents': self.events(),
+            'displayTimeUnit': 'ms',
+            'otherData': {'dropped_events': self.dropped},
+        }))
@@ -0,0 +1,180 @@
+import logging
+
+from threading import Lock
+from time import perf_counter
+from typing import Dict, Optional, Type
+
+from requests import Session
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from pyccoma.ratelimit import RateLimiter
+from pyccoma.utils import parse_retry_after
+
+log = logging.getLogger(__name__)
+
+
+class TransportStats:
+    """Counts requests against newly opened connections, so the ratio of
+    reused (keep-alive) connections can be checked under load."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self.requests = 0
+        self.connections = 0
+        self.handshake_time = 0.0
+
+    @property
+    def reused(self) -> int:
+        return max(self.requests - self.connections, 0)
+
+    def record_request(self) -> None:
+        with self._lock:
+            self.requests += 1
+
+    def record_connection(self, elapsed: float) -> None:
+        with self._lock:
+            self.connections += 1
+            self.handshake_time += elapsed
+
+    def as_dict(self) -> Dict[str, float]:
+        with self._lock:
+            requests = self.requests
+            connections = self.connections
+            handshake_time = self.handshake_time
+
+        return {
+            'requests': requests,
+            'connections': connections,
+            'reused': max(requests - connections, 0),
+            'reuse_ratio': (
+                max(requests - connections, 0) / requests if requests else 0
+            ),
+            'handshake_time': handshake_time,
+            'avg_handshake_time': (
+                handshake_time / connections if connections else 0
+            ),
+        }
+
+    def __str__(self) -> str:
+        stats = self.as_dict()
+        return (
+            f"{stats['requests']} requests, "
+            f"{stats['connections']} connections opened, "
+            f"{stats['reused']} reused ({stats['reuse_ratio']:.1%}), "
+            f"avg handshake {stats['avg_handshake_time'] * 1000:.1f} ms"
+        )
+
+
+def _timed_pool(
+    pool_cls: Type[HTTPConnectionPool],
+    conn_cls: Type[HTTPConnection],
+    stats: TransportStats
+) -> Type[HTTPConnectionPool]:
+    class Connection(conn_cls):
+        def connect(self) -> None:
+            start = perf_counter()
+            super().connect()
+            stats.record_connection(perf_counter() - start)
+
+    return type(pool_cls.__name__, (pool_cls,), {'ConnectionCls': Connection})
+
+
+class PooledAdapter(HTTPAdapter):
+    def __init__(
+        self,
+        stats: TransportStats,
+        pool_size: int,
+        limiter: Optional[RateLimiter] = None,
+        **kwargs
+    ):
+        self.stats = stats
+        self.limiter = limiter
+        super().__init__(
+            pool_connections=kwargs.pop('pool_connections', 10),
+            pool_maxsize=pool_size,
+            max_retries=0,
+            **kwargs
+        )
+
+    def init_poolmanager(self, *args, **kwargs) -> None:
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _timed_pool(
+                HTTPConnectionPool, HTTPConnection, self.stats
+            ),
+            'https': _timed_pool(
+                HTTPSConnectionPool, HTTPSConnection, self.stats
+            ),
+        }
+
+    def send(self, request, **kwargs):
+        self.stats.record_request()
+        limiter = self.limiter
+
+        if not limiter:
+            return super().send(request, **kwargs)
+
+        kind = limiter.classify(request.url)
+        limiter.acquire(kind)
+        start = perf_counter()
+
+        try:
+            response = super().send(request, **kwargs)
+        except Exception:
+            limiter.observe(kind, None, perf_counter() - start)
+            raise
+
+        # Streamed bodies are still unread here, so this is the time to
+        # the response headers.
+        limiter.observe(
+            kind,
+            response.status_code,
+            perf_counter() - start,
+            parse_retry_after(response.headers)
+        )
+        return response
+
+
+class Transport:
+    """A requests session backed by a single keep-alive connection pool,
+    shared by metadata and image requests across pages, episodes and
+    titles."""
+
+    def __init__(self, pool_size: int = 10):
+        self.stats = TransportStats()
+        self.session = Session()
+        self.pool_size = 0
+        self._limiter = None
+        self.resize(pool_size)
+
+    @property
+    def limiter(self) -> Optional[RateLimiter]:
+        return self._limiter
+
+    @limiter.setter
+    def limiter(self, value: Optional[RateLimiter]) -> None:
+        self._limiter = value
+        for adapter in set(self.session.adapters.values()):
+            if isinstance(adapter, PooledAdapter):
+                adapter.limiter = value
+
+    def resize(self, pool_size: int) -> None:
+        if pool_size == self.pool_size:
+            return
+
+        old_adapter = self.session.adapters.get('https://')
+        adapter = PooledAdapter(self.stats, pool_size, self.limiter)
+
+        for prefix in ('https://', 'http://'):
+            self.session.mount(prefix, adapter)
+
+        if isinstance(old_adapter, PooledAdapter):
+            old_adapter.close()
+
+        self.pool_size = pool_size
+        log.debug(f"Connection pool size set to {pool_size}.")
+
+    def close(self) -> None:
+        self.session.close()
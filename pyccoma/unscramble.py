@@ -0,0 +1,98 @@
+import os
+import logging
+import multiprocessing
+
+from io import BytesIO
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, Optional, Tuple
+
+from pyccoma import tiles
+
+log = logging.getLogger(__name__)
+
+
+def _unscramble(
+    name: str,
+    size: int,
+    key: str,
+    format: str,
+    output: Optional[str] = None,
+    profile: str = "balanced"
+) -> Tuple[Optional[Tuple[str, int]], Dict[str, float]]:
+    """Runs in a pool process: decodes the scrambled image from shared
+    memory, writes the result to `output` if given, and otherwise hands
+    the encoded image back through a new shared memory block. Stage
+    timings are returned alongside."""
+    timings = {}
+    source = SharedMemory(name=name)
+    try:
+        img = tiles.unscramble(
+            source.buf[:size], key, format, output, profile,
+            timings=timings
+        )
+    finally:
+        source.close()
+
+    if output:
+        return None, timings
+
+    img = img.getbuffer()
+    result = SharedMemory(create=True, size=max(len(img), 1))
+    result.buf[:len(img)] = img
+    result.close()
+    return (result.name, len(img)), timings
+
+
+class UnscramblePool:
+    """Moves decoding, tile permutation and encoding of scrambled pages
+    onto a pool of processes, sized independently of the network workers.
+
+    Page bytes are copied once into shared memory instead of being pickled
+    across the process boundary.
+    """
+
+    def __init__(self, processes: Optional[int] = None):
+        self.processes = processes or os.cpu_count() or 1
+        # Page workers are threads; forking from them is not safe.
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.processes,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+
+    def unscramble(
+        self,
+        content: bytes,
+        key: str,
+        format: str,
+        output: Optional[str] = None,
+        profile: str = "balanced",
+        timings: Optional[Dict[str, float]] = None
+    ) -> Optional[BytesIO]:
+        size = len(content)
+        source = SharedMemory(create=True, size=max(size, 1))
+        try:
+            source.buf[:size] = content
+            result, stages = self._executor.submit(
+                _unscramble, source.name, size, key, format, output, profile
+            ).result()
+        finally:
+            source.close()
+            source.unlink()
+
+        if timings is not None:
+            timings.update(stages)
+
+        if not result:
+            return
+
+        name, size = result
+        shared = SharedMemory(name=name)
+        try:
+            return BytesIO(shared.buf[:size])
+        finally:
+            shared.close()
+            shared.unlink()
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
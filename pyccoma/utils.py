@@ -1,37 +1,152 @@
 import sys
+import random
+import asyncio
 import logging
 
-from time import sleep
-from typing import Callable
+from time import sleep, time
+from typing import Awaitable, Callable, Mapping, Optional
 from functools import wraps
+from threading import Lock
+from email.utils import parsedate_to_datetime
 from requests import Response
+from requests.exceptions import HTTPError
 
 log = logging.getLogger(__name__)
 
 
-def retry() -> Callable[..., Response]:
+class RetryBudget:
+    """Caps the total number of retries spent by a scraper across a run,
+    so a flaky server cannot multiply the work by retry_count."""
+
+    def __init__(self, limit: Optional[int] = None):
+        self.limit = limit
+        self._spent = 0
+        self._lock = Lock()
+
+    @property
+    def spent(self) -> int:
+        return self._spent
+
+    @property
+    def remaining(self) -> Optional[int]:
+        if self.limit is None:
+            return None
+        return max(self.limit - self._spent, 0)
+
+    def spend(self) -> bool:
+        with self._lock:
+            if self.limit is not None and self._spent >= self.limit:
+                return False
+            self._spent += 1
+            return True
+
+
+def _get_status(err: Exception) -> Optional[int]:
+    if isinstance(err, HTTPError) and err.response is not None:
+        return err.response.status_code
+    # aiohttp.ClientResponseError
+    return getattr(err, 'status', None)
+
+
+def is_retryable(err: Exception) -> bool:
+    status = _get_status(err)
+    if status is None:
+        return True
+    return status == 429 or status >= 500
+
+
+def get_retry_after(err: Exception) -> Optional[float]:
+    response = getattr(err, 'response', None)
+    return parse_retry_after(
+        getattr(response, 'headers', getattr(err, 'headers', None))
+    )
+
+
+def parse_retry_after(headers: Optional[Mapping]) -> Optional[float]:
+    """Returns the Retry-After delay in seconds, if the headers set one."""
+    if not headers:
+        return None
+
+    value = headers.get('Retry-After')
+    if not value:
+        return None
+
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time(), 0)
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff(
+    attempt: int,
+    interval: float,
+    max_interval: float = 60
+) -> float:
+    """Exponential backoff with equal jitter: half of the delay is fixed,
+    the other half is random so concurrent retries spread out."""
+    delay = min(max_interval, interval * 2 ** (attempt - 1))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def _next_delay(self, retry: int, err: Exception, max_interval: float):
+    """Returns how long to wait before the next attempt, or None when the
+    request should not be retried."""
+    if not is_retryable(err):
+        log.error(f"Unable to retry request. {err}")
+        return
+    elif retry == self.retry_count:
+        log.error(
+            f"Maximum retries exceeded ({retry}/{self.retry_count}) {err}"
+        )
+        return
+    elif not self.retry_budget.spend():
+        log.error(
+            f"Retry budget exhausted ({self.retry_budget.limit} retries) {err}"
+        )
+        return
+
+    delay = max(
+        backoff(retry, self.retry_interval, max_interval),
+        get_retry_after(err) or 0
+    )
+    self.metrics.count('retries')
+    log.error(f"Retrying ({retry}/{self.retry_count}) in {delay:.1f}s {err}")
+    return delay
+
+
+def retry(max_interval: float = 60) -> Callable[..., Response]:
     def _retry(func):
         @wraps(func)
         def download(self, *args, **kwargs):
-            with self._lock:
+            for retry in range(1, self.retry_count + 1):
+                try:
+                    return func(self, *args, **kwargs)
+                except Exception as err:
+                    delay = _next_delay(self, retry, err, max_interval)
+                    if delay is None:
+                        return
+                    sleep(delay)
+        return download
+    return _retry
+
+
+def retry_async(max_interval: float = 60) -> Callable[..., Awaitable]:
+    def _retry(func):
+        @wraps(func)
+        async def download(self, *args, **kwargs):
+            for retry in range(1, self.retry_count + 1):
                 try:
-                    for retry in range(1, self.retry_count + 1):
-                        try:
-                            return func(self, *args, **kwargs)
-                        except Exception as err:
-                            if retry == self.retry_count:
-                                raise Exception from err
-                            else:
-                                log.error(
-                                    f"Retrying ({retry}/{self.retry_count}) "
-                                    f"{err}"
-                                )
-                                sleep(self.retry_interval)
-                except Exception:
-                    log.error(
-                        f"Maximum retries exceeded ({retry}/"
-                        f"{self.retry_count})"
-                    )
+                    return await func(self, *args, **kwargs)
+                except Exception as err:
+                    delay = _next_delay(self, retry, err, max_interval)
+                    if delay is None:
+                        return
+                    await asyncio.sleep(delay)
         return download
     return _retry
 
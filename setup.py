@@ -16,8 +16,15 @@ setup(
     author_email="catshital@gmail.com",
     description="Scrape and download from Piccoma Japan and France.",
     python_requires=">=3.8",
-    entry_points={"console_scripts": ["pyccoma=pyccoma.__main__:main"],},
+    entry_points={"console_scripts": [
+        "pyccoma=pyccoma.__main__:main",
+        "pyccoma-bench=pyccoma.bench:main",
+    ]},
     install_requires=requirements,
+    extras_require={
+        "async": ["aiohttp>=3.8"],
+        "fast": ["numpy>=1.17"],
+    },
     long_description=long_description,
     long_description_content_type="text/markdown",
     url="https://github.com/catsital/pyccoma",
@@ -0,0 +1,37 @@
+import io
+import unittest
+
+from PIL import Image
+
+from pyccoma.encoding import PROFILES, get_format, get_options
+
+
+def make_page(format: str) -> Image.Image:
+    gradient = Image.linear_gradient("L").resize((128, 192))
+    noise = Image.effect_noise((128, 192), 48)
+    img = Image.merge("RGB", (gradient, noise, gradient.rotate(90)))
+    return img if get_format(format) == "jpeg" else img.convert("RGBA")
+
+
+def encode(img: Image.Image, format: str, profile: str) -> bytes:
+    output = io.BytesIO()
+    img.save(output, get_format(format), **get_options(format, profile))
+    return output.getvalue()
+
+
+class TestProfiles(unittest.TestCase):
+    def test_profiles_differ_from_balanced(self):
+        # GIF and BMP have no encoder settings to vary.
+        for format in PROFILES['balanced']:
+            img = make_page(format)
+            balanced = encode(img, format, 'balanced')
+
+            for profile in PROFILES:
+                if profile == 'balanced':
+                    continue
+                with self.subTest(format=format, profile=profile):
+                    self.assertNotEqual(encode(img, format, profile), balanced)
+
+
+if __name__ == '__main__':
+    unittest.main()
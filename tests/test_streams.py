@@ -0,0 +1,41 @@
+import io
+import unittest
+
+from requests import Response
+from requests.exceptions import ChunkedEncodingError
+
+from pyccoma.streams import copy_body, read_body
+
+
+def make_response(body: bytes, length: int) -> Response:
+    response = Response()
+    response.status_code = 200
+    response.url = "https://example.com/page.png"
+    response.headers['Content-Length'] = str(length)
+    response.raw = io.BytesIO(body)
+    return response
+
+
+class TestReadBody(unittest.TestCase):
+    def test_complete_body(self):
+        body = read_body(make_response(b"page" * 64, 256))
+        self.assertEqual(bytes(body), b"page" * 64)
+
+    def test_short_body_raises(self):
+        with self.assertRaises(ChunkedEncodingError):
+            read_body(make_response(b"page" * 16, 256))
+
+
+class TestCopyBody(unittest.TestCase):
+    def test_complete_body(self):
+        handler = io.BytesIO()
+        self.assertEqual(copy_body(make_response(b"page", 4), handler), 4)
+        self.assertEqual(handler.getvalue(), b"page")
+
+    def test_short_body_raises(self):
+        with self.assertRaises(ChunkedEncodingError):
+            copy_body(make_response(b"page", 256), io.BytesIO())
+
+
+if __name__ == '__main__':
+    unittest.main()